@@ -0,0 +1,113 @@
+"""
+Medication adherence: expected doses vs. logged intake
+"""
+from datetime import date, datetime
+from typing import Optional
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session
+from app.models import Medicine, MedicineLog, ReminderStatus
+from app.schedule import schedule_query, shift_seconds
+
+# A log counts for a dose if it references the dose's reminder and its
+# scheduled_at is within this many seconds of the dose instant
+MATCH_WINDOW_SECONDS = 12 * 3600
+
+
+def adherence_query(start: date, end: date, now: datetime, family_id: int, user_id: Optional[int] = None):
+    """
+    Per user/medicine/local day: expected, taken and missed dose counts
+    Expected doses come from the schedule expansion and are left-joined to
+    the medicine logs, so the whole report is one statement.
+    """
+    doses = schedule_query(start, end, family_id, user_id=user_id).subquery("doses")
+
+    # One row per expected dose, flagged by the best status logged for it
+    per_dose = (
+        select(
+            doses.c.user_id,
+            doses.c.medicine_id,
+            doses.c.local_date,
+            func.max(case((MedicineLog.status == ReminderStatus.TAKEN, 1), else_=0)).label("taken"),
+            func.max(case((MedicineLog.status == ReminderStatus.MISSED, 1), else_=0)).label("missed"),
+        )
+        .select_from(doses)
+        .outerjoin(
+            MedicineLog,
+            and_(
+                MedicineLog.family_id == family_id,
+                MedicineLog.reminder_id == doses.c.reminder_id,
+                MedicineLog.scheduled_at >= shift_seconds(doses.c.scheduled_at, -MATCH_WINDOW_SECONDS),
+                MedicineLog.scheduled_at < shift_seconds(doses.c.scheduled_at, MATCH_WINDOW_SECONDS),
+            ),
+        )
+        # Doses later today have not been due yet
+        .where(doses.c.scheduled_at <= now)
+        .group_by(
+            doses.c.reminder_id,
+            doses.c.scheduled_at,
+            doses.c.user_id,
+            doses.c.medicine_id,
+            doses.c.local_date,
+        )
+        .subquery("per_dose")
+    )
+
+    return (
+        select(
+            per_dose.c.user_id,
+            per_dose.c.medicine_id,
+            Medicine.name.label("medicine_name"),
+            per_dose.c.local_date,
+            func.count().label("expected"),
+            func.sum(per_dose.c.taken).label("taken"),
+            # A dose marked missed and later taken counts as taken
+            func.sum(per_dose.c.missed * (1 - per_dose.c.taken)).label("missed"),
+        )
+        .join(Medicine, Medicine.id == per_dose.c.medicine_id)
+        .group_by(per_dose.c.user_id, per_dose.c.medicine_id, Medicine.name, per_dose.c.local_date)
+        .order_by(per_dose.c.user_id, per_dose.c.medicine_id, per_dose.c.local_date)
+    )
+
+
+def _percent(taken: int, expected: int) -> float:
+    return round(taken * 100 / expected, 1) if expected else 0.0
+
+
+def get_adherence(db: Session, family_id: int, start: date, end: date, user_id: Optional[int] = None) -> dict:
+    """Daily rows plus per-medicine totals for the range"""
+    rows = db.execute(adherence_query(start, end, datetime.utcnow(), family_id, user_id=user_id)).all()
+
+    days = []
+    totals = {}
+    for row in rows:
+        taken, missed = int(row.taken or 0), int(row.missed or 0)
+        days.append({
+            "user_id": row.user_id,
+            "medicine_id": row.medicine_id,
+            "medicine_name": row.medicine_name,
+            "date": row.local_date,
+            "expected": row.expected,
+            "taken": taken,
+            "missed": missed,
+            "adherence_percent": _percent(taken, row.expected),
+        })
+        total = totals.setdefault(
+            (row.user_id, row.medicine_id),
+            {"user_id": row.user_id, "medicine_id": row.medicine_id,
+             "medicine_name": row.medicine_name, "expected": 0, "taken": 0, "missed": 0},
+        )
+        total["expected"] += row.expected
+        total["taken"] += taken
+        total["missed"] += missed
+
+    medicines = list(totals.values())
+    for total in medicines:
+        total["adherence_percent"] = _percent(total["taken"], total["expected"])
+
+    return {
+        "start": start,
+        "end": end,
+        "user_id": user_id,
+        "medicines": medicines,
+        "days": days,
+    }
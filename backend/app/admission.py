@@ -0,0 +1,219 @@
+"""
+Admission control: per-route-class concurrency limits and request deadlines
+
+Every /api request belongs to a class:
+
+- critical: dose confirmations and readings (recording or updating a
+  medicine log, recording insulin). They may use the shared slots and also
+  have ADMISSION_CRITICAL_RESERVED slots of their own, so they still get in
+  when everything else is saturated.
+- heavy: history reads, statistics and exports. At most
+  ADMISSION_HEAVY_CONCURRENCY run at once, inside the shared slots.
+- default: everything else.
+
+A request that cannot start right away waits in a bounded queue. When the
+queue is full, or the wait outlasts ADMISSION_QUEUE_TIMEOUT_MS or the
+request's deadline, it is rejected at once with 503 and Retry-After instead
+of piling up behind the database.
+
+Each class has a deadline measured from arrival. On PostgreSQL it becomes
+the transaction's statement_timeout, so no query outlives the request that
+asked for it; a query cancelled this way also answers 503.
+
+Limits are per process and count the whole response, including streamed
+bodies.
+"""
+import asyncio
+import contextvars
+import logging
+import re
+import time
+from typing import Optional
+from fastapi import status
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.database import ReadSessionLocal, ReplicaSessionLocal, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CRITICAL = "critical"
+HEAVY = "heavy"
+DEFAULT = "default"
+
+# (method, path) patterns by class; unmatched /api requests are DEFAULT
+ROUTE_CLASSES = [
+    (CRITICAL, "POST", re.compile(r"^/api/reminders/logs/?$")),
+    (CRITICAL, "PUT", re.compile(r"^/api/reminders/logs/\d+/?$")),
+    (CRITICAL, "POST", re.compile(r"^/api/insulin/?$")),
+    (HEAVY, "GET", re.compile(r"^/api/reminders/(logs|adherence|schedule)/?$")),
+    (HEAVY, "GET", re.compile(r"^/api/insulin/(weekly|monthly|analytics)?/?$")),
+    (HEAVY, "GET", re.compile(r"^/api/exports/")),
+    (HEAVY, "GET", re.compile(r"^/api/audit/")),
+]
+
+DEADLINE_MS = {
+    CRITICAL: settings.ADMISSION_CRITICAL_DEADLINE_MS,
+    HEAVY: settings.ADMISSION_HEAVY_DEADLINE_MS,
+    DEFAULT: settings.ADMISSION_DEADLINE_MS,
+}
+
+# Monotonic time by which the current request must finish
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Class of a request, or None for requests that are not limited (outside /api)"""
+    if not path.startswith("/api/"):
+        return None
+    for name, route_method, pattern in ROUTE_CLASSES:
+        if method == route_method and pattern.match(path):
+            return name
+    return DEFAULT
+
+
+def remaining_ms() -> Optional[int]:
+    """Milliseconds left before the current request's deadline, or None outside a request"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return int((deadline - time.monotonic()) * 1000)
+
+
+class Rejected(Exception):
+    """The request could not be admitted in time"""
+
+
+class AdmissionController:
+    """Shared, reserved and heavy-route slots with a bounded wait queue"""
+
+    def __init__(self, max_concurrent: int, critical_reserved: int, heavy_concurrency: int, queue_size: int, queue_timeout_ms: int):
+        self.shared = asyncio.Semaphore(max(max_concurrent - critical_reserved, 1))
+        self.reserved = asyncio.Semaphore(critical_reserved) if critical_reserved else None
+        self.heavy = asyncio.Semaphore(heavy_concurrency)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout_ms / 1000
+        self.waiting = 0
+        self.rejected = 0
+
+    async def _wait(self, semaphore: asyncio.Semaphore, deadline: float):
+        """Take a slot, waiting in the queue if none is free"""
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return
+        if self.waiting >= self.queue_size:
+            raise Rejected()
+        timeout = min(self.queue_timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise Rejected()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise Rejected()
+        finally:
+            self.waiting -= 1
+
+    async def acquire(self, name: str, deadline: float) -> list:
+        """Slots held by an admitted request of class `name` (release them with `release`)"""
+        if name == CRITICAL:
+            # Shared slot if one is free right away, otherwise a reserved one
+            if not self.shared.locked() or self.reserved is None:
+                await self._wait(self.shared, deadline)
+                return [self.shared]
+            await self._wait(self.reserved, deadline)
+            return [self.reserved]
+        if name == HEAVY:
+            await self._wait(self.heavy, deadline)
+            try:
+                await self._wait(self.shared, deadline)
+            except Rejected:
+                self.heavy.release()
+                raise
+            return [self.shared, self.heavy]
+        await self._wait(self.shared, deadline)
+        return [self.shared]
+
+    @staticmethod
+    def release(slots: list):
+        for semaphore in slots:
+            semaphore.release()
+
+
+admission = AdmissionController(
+    max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+    critical_reserved=settings.ADMISSION_CRITICAL_RESERVED,
+    heavy_concurrency=settings.ADMISSION_HEAVY_CONCURRENCY,
+    queue_size=settings.ADMISSION_QUEUE_SIZE,
+    queue_timeout_ms=settings.ADMISSION_QUEUE_TIMEOUT_MS,
+)
+
+
+def overloaded_response(detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": detail},
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+    )
+
+
+def is_statement_timeout(exc: OperationalError) -> bool:
+    """Whether PostgreSQL cancelled the statement (statement_timeout)"""
+    return getattr(exc.orig, "pgcode", None) == "57014"
+
+
+class AdmissionMiddleware:
+    """Run each /api request once it has a slot, or reject it with 503"""
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        name = route_class(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        deadline = time.monotonic() + DEADLINE_MS[name] / 1000
+        try:
+            slots = await self.controller.acquire(name, deadline)
+        except Rejected:
+            self.controller.rejected += 1
+            logger.warning("Rejected %s %s (%s): server busy", scope["method"], scope["path"], name)
+            await overloaded_response("Server busy, retry shortly")(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_tracking_start(message: Message):
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        # Slots are held until the whole (possibly streamed) body is sent
+        token = request_deadline.set(deadline)
+        try:
+            await self.app(scope, receive, send_tracking_start)
+        except OperationalError as exc:
+            if started or not is_statement_timeout(exc):
+                raise
+            await overloaded_response("Request took too long, retry shortly")(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
+            self.controller.release(slots)
+
+
+def _set_statement_timeout(session, transaction, connection):
+    """Cap every statement of a request's transaction at the time left before its deadline"""
+    left = remaining_ms()
+    if left is None or connection.dialect.name != "postgresql":
+        return
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(left, 1)}")
+
+
+for session_factory in (SessionLocal, ReadSessionLocal, ReplicaSessionLocal):
+    if session_factory is not None:
+        event.listen(session_factory, "after_begin", _set_statement_timeout)
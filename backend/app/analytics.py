@@ -0,0 +1,287 @@
+"""
+Glucose trend analytics computed over per-user NumPy arrays
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import InsulinLog
+
+SECONDS_PER_DAY = 86400
+
+# Glucose thresholds in mg/dL (international consensus on time in range)
+VERY_LOW = 54
+LOW = 70
+HIGH = 180
+VERY_HIGH = 250
+
+ROLLING_WINDOW_DAYS = 7
+
+
+def _to_epoch(values) -> np.ndarray:
+    """Naive UTC datetimes -> int64 epoch seconds"""
+    return np.array(values, dtype="datetime64[s]").astype(np.int64)
+
+
+def _to_iso(epoch_seconds) -> str:
+    return datetime.utcfromtimestamp(int(epoch_seconds)).isoformat()
+
+
+class GlucoseSeries:
+    """
+    Growable arrays of one user's readings, kept sorted by time
+    `watermark` is the highest log id read from the database. Ids of recent
+    readings (loaded or appended directly by this process) are kept in
+    `recent_ids` with their created_at, so a sync that reads them again
+    skips them.
+    """
+
+    def __init__(self):
+        self.timestamps = np.empty(64, dtype=np.int64)
+        self.values = np.empty(64, dtype=np.float64)
+        self.size = 0
+        self.watermark = 0
+        self.recent_ids = {}
+        self.synced_at = 0.0
+        self.lock = threading.Lock()
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        if needed <= len(self.timestamps):
+            return
+        capacity = max(needed, len(self.timestamps) * 2)
+        self.timestamps = np.resize(self.timestamps, capacity)
+        self.values = np.resize(self.values, capacity)
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray):
+        """Add readings, keeping the arrays sorted by timestamp"""
+        if len(timestamps) == 0:
+            return
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, values = timestamps[order], values[order]
+
+        self._reserve(len(timestamps))
+        if self.size == 0 or timestamps[0] >= self.timestamps[self.size - 1]:
+            # Common case: new readings are later than everything cached
+            self.timestamps[self.size:self.size + len(timestamps)] = timestamps
+            self.values[self.size:self.size + len(values)] = values
+            self.size += len(timestamps)
+            return
+
+        positions = np.searchsorted(self.timestamps[:self.size], timestamps, side="right")
+        merged_ts = np.insert(self.timestamps[:self.size], positions, timestamps)
+        merged_values = np.insert(self.values[:self.size], positions, values)
+        self.size = len(merged_ts)
+        self.timestamps[:self.size] = merged_ts
+        self.values[:self.size] = merged_values
+
+    def window(self, start: int, end: int):
+        """Copies of the readings with start <= timestamp <= end"""
+        ts = self.timestamps[:self.size]
+        lo = np.searchsorted(ts, start, side="left")
+        hi = np.searchsorted(ts, end, side="right")
+        return ts[lo:hi].copy(), self.values[lo:hi].copy()
+
+
+class GlucoseCache:
+    """LRU cache of GlucoseSeries keyed by user id"""
+
+    def __init__(self, max_users: int, sync_seconds: float, overlap_seconds: float):
+        self.max_users = max_users
+        self.sync_seconds = sync_seconds
+        self.overlap_seconds = overlap_seconds
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, user_id: int) -> GlucoseSeries:
+        with self._lock:
+            series = self._series.get(user_id)
+            if series is None:
+                series = GlucoseSeries()
+                self._series[user_id] = series
+                while len(self._series) > self.max_users:
+                    self._series.popitem(last=False)
+            else:
+                self._series.move_to_end(user_id)
+            return series
+
+    def series(self, db: Session, user_id: int) -> GlucoseSeries:
+        """
+        Get a user's series, loading readings added since the last sync
+        Other workers' inserts are picked up at most `sync_seconds` late.
+        Transactions can commit out of id order, so besides ids above the
+        watermark each sync re-reads the readings created in the last
+        `overlap_seconds` and skips those it already has.
+        """
+        series = self._get_or_create(user_id)
+        with series.lock:
+            if time.monotonic() - series.synced_at < self.sync_seconds:
+                return series
+
+            cutoff = datetime.utcnow() - timedelta(seconds=self.overlap_seconds)
+            rows = db.execute(
+                select(InsulinLog.id, InsulinLog.recorded_at, InsulinLog.glucose_reading, InsulinLog.created_at)
+                .where(
+                    InsulinLog.user_id == user_id,
+                    or_(InsulinLog.id > series.watermark, InsulinLog.created_at >= cutoff),
+                )
+                .order_by(InsulinLog.id)
+            ).all()
+            if rows:
+                series.watermark = max(series.watermark, rows[-1].id)
+            new_rows = [row for row in rows if row.id not in series.recent_ids]
+            if new_rows:
+                series.extend(
+                    _to_epoch([row.recorded_at for row in new_rows]),
+                    np.fromiter((row.glucose_reading for row in new_rows), dtype=np.float64, count=len(new_rows)),
+                )
+            series.recent_ids.update((row.id, row.created_at) for row in rows)
+            # Older readings are below the watermark and outside the next overlap
+            series.recent_ids = {
+                log_id: created_at for log_id, created_at in series.recent_ids.items()
+                if log_id > series.watermark or (created_at is not None and created_at >= cutoff)
+            }
+            series.synced_at = time.monotonic()
+            return series
+
+    def record(self, log: InsulinLog):
+        """Append a freshly committed log to its user's series, if cached"""
+        with self._lock:
+            series = self._series.get(log.user_id)
+        if series is None:
+            # Not loaded yet; the first analytics request reads it from the database
+            return
+        with series.lock:
+            if log.id in series.recent_ids:
+                return
+            series.extend(_to_epoch([log.recorded_at]), np.array([log.glucose_reading], dtype=np.float64))
+            series.recent_ids[log.id] = log.created_at
+
+    def forget(self, user_id: int):
+        """Drop a user's series (the user was deleted)"""
+        with self._lock:
+            self._series.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+glucose_cache = GlucoseCache(
+    max_users=settings.ANALYTICS_CACHE_USERS,
+    sync_seconds=settings.ANALYTICS_SYNC_SECONDS,
+    overlap_seconds=settings.ANALYTICS_SYNC_OVERLAP_SECONDS,
+)
+
+
+def _percent(mask: np.ndarray) -> float:
+    return round(float(mask.mean()) * 100, 1)
+
+
+def _rolling_daily_mean(timestamps: np.ndarray, values: np.ndarray, start: int):
+    """Trailing 7-day mean for every day that has readings in its window"""
+    day_index = (timestamps - start) // SECONDS_PER_DAY
+    n_days = int(day_index[-1]) + 1
+    sums = np.bincount(day_index, weights=values, minlength=n_days)
+    counts = np.bincount(day_index, minlength=n_days)
+
+    cum_sums = np.concatenate(([0.0], np.cumsum(sums)))
+    cum_counts = np.concatenate(([0], np.cumsum(counts)))
+    window_end = np.arange(1, n_days + 1)
+    window_start = np.maximum(window_end - ROLLING_WINDOW_DAYS, 0)
+    window_sums = cum_sums[window_end] - cum_sums[window_start]
+    window_counts = cum_counts[window_end] - cum_counts[window_start]
+
+    has_data = window_counts > 0
+    means = np.round(window_sums[has_data] / window_counts[has_data], 1)
+    first_day = datetime.utcfromtimestamp(start).date()
+    return [
+        {"date": (first_day + timedelta(days=int(day))).isoformat(), "mean_glucose": float(mean)}
+        for day, mean in zip(np.nonzero(has_data)[0], means)
+    ]
+
+
+def _detect_events(timestamps: np.ndarray, values: np.ndarray, mask: np.ndarray, extreme):
+    """Group consecutive out-of-range readings into events"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.nonzero(edges == 1)[0]
+    ends = np.nonzero(edges == -1)[0]
+    if len(starts) == 0:
+        return []
+    # Reduce over [start, end) segments; the sentinel keeps a final end index in bounds
+    bounds = np.column_stack((starts, ends)).ravel()
+    extremes = extreme.reduceat(np.append(values, 0.0), bounds)[::2]
+    return [
+        {
+            "start": _to_iso(timestamps[s]),
+            "end": _to_iso(timestamps[e - 1]),
+            "readings": int(e - s),
+            "extreme_glucose": float(x),
+        }
+        for s, e, x in zip(starts, ends, extremes)
+    ]
+
+
+def compute_glucose_analytics(timestamps: np.ndarray, values: np.ndarray, start: int) -> dict:
+    """All trend metrics for the readings of one window"""
+    count = len(values)
+    if count == 0:
+        return {
+            "total_entries": 0,
+            "mean_glucose": 0,
+            "std_glucose": 0,
+            "cv_percent": 0,
+            "gmi_percent": None,
+            "time_in_range": {"very_low": 0, "low": 0, "in_range": 0, "high": 0, "very_high": 0},
+            "rolling_7_day_mean": [],
+            "hypo_events": [],
+            "hyper_events": [],
+        }
+
+    mean = float(values.mean())
+    std = float(values.std(ddof=1)) if count > 1 else 0.0
+    return {
+        "total_entries": count,
+        "mean_glucose": round(mean, 1),
+        "std_glucose": round(std, 1),
+        "cv_percent": round(std / mean * 100, 1) if mean else 0,
+        # Glucose Management Indicator (estimated HbA1c), Bergenstal et al. 2018
+        "gmi_percent": round(3.31 + 0.02392 * mean, 1),
+        "time_in_range": {
+            "very_low": _percent(values < VERY_LOW),
+            "low": _percent((values >= VERY_LOW) & (values < LOW)),
+            "in_range": _percent((values >= LOW) & (values <= HIGH)),
+            "high": _percent((values > HIGH) & (values <= VERY_HIGH)),
+            "very_high": _percent(values > VERY_HIGH),
+        },
+        "rolling_7_day_mean": _rolling_daily_mean(timestamps, values, start),
+        "hypo_events": _detect_events(timestamps, values, values < LOW, np.minimum),
+        "hyper_events": _detect_events(timestamps, values, values > VERY_HIGH, np.maximum),
+    }
+
+
+def get_glucose_analytics(db: Session, user_id: int, days: int, now: Optional[datetime] = None) -> dict:
+    """Analytics for a user's readings over the last `days` days"""
+    now = now or datetime.utcnow()
+    end = int(_to_epoch([now])[0])
+    # Align the window to midnight UTC so rolling days are calendar days
+    start = (end // SECONDS_PER_DAY - days + 1) * SECONDS_PER_DAY
+
+    series = glucose_cache.series(db, user_id)
+    with series.lock:
+        timestamps, values = series.window(start, end)
+
+    result = {
+        "user_id": user_id,
+        "period_days": days,
+        "start": _to_iso(start),
+        "end": _to_iso(end),
+        "thresholds": {"very_low": VERY_LOW, "low": LOW, "high": HIGH, "very_high": VERY_HIGH},
+    }
+    result.update(compute_glucose_analytics(timestamps, values, start))
+    return result
@@ -0,0 +1,222 @@
+"""
+Append-only audit log of changes to family data
+
+Every create, update and delete of a user, medicine, reminder, medicine log,
+insulin log or bookmark is recorded as a ChangeEvent holding the changed fields as
+{field: [old, new]} and who made the change. Events go through a batched
+writer (the write-behind buffer), so auditing adds no database round-trip to
+the request; events still queued when the process is killed are lost.
+
+After every AUDIT_SNAPSHOT_EVERY events of an entity the writer stores its
+full state as an EntitySnapshot. The state at a point in time is the latest
+snapshot before it with the few events that follow replayed on top.
+"""
+import logging
+from datetime import datetime
+from typing import Iterable, Optional
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, func, insert, select, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Bookmark, ChangeEvent, EntitySnapshot, InsulinLog, Medicine, MedicineLog, Reminder, User
+from app.security import API_KEY_NAME, hash_api_key, verify_token
+from app.write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+# Audited models by the entity_type stored with their events
+ENTITY_MODELS = {
+    "user": User,
+    "medicine": Medicine,
+    "reminder": Reminder,
+    "medicine_log": MedicineLog,
+    "insulin_log": InsulinLog,
+    "bookmark": Bookmark,
+}
+ENTITY_TYPES = {model: entity_type for entity_type, model in ENTITY_MODELS.items()}
+
+# Optional header naming the family member acting (the credential is shared)
+ACTOR_HEADER = "X-Actor"
+
+
+def entity_state(entity) -> dict:
+    """JSON-ready column values of an ORM object or a Row returned by an INSERT"""
+    if isinstance(entity, Row):
+        return jsonable_encoder(dict(entity._mapping))
+    return jsonable_encoder({column.key: getattr(entity, column.key) for column in entity.__table__.columns})
+
+
+def audit_actor(request: Request) -> str:
+    """Who is making the change: the credential used, and the X-Actor name if sent"""
+    api_key = request.headers.get(API_KEY_NAME)
+    if api_key:
+        credential = f"key:{hash_api_key(api_key)[:12]}"
+    else:
+        _, _, token = request.headers.get("authorization", "").partition(" ")
+        credential = f"token:{verify_token(token).get('sub')}" if token else "anonymous"
+    name = request.headers.get(ACTOR_HEADER, "").strip()[:100]
+    return f"{name} ({credential})" if name else credential
+
+
+def diff(before: Optional[dict], after: Optional[dict]) -> dict:
+    """{field: [old, new]}: every field for a create or delete, the changed ones for an update"""
+    if before is None or after is None:
+        fields = (before or after).keys()
+    else:
+        fields = [field for field in after if before.get(field) != after[field]]
+    before = before or {}
+    after = after or {}
+    return {field: [before.get(field), after.get(field)] for field in fields}
+
+
+def record_change(model, family_id: int, actor: str, before: Optional[dict], after: Optional[dict]):
+    """
+    Audit one change; `before` is None for a create and `after` None for a delete
+    Both are `entity_state()` dicts. Updates that change nothing are skipped.
+    """
+    changes = diff(before, after)
+    if not changes:
+        return
+    action = "create" if before is None else "delete" if after is None else "update"
+    values = {
+        "family_id": family_id,
+        "entity_type": ENTITY_TYPES[model],
+        "entity_id": (after or before)["id"],
+        "action": action,
+        "changes": changes,
+        "actor": actor,
+    }
+    if audit_writer.submit(ChangeEvent, values) is None:
+        # Writer stopped or full: write the event directly rather than lose it
+        try:
+            with audit_writer.session_factory() as db:
+                db.execute(insert(ChangeEvent.__table__), [{**values, "created_at": datetime.utcnow()}])
+                db.commit()
+        except (SQLAlchemyError, TimeoutError):  # TimeoutError: the SQLite writer is busy
+            logger.exception("Could not record %s of %s %s", action, values["entity_type"], values["entity_id"])
+
+
+def audit_inserted(model, family_id: int, actor: str):
+    """`on_insert` callback auditing a row stored by the write-behind buffer"""
+    return lambda row: record_change(model, family_id, actor, None, entity_state(row))
+
+
+def state_at(db: Session, family_id: int, entity_type: str, entity_id: int, at: Optional[datetime] = None) -> Optional[dict]:
+    """
+    State of an entity at `at` (default: now), or None if nothing is recorded
+    Returns {"exists", "state", "event_id", "as_of"}; `exists` is False
+    before the entity was created or after it was deleted.
+    """
+    snapshots = select(EntitySnapshot).where(
+        EntitySnapshot.family_id == family_id,
+        EntitySnapshot.entity_type == entity_type,
+        EntitySnapshot.entity_id == entity_id,
+    )
+    events = select(ChangeEvent).where(
+        ChangeEvent.family_id == family_id,
+        ChangeEvent.entity_type == entity_type,
+        ChangeEvent.entity_id == entity_id,
+    )
+    if at is not None:
+        snapshots = snapshots.where(EntitySnapshot.as_of <= at)
+        events = events.where(ChangeEvent.created_at <= at)
+
+    snapshot = db.scalars(snapshots.order_by(EntitySnapshot.as_of.desc(), EntitySnapshot.id.desc()).limit(1)).first()
+    if snapshot is not None and snapshot.event_id is not None:
+        events = events.where(ChangeEvent.id > snapshot.event_id)
+    replay = db.scalars(events.order_by(ChangeEvent.id)).all()
+    if snapshot is None and not replay:
+        return None
+
+    if snapshot is not None:
+        result = {"exists": True, "state": dict(snapshot.state), "event_id": snapshot.event_id, "as_of": snapshot.as_of}
+    else:
+        result = {"exists": False, "state": {}, "event_id": None, "as_of": None}
+    for event in replay:
+        if event.action == "delete":
+            result["exists"] = False
+            result["state"] = {}
+        else:
+            result["exists"] = True
+            result["state"].update({field: new for field, (_, new) in event.changes.items()})
+        result["event_id"] = event.id
+        result["as_of"] = event.created_at
+    if not result["exists"]:
+        result["state"] = None
+    return result
+
+
+def entities_due_for_snapshot(db: Session, keys: Iterable[tuple], every: int):
+    """(family_id, entity_type, entity_id) of the entities with `every` or more events since their last snapshot"""
+    keys = list(keys)
+    latest = (
+        select(
+            EntitySnapshot.entity_type,
+            EntitySnapshot.entity_id,
+            func.max(EntitySnapshot.event_id).label("event_id"),
+        )
+        .where(tuple_(EntitySnapshot.entity_type, EntitySnapshot.entity_id).in_(keys))
+        .group_by(EntitySnapshot.entity_type, EntitySnapshot.entity_id)
+        .subquery()
+    )
+    stmt = (
+        select(ChangeEvent.family_id, ChangeEvent.entity_type, ChangeEvent.entity_id)
+        .outerjoin(latest, and_(
+            latest.c.entity_type == ChangeEvent.entity_type,
+            latest.c.entity_id == ChangeEvent.entity_id,
+        ))
+        .where(
+            tuple_(ChangeEvent.entity_type, ChangeEvent.entity_id).in_(keys),
+            ChangeEvent.id > func.coalesce(latest.c.event_id, 0),
+        )
+        .group_by(ChangeEvent.family_id, ChangeEvent.entity_type, ChangeEvent.entity_id)
+        .having(func.count() >= every)
+    )
+    return db.execute(stmt).all()
+
+
+class AuditWriter(WriteBehindBuffer):
+    """Batched change-event writer that also snapshots frequently changed entities"""
+
+    def __init__(self, session_factory, batch_size: int, flush_ms: int, queue_size: int, snapshot_every: int):
+        super().__init__(session_factory, batch_size, flush_ms, queue_size)
+        self.snapshot_every = snapshot_every
+
+    def _flush(self, batch):
+        super()._flush(batch)
+        self._take_snapshots({(row["entity_type"], row["entity_id"]) for _, row, _ in batch})
+
+    def _take_snapshots(self, keys):
+        db = self.session_factory()
+        try:
+            for family_id, entity_type, entity_id in entities_due_for_snapshot(db, keys, self.snapshot_every):
+                current = state_at(db, family_id, entity_type, entity_id)
+                if current is None or not current["exists"]:
+                    continue
+                db.add(EntitySnapshot(
+                    family_id=family_id,
+                    entity_type=entity_type,
+                    entity_id=entity_id,
+                    event_id=current["event_id"],
+                    state=current["state"],
+                    as_of=current["as_of"],
+                ))
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            logger.exception("Could not snapshot audited entities")
+        finally:
+            db.close()
+
+
+audit_writer = AuditWriter(
+    SessionLocal,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_ms=settings.AUDIT_FLUSH_MS,
+    queue_size=settings.AUDIT_QUEUE_SIZE,
+    snapshot_every=settings.AUDIT_SNAPSHOT_EVERY,
+)
@@ -0,0 +1,197 @@
+"""
+Request coalescing (single-flight) for identical concurrent reads
+
+The family's tablets tend to refresh together, right after a reminder
+fires, and send the same few reads within milliseconds of each other. For
+the routes in COALESCED_ROUTES, a GET that arrives while an identical one
+is running waits for it and gets a copy of its response instead of running
+its own queries. Identical means the same path, the same query parameters
+(in any order), the same credential, the same Accept / Accept-Encoding
+and the same last-write token (which picks primary or replica), since the
+response depends on all of them.
+
+Only requests that overlap are shared: nothing is cached once the first
+request has answered. If that request fails before producing a response,
+the waiting ones run on their own. A write bumps its credential's
+generation, which is part of the key, so a client never gets a read that
+started before its own write. A generation is only kept while its
+credential has a read or write in flight, since only those can be shared.
+"""
+import asyncio
+import re
+from collections import Counter
+from typing import Dict, Hashable, List, Optional
+from urllib.parse import parse_qsl
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.replica import LAST_WRITE_COOKIE, LAST_WRITE_HEADER
+from app.security import API_KEY_NAME, hash_api_key
+
+# Read routes the tablets poll, by name (used in the metrics)
+COALESCED_ROUTES = {
+    "users": re.compile(r"^/api/users/?$"),
+    "medicines": re.compile(r"^/api/medicines/?$"),
+    "reminders": re.compile(r"^/api/reminders/?$"),
+    "reminder_schedule": re.compile(r"^/api/reminders/schedule/?$"),
+    "missed_medicines": re.compile(r"^/api/reminders/logs/missed/?$"),
+    "daily_insulin_logs": re.compile(r"^/api/insulin/daily/?$"),
+}
+
+
+def coalesced_route(method: str, path: str) -> Optional[str]:
+    """Name of the coalesced route a request belongs to, or None"""
+    if method != "GET":
+        return None
+    for name, pattern in COALESCED_ROUTES.items():
+        if pattern.match(path):
+            return name
+    return None
+
+
+# HTTP methods that never change data
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def credential_key(headers: Headers) -> str:
+    """Hash of the caller's credential (never the credential itself)"""
+    credential = headers.get(API_KEY_NAME) or headers.get("authorization")
+    return hash_api_key(credential) if credential else ""
+
+
+def _cookie(headers: Headers, name: str) -> str:
+    for cookie in headers.get("cookie", "").split(";"):
+        key, _, value = cookie.strip().partition("=")
+        if key == name:
+            return value
+    return ""
+
+
+def request_key(scope: Scope, headers: Headers, credential: str, generation: int) -> Hashable:
+    """What makes two requests' responses identical"""
+    params = tuple(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+    return (
+        scope["path"].rstrip("/"),
+        params,
+        credential,
+        generation,
+        headers.get("accept", ""),
+        headers.get("accept-encoding", ""),
+        headers.get(LAST_WRITE_HEADER) or _cookie(headers, LAST_WRITE_COOKIE),
+    )
+
+
+class SingleFlight:
+    """Responses being produced, by request key, and coalescing counters"""
+
+    def __init__(self):
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.generations = Counter()  # Writes made with each credential while it had requests in flight
+        self.active = Counter()  # Leading reads and writes in flight, by credential
+        self.executed = Counter()  # Requests that ran, by route
+        self.coalesced = Counter()  # Requests answered with another's response, by route
+
+    def enter(self, credential: str):
+        self.active[credential] += 1
+
+    def leave(self, credential: str):
+        """Forget the credential's generation once none of its requests is in flight"""
+        self.active[credential] -= 1
+        if self.active[credential] <= 0:
+            del self.active[credential]
+            self.generations.pop(credential, None)
+
+    def metrics(self) -> dict:
+        routes = sorted(set(self.executed) | set(self.coalesced))
+        executed = sum(self.executed.values())
+        coalesced = sum(self.coalesced.values())
+        return {
+            "executed": executed,
+            "coalesced": coalesced,
+            "coalesced_ratio": round(coalesced / (executed + coalesced), 4) if executed + coalesced else 0.0,
+            "in_flight": len(self.in_flight),
+            "routes": {
+                route: {"executed": self.executed[route], "coalesced": self.coalesced[route]}
+                for route in routes
+            },
+        }
+
+    def reset(self):
+        self.executed.clear()
+        self.coalesced.clear()
+
+
+single_flight = SingleFlight()
+
+
+class CoalescingMiddleware:
+    """Share one execution and response body among identical concurrent reads"""
+
+    def __init__(self, app: ASGIApp, flights: SingleFlight):
+        self.app = app
+        self.flights = flights
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if scope["method"] not in SAFE_METHODS:
+            await self._write(scope, receive, send, credential_key(headers))
+            return
+        route = coalesced_route(scope["method"], scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        credential = credential_key(headers)
+        key = request_key(scope, headers, credential, self.flights.generations[credential])
+        leader = self.flights.in_flight.get(key)
+        if leader is not None:
+            messages = await asyncio.shield(leader)
+            if messages is not None:
+                self.flights.coalesced[route] += 1
+                for message in messages:
+                    await send(message)
+                return
+            # The shared request failed: run this one on its own
+            await self.app(scope, receive, send)
+            return
+
+        await self._lead(scope, receive, send, route, key, credential)
+
+    async def _write(self, scope: Scope, receive: Receive, send: Send, credential: str):
+        """Run a write, starting a new generation before the client learns it is done"""
+        async def send_after_bump(message: Message):
+            if message["type"] == "http.response.start":
+                self.flights.generations[credential] += 1
+            await send(message)
+
+        self.flights.enter(credential)
+        try:
+            await self.app(scope, receive, send_after_bump)
+        finally:
+            self.flights.generations[credential] += 1
+            self.flights.leave(credential)
+
+    async def _lead(self, scope: Scope, receive: Receive, send: Send, route: str, key: Hashable, credential: str):
+        """Run a read, keeping its response for the identical reads that arrive meanwhile"""
+        future = asyncio.get_running_loop().create_future()
+        self.flights.in_flight[key] = future
+        self.flights.enter(credential)
+        self.flights.executed[route] += 1
+        messages: List[Message] = []
+        complete = False
+
+        async def send_and_keep(message: Message):
+            nonlocal complete
+            messages.append(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                complete = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_keep)
+        finally:
+            del self.flights.in_flight[key]
+            self.flights.leave(credential)
+            future.set_result(messages if complete else None)
@@ -0,0 +1,139 @@
+"""
+Response compression middleware (brotli or gzip)
+
+Picks brotli when the client accepts it, otherwise gzip. Bodies smaller
+than `minimum_size` and already-compressed media are sent as they are.
+Streaming responses (exports) are compressed chunk by chunk and flushed
+after each chunk, so clients still receive data as it is produced.
+"""
+import zlib
+from typing import Optional
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Media that is already compressed
+UNCOMPRESSIBLE_PREFIXES = ("image/", "video/", "audio/", "application/zip", "application/gzip")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """'br', 'gzip' or None for an Accept-Encoding header"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, parameters = part.strip().partition(";")
+        quality = 1.0
+        key, _, value = parameters.strip().partition("=")
+        if key.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+    wildcard = accepted.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+class _Compressor:
+    """Incremental brotli/gzip compressor with a common interface"""
+
+    def __init__(self, coding: str, gzip_level: int, brotli_quality: int):
+        self.coding = coding
+        if coding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress and flush so the output can be sent now"""
+        if self.coding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.coding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+def compress(data: bytes, coding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """Compress a whole body"""
+    return _Compressor(coding, gzip_level, brotli_quality).finish(data)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, coding, self)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, coding: str, options: CompressionMiddleware):
+        self._send = send
+        self.coding = coding
+        self.options = options
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    def _should_compress(self, headers: Headers, body: bytes, more_body: bool) -> bool:
+        if "content-encoding" in headers:
+            return False
+        if headers.get("content-type", "").startswith(UNCOMPRESSIBLE_PREFIXES):
+            return False
+        return more_body or len(body) >= self.options.minimum_size
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk decides the encoding
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if not self._should_compress(headers, body, more_body):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            self.compressor = _Compressor(self.coding, self.options.gzip_level, self.options.brotli_quality)
+            headers["Content-Encoding"] = self.coding
+            headers.add_vary_header("Accept-Encoding")
+            # The compressed bytes differ from the entity the validator names
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            if more_body:
+                del headers["Content-Length"]
+                message["body"] = self.compressor.chunk(body)
+            else:
+                message["body"] = self.compressor.finish(body)
+                headers["Content-Length"] = str(len(message["body"]))
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        message["body"] = self.compressor.chunk(body) if more_body else self.compressor.finish(body)
+        await self._send(message)
@@ -0,0 +1,315 @@
+"""
+Background deletion of a user and everything they own
+
+Deleting a user with years of history in one transaction holds locks on
+thousands of rows and can outlast any request. Instead DELETE /api/users/{id}
+records a DeletionJob and returns; a worker thread removes the user's
+insulin logs, medicine logs, reminders and medicines in batches of
+DELETION_BATCH_SIZE rows (one short transaction each, children before
+parents) and the user last. Progress is committed with each batch, so
+GET /api/users/deletions/{job_id} can report it and a job interrupted by a
+restart resumes where it stopped.
+
+Every worker process runs a DeletionWorker, so a job is claimed before it
+runs: one conditional UPDATE makes the worker its owner, and each batch
+renews the lease (heartbeat_at) in the same transaction as its deletes,
+only while the worker still owns the job. A job whose owner stopped
+checking in for DELETION_LEASE_SECONDS is taken over by another worker.
+
+Rows of other users may still point at what is deleted (another user's
+insulin log at this user's medicine log); those optional references keep
+NO ACTION, so each batch clears them before deleting.
+
+Every deleted or detached row is audited like any other change. The schema also
+cascades these deletes (ON DELETE CASCADE), so deleting a user directly in
+the database leaves no orphans.
+"""
+import logging
+import os
+import queue
+import secrets
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.audit import ENTITY_TYPES, entity_state, record_change
+from app.config import settings
+from app.database import SessionLocal, read_after_commit
+from app.launcher import LAUNCHER_KEY, bump_launcher_version
+from app.models import DeletionJob, InsulinLog, Medicine, MedicineLog, Reminder, User
+from app.search import SEARCH_INDEX_KEY
+from app.tenancy import tenant_cache
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED = ("pending", "running")
+
+# Optional references into the deleted tables: model -> [(referring model, column)]
+DETACHED_REFERENCES = {
+    MedicineLog: [(InsulinLog, "medicine_log_id")],
+    Reminder: [(MedicineLog, "reminder_id")],
+}
+
+
+def _user_rows(family_id: int, user_id: int):
+    """(model, condition) of everything a user owns, in deletion order ending with the user"""
+    # Insulin logs may point at medicine logs, and medicine logs at reminders
+    # and medicines, so each is emptied before what it references
+    medicines = select(Medicine.id).where(Medicine.family_id == family_id, Medicine.user_id == user_id)
+    return [
+        (InsulinLog, InsulinLog.user_id == user_id),
+        (MedicineLog, or_(MedicineLog.user_id == user_id, MedicineLog.medicine_id.in_(medicines))),
+        (Reminder, Reminder.medicine_id.in_(medicines)),
+        (Medicine, Medicine.user_id == user_id),
+        (User, User.id == user_id),
+    ]
+
+
+def start_user_deletion(db: Session, family_id: int, user_id: int, actor: str) -> DeletionJob:
+    """Queue the deletion of a user, or return the unfinished job already deleting them"""
+    job = db.scalars(
+        select(DeletionJob).where(
+            DeletionJob.family_id == family_id,
+            DeletionJob.entity_type == "user",
+            DeletionJob.entity_id == user_id,
+            DeletionJob.status.in_(UNFINISHED),
+        )
+    ).first()
+    if job is None:
+        job = DeletionJob(family_id=family_id, entity_type="user", entity_id=user_id, deleted={}, actor=actor)
+        db.add(job)
+        db.commit()
+        read_after_commit(db)
+        db.refresh(job)
+        deletion_worker.submit(job.id)
+    return job
+
+
+class LeaseLost(Exception):
+    """Another worker took the job over (this one stopped checking in for too long)"""
+
+
+class DeletionWorker:
+    """Worker thread running deletion jobs one at a time, in batches"""
+
+    def __init__(self, session_factory, batch_size: int, pause_ms: int, lease_seconds: int):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.pause = pause_ms / 1000
+        self.lease = timedelta(seconds=lease_seconds)
+        self.owner: Optional[str] = None
+        self._queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._next_scan = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the worker and resume jobs left unfinished by the last run"""
+        if self.running:
+            return
+        # Set here rather than at import so forked worker processes differ
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._stopping.clear()
+        self._queue_claimable()
+        self._thread = threading.Thread(target=self._run, name="deletion", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop after the current batch; an unfinished job resumes at the next start"""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, job_id: int):
+        """Queue a job (it runs when the worker is started if it is not yet)"""
+        self._queue.put(job_id)
+
+    def _claimable(self):
+        """Jobs nobody is running: pending, or running with an expired lease"""
+        stale = datetime.utcnow() - self.lease
+        return or_(
+            DeletionJob.status == "pending",
+            and_(
+                DeletionJob.status == "running",
+                or_(DeletionJob.heartbeat_at.is_(None), DeletionJob.heartbeat_at < stale),
+            ),
+        )
+
+    def _queue_claimable(self):
+        """Queue the jobs this worker could claim (left by a restart or a stalled worker)"""
+        with self.session_factory() as db:
+            for job_id in db.scalars(select(DeletionJob.id).where(self._claimable()).order_by(DeletionJob.id)):
+                self._queue.put(job_id)
+        self._next_scan = time.monotonic() + self.lease.total_seconds()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if time.monotonic() >= self._next_scan:
+                try:
+                    self._queue_claimable()
+                except Exception:
+                    logger.exception("Looking for unclaimed deletion jobs failed")
+                    self._next_scan = time.monotonic() + self.lease.total_seconds()
+            try:
+                job_id = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.run_job(job_id)
+            except Exception:
+                # Keep the thread alive; an unfinished job is taken over once its lease runs out
+                logger.exception("Deletion job %s failed", job_id)
+
+    def _claim(self, db: Session, job_id: int) -> bool:
+        """Make this worker the job's owner, if nobody else is running it"""
+        claimed = db.execute(
+            update(DeletionJob.__table__)
+            .where(DeletionJob.id == job_id, self._claimable())
+            .values(status="running", owner=self.owner, heartbeat_at=datetime.utcnow())
+        ).rowcount
+        db.commit()
+        return claimed == 1
+
+    def _checkpoint(self, db: Session, job: DeletionJob):
+        """Renew the lease and commit the transaction, unless another worker took the job over"""
+        renewed = db.execute(
+            update(DeletionJob.__table__)
+            .where(DeletionJob.id == job.id, DeletionJob.owner == self.owner)
+            .values(heartbeat_at=datetime.utcnow())
+        ).rowcount
+        if renewed != 1:
+            db.rollback()
+            raise LeaseLost()
+        db.commit()
+
+    def _release(self, db: Session, job_id: int):
+        """Hand an unfinished job back so any worker can resume it right away"""
+        db.execute(
+            update(DeletionJob.__table__)
+            .where(DeletionJob.id == job_id, DeletionJob.owner == self.owner)
+            .values(status="pending", owner=None, heartbeat_at=None)
+        )
+        db.commit()
+
+    def run_job(self, job_id: int):
+        """Run a job to completion (or until the worker is stopped)"""
+        db = self.session_factory()
+        try:
+            if not self._claim(db, job_id):
+                return
+            job = db.get(DeletionJob, job_id)
+            if job.total is None:
+                job.total = self._count(db, job)
+                job.started_at = datetime.utcnow()
+                self._checkpoint(db, job)
+
+            for model, condition in _user_rows(job.family_id, job.entity_id):
+                while not self._stopping.is_set():
+                    if self._delete_batch(db, job, model, condition) < self.batch_size:
+                        break
+                    time.sleep(self.pause)
+                if self._stopping.is_set():
+                    self._release(db, job_id)
+                    return
+
+            job.status = "done"
+            job.finished_at = datetime.utcnow()
+            self._checkpoint(db, job)
+            tenant_cache.invalidate(job.family_id, "users", ("user", job.entity_id), SEARCH_INDEX_KEY, LAUNCHER_KEY)
+            # Only loaded (with numpy) once analytics were requested
+            analytics = sys.modules.get("app.analytics")
+            if analytics is not None:
+                analytics.glucose_cache.forget(job.entity_id)
+        except LeaseLost:
+            logger.warning("Deletion job %s was taken over by another worker", job_id)
+        except Exception as exc:
+            logger.exception("Deletion job %s failed", job_id)
+            self._fail(db, job_id, exc)
+        finally:
+            db.close()
+
+    def _fail(self, db: Session, job_id: int, exc: Exception):
+        """Mark the job failed with its error, if this worker still owns it"""
+        try:
+            db.rollback()
+            job = db.get(DeletionJob, job_id)
+            if job is not None and job.owner == self.owner:
+                job.status = "failed"
+                job.error = str(exc.orig if getattr(exc, "orig", None) is not None else exc)[:1000]
+                job.finished_at = datetime.utcnow()
+                db.commit()
+        except SQLAlchemyError:
+            # Left running: another worker takes it over once the lease runs out
+            db.rollback()
+            logger.exception("Could not mark deletion job %s failed", job_id)
+
+    @staticmethod
+    def _count(db: Session, job: DeletionJob) -> dict:
+        """{entity_type: rows} the job will delete"""
+        return {
+            ENTITY_TYPES[model]: db.scalar(
+                select(func.count()).select_from(model).where(model.family_id == job.family_id, condition)
+            )
+            for model, condition in _user_rows(job.family_id, job.entity_id)
+        }
+
+    @staticmethod
+    def _detach(db: Session, job: DeletionJob, model, ids: list) -> list:
+        """Clear references from surviving rows to the rows about to be deleted"""
+        detached = []
+        for referrer, column in DETACHED_REFERENCES.get(model, ()) if ids else ():
+            table = referrer.__table__
+            referring = db.execute(
+                select(table).where(table.c.family_id == job.family_id, table.c[column].in_(ids))
+            ).all()
+            if not referring:
+                continue
+            db.execute(update(table).where(table.c.id.in_([row.id for row in referring])).values({column: None}))
+            for row in referring:
+                before = entity_state(row)
+                detached.append((referrer, before, {**before, column: None}))
+        return detached
+
+    def _delete_batch(self, db: Session, job: DeletionJob, model, condition) -> int:
+        """Delete up to batch_size rows and record the progress in the same transaction"""
+        table = model.__table__
+        ids = db.scalars(
+            select(model.id)
+            .where(model.family_id == job.family_id, condition)
+            .order_by(model.id)
+            .limit(self.batch_size)
+        ).all()
+        detached = self._detach(db, job, model, ids)
+        rows = db.execute(delete(table).where(table.c.id.in_(ids)).returning(*table.columns)).all()
+        if model is User and rows:
+            bump_launcher_version(db, job.family_id)
+        entity_type = ENTITY_TYPES[model]
+        job.deleted = {**job.deleted, entity_type: job.deleted.get(entity_type, 0) + len(rows)}
+        self._checkpoint(db, job)
+
+        for referrer, before, after in detached:
+            record_change(referrer, job.family_id, job.actor, before, after)
+        for row in rows:
+            record_change(model, job.family_id, job.actor, entity_state(row), None)
+        if model is Medicine and rows:
+            tenant_cache.invalidate(job.family_id, SEARCH_INDEX_KEY, *(("medicine", row.id) for row in rows))
+        return len(rows)
+
+
+deletion_worker = DeletionWorker(
+    SessionLocal,
+    batch_size=settings.DELETION_BATCH_SIZE,
+    pause_ms=settings.DELETION_BATCH_PAUSE_MS,
+    lease_seconds=settings.DELETION_LEASE_SECONDS,
+)
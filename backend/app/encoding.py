@@ -0,0 +1,200 @@
+"""
+Compact encodings for list and sync endpoints
+
+Clients choose the encoding with the Accept header:
+
+- application/json (default): the regular response model
+- application/msgpack: the same documents as MessagePack
+- application/vnd.medicine-tracker.columnar+json (or +msgpack): one array
+  per field, with field names sent once, datetimes as epoch milliseconds
+  (UTC), dates as epoch days, times as seconds since midnight, UUIDs as
+  16 raw bytes (hex in JSON) and enums as integer codes:
+
+    {"fields": [...], "types": [...], "enums": {field: [values]},
+     "count": n, "columns": [[...], ...]}
+"""
+import enum
+import json
+import typing
+from dataclasses import dataclass
+from datetime import date, datetime, time, timezone
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Type
+from uuid import UUID
+import msgpack
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNAR_JSON = "application/vnd.medicine-tracker.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.medicine-tracker.columnar+msgpack"
+
+# Accept values mapped to the media type we answer with
+_MEDIA_TYPES = {
+    JSON: JSON,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    COLUMNAR_JSON: COLUMNAR_JSON,
+    COLUMNAR_MSGPACK: COLUMNAR_MSGPACK,
+}
+
+# OpenAPI `responses` entry for endpoints that support the compact encodings
+COMPACT_RESPONSES = {
+    200: {
+        "description": "JSON by default; MessagePack or columnar when requested with Accept",
+        "content": {MSGPACK: {}, COLUMNAR_JSON: {}, COLUMNAR_MSGPACK: {}},
+    }
+}
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _timestamp_ms(value: datetime) -> int:
+    # Stored datetimes are naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+def _epoch_days(value: date) -> int:
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+def _seconds_of_day(value: time) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+@dataclass(frozen=True)
+class ColumnCodec:
+    name: str
+    type: str  # int, float, bool, str, timestamp_ms, epoch_days, seconds_of_day, uuid, enum
+    convert: Optional[Callable[[Any], Any]] = None
+    enum_values: Optional[List[str]] = None
+
+
+def _unwrap_optional(annotation):
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _codec_for(name: str, annotation) -> ColumnCodec:
+    annotation = _unwrap_optional(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        # Codes are positions in the enum definition; new members must be appended
+        members = list(annotation)
+        codes = {member: code for code, member in enumerate(members)}
+        return ColumnCodec(name, "enum", codes.__getitem__, [member.value for member in members])
+    if annotation is datetime:
+        return ColumnCodec(name, "timestamp_ms", _timestamp_ms)
+    if annotation is date:
+        return ColumnCodec(name, "epoch_days", _epoch_days)
+    if annotation is time:
+        return ColumnCodec(name, "seconds_of_day", _seconds_of_day)
+    if annotation is UUID:
+        return ColumnCodec(name, "uuid", lambda value: value.bytes)
+    if annotation in (bool, int, float):
+        return ColumnCodec(name, annotation.__name__)
+    return ColumnCodec(name, "str")
+
+
+@lru_cache(maxsize=None)
+def columns_for(model: Type[BaseModel]) -> Tuple[ColumnCodec, ...]:
+    """Column layout of a response model, in field order"""
+    return tuple(_codec_for(name, field.annotation) for name, field in model.model_fields.items())
+
+
+def encode_columnar(items: Sequence[BaseModel], model: Type[BaseModel]) -> dict:
+    """Columnar document for validated response models"""
+    codecs = columns_for(model)
+    columns = []
+    for codec in codecs:
+        values = [getattr(item, codec.name) for item in items]
+        if codec.convert is not None:
+            values = [None if value is None else codec.convert(value) for value in values]
+        columns.append(values)
+    return {
+        "fields": [codec.name for codec in codecs],
+        "types": [codec.type for codec in codecs],
+        "enums": {codec.name: codec.enum_values for codec in codecs if codec.enum_values},
+        "count": len(items),
+        "columns": columns,
+    }
+
+
+def _json_default(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps_json(document) -> bytes:
+    # Same separators as Starlette's JSONResponse
+    return json.dumps(
+        document, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_json_default
+    ).encode("utf-8")
+
+
+def _quality(parameters: List[str]) -> float:
+    for parameter in parameters:
+        key, _, value = parameter.strip().partition("=")
+        if key.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Media type to answer with for an Accept header (JSON unless a compact type wins)"""
+    if not accept:
+        return JSON
+    best, best_quality = JSON, 0.0
+    for part in accept.split(","):
+        media_range, *parameters = part.split(";")
+        media_type = _MEDIA_TYPES.get(media_range.strip().lower())
+        if media_type is None:
+            continue
+        quality = _quality(parameters)
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def response_encoding(request: Request, response: Response) -> str:
+    """Dependency: the negotiated media type for a list endpoint"""
+    response.headers["Vary"] = "Accept"
+    return negotiate(request.headers.get("accept"))
+
+
+def encode_body(items: Sequence[BaseModel], model: Type[BaseModel], media_type: str) -> bytes:
+    """Encode validated response models in a compact media type"""
+    if media_type == MSGPACK:
+        return msgpack.packb(jsonable_encoder(items), use_bin_type=True)
+    document = encode_columnar(items, model)
+    if media_type == COLUMNAR_MSGPACK:
+        return msgpack.packb(document, use_bin_type=True)
+    return _dumps_json(document)
+
+
+def encode_list(rows, model: Type[BaseModel], media_type: str):
+    """
+    Rows for a list endpoint in the negotiated encoding
+    JSON returns the rows unchanged so the endpoint's response_model applies;
+    the compact encodings return a ready Response.
+    """
+    if media_type == JSON:
+        return rows
+    items = [model.model_validate(row) for row in rows]
+    return Response(
+        content=encode_body(items, model, media_type),
+        media_type=media_type,
+        headers={"Vary": "Accept"},
+    )
@@ -0,0 +1,22 @@
+"""
+Server-generated identifiers
+"""
+import os
+import time
+import uuid
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (RFC 9562, version 7)
+    48-bit millisecond timestamp followed by random bits, so ids sort by
+    creation time and index well.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (timestamp_ms & ((1 << 48) - 1)) << 80
+    value |= 0x7 << 76  # version
+    value |= (rand >> 68) << 64  # 12 random bits
+    value |= 0b10 << 62  # variant
+    value |= rand & ((1 << 62) - 1)  # 62 random bits
+    return uuid.UUID(int=value)
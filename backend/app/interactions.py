@@ -0,0 +1,213 @@
+"""
+Drug-interaction and duplicate-therapy checks against a user's active medicines
+
+The reference data ships with the app (app/data/drugs.csv and
+drug_interactions.csv, or INTERACTION_DATA_DIR) and is loaded once at
+startup into hashed lookups:
+
+- aliases: normalized brand/generic name -> generic ids, so "Dolo 650" and
+  "Crocin Advance" both resolve to paracetamol
+- pairs: packed (concept id, concept id) -> interaction, where a concept is a
+  generic or a drug class, so one "warfarin + nsaid" row covers every NSAID
+
+Medicine names are free text, so a name resolves to generics by matching its
+word n-grams (longest first) against the aliases. Checking one medicine
+against k others is then k pair lookups per resolved generic: O(k), with no
+database work beyond reading the k names.
+
+This is a safety net, not clinical advice: the dataset is small and a
+missing warning does not mean a combination is safe.
+"""
+import csv
+from functools import lru_cache
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Medicine
+from app.search import tokenize
+
+DEFAULT_DATA_DIR = Path(__file__).parent / "data"
+
+SEVERITIES = ("major", "moderate", "minor")  # Most severe first
+
+# Longest alias, in words, matched against medicine names
+MAX_ALIAS_WORDS = 3
+
+
+class Interaction(NamedTuple):
+    kind: str  # "interaction", "duplicate_therapy" or "duplicate_ingredient"
+    severity: str
+    description: str
+
+
+def normalize(name: str) -> str:
+    """Case-folded words of a drug name joined by single spaces"""
+    return " ".join(tokenize(name))
+
+
+def _read_rows(path: Path) -> List[dict]:
+    """CSV rows of a data file, skipping "#" comment lines"""
+    with open(path, newline="", encoding="utf-8") as file:
+        lines = [line for line in file if not line.startswith("#")]
+    return list(csv.DictReader(lines))
+
+
+def _pair_key(a: int, b: int) -> int:
+    return (a << 20) | b if a <= b else (b << 20) | a
+
+
+class InteractionIndex:
+    """Generic/class ids, alias lookup and pair lookup built from the data files"""
+
+    def __init__(self, drugs_path: Path, interactions_path: Path):
+        self.names: List[str] = []  # Concept id -> generic or class name
+        self.concepts: Dict[str, int] = {}  # Generic or class name -> concept id
+        self.drug_class: Dict[int, int] = {}  # Generic id -> class id
+        self.aliases: Dict[str, Tuple[int, ...]] = {}  # Normalized alias -> generic ids
+        self.pairs: Dict[int, Interaction] = {}  # Packed concept pair -> interaction
+
+        generics, classes = set(), set()
+        for row in _read_rows(drugs_path):
+            generic, drug_class = normalize(row["generic"]), normalize(row["class"])
+            generics.add(generic)
+            classes.add(drug_class)
+            generic_id, class_id = self._concept(generic), self._concept(drug_class)
+            self.drug_class[generic_id] = class_id
+            for alias in [generic, *row["aliases"].split(";")]:
+                alias = normalize(alias)
+                if alias:
+                    ids = self.aliases.get(alias, ())
+                    if generic_id not in ids:
+                        self.aliases[alias] = ids + (generic_id,)
+        if generics & classes:
+            raise ValueError(f"Names used as both a drug and a class: {', '.join(sorted(generics & classes))}")
+
+        for row in _read_rows(interactions_path):
+            a, b = normalize(row["drug_a"]), normalize(row["drug_b"])
+            for name in (a, b):
+                if name not in self.concepts:
+                    raise ValueError(f"Unknown drug or class in {interactions_path.name}: {name}")
+            if row["severity"] not in SEVERITIES:
+                raise ValueError(f"Unknown severity in {interactions_path.name}: {row['severity']}")
+            kind = "duplicate_therapy" if a == b and a in classes else "interaction"
+            self.pairs[_pair_key(self.concepts[a], self.concepts[b])] = Interaction(
+                kind, row["severity"], row["description"].strip()
+            )
+
+    def _concept(self, name: str) -> int:
+        if name not in self.concepts:
+            self.concepts[name] = len(self.names)
+            self.names.append(name)
+        return self.concepts[name]
+
+    def resolve(self, name: str) -> Tuple[int, ...]:
+        """Generic ids found in a medicine name, matching the longest aliases first"""
+        words = [word for word in tokenize(name) if not word.isdigit()]
+        found = []
+        i = 0
+        while i < len(words):
+            for size in range(min(MAX_ALIAS_WORDS, len(words) - i), 0, -1):
+                ids = self.aliases.get(" ".join(words[i:i + size]))
+                if ids:
+                    found.extend(generic_id for generic_id in ids if generic_id not in found)
+                    i += size
+                    break
+            else:
+                i += 1
+        return tuple(found)
+
+    def _between(self, a: int, b: int) -> List[Interaction]:
+        """Interactions between two generics, by generic and by class"""
+        if a == b:
+            return [Interaction(
+                "duplicate_ingredient",
+                "major",
+                f"Both contain {self.names[a]}; taking both risks a double dose",
+            )]
+        class_a, class_b = self.drug_class[a], self.drug_class[b]
+        found = []
+        for key in {_pair_key(a, b), _pair_key(a, class_b), _pair_key(class_a, b), _pair_key(class_a, class_b)}:
+            interaction = self.pairs.get(key)
+            if interaction is not None and interaction not in found:
+                found.append(interaction)
+        return found
+
+    def conflicts(self, name: str, others: Iterable[Tuple[int, str]]) -> List[Tuple[int, str, Interaction]]:
+        """(other id, other name, interaction) for each conflict between `name` and the (id, name) pairs"""
+        generics = self.resolve(name)
+        if not generics:
+            return []
+        found = []
+        for other_id, other_name in others:
+            other_generics = self.resolve(other_name)
+            seen = []
+            for a in generics:
+                for b in other_generics:
+                    for interaction in self._between(a, b):
+                        if interaction not in seen:
+                            seen.append(interaction)
+                            found.append((other_id, other_name, interaction))
+        found.sort(key=lambda conflict: SEVERITIES.index(conflict[2].severity))
+        return found
+
+
+@lru_cache(maxsize=1)
+def get_interaction_index() -> InteractionIndex:
+    """The interaction index, loaded from the data files on first use"""
+    data_dir = Path(settings.INTERACTION_DATA_DIR) if settings.INTERACTION_DATA_DIR else DEFAULT_DATA_DIR
+    return InteractionIndex(data_dir / "drugs.csv", data_dir / "drug_interactions.csv")
+
+
+def _active_medicines(db: Session, family_id: int, user_id: int) -> List[Tuple[int, str]]:
+    """(id, name) of a user's active medicines"""
+    stmt = select(Medicine.id, Medicine.name).where(
+        Medicine.family_id == family_id,
+        Medicine.user_id == user_id,
+        Medicine.is_active.is_(True),
+    )
+    return [tuple(row) for row in db.execute(stmt)]
+
+
+def _conflict(medicine_id: int, medicine_name: str, other_id: int, other_name: str, interaction: Interaction) -> dict:
+    return {
+        "medicine_id": medicine_id,
+        "medicine_name": medicine_name,
+        "other_medicine_id": other_id,
+        "other_medicine_name": other_name,
+        **interaction._asdict(),
+    }
+
+
+def check_medicine(db: Session, medicine: Medicine) -> List[dict]:
+    """Conflicts between a medicine and its user's other active medicines (none if it is inactive)"""
+    if not medicine.is_active:
+        return []
+    index = get_interaction_index()
+    if not index.resolve(medicine.name):
+        return []
+    others = [
+        (other_id, other_name)
+        for other_id, other_name in _active_medicines(db, medicine.family_id, medicine.user_id)
+        if other_id != medicine.id
+    ]
+    return [
+        _conflict(medicine.id, medicine.name, other_id, other_name, interaction)
+        for other_id, other_name, interaction in index.conflicts(medicine.name, others)
+    ]
+
+
+def check_user(db: Session, family_id: int, user_id: int) -> List[dict]:
+    """Every conflict within a user's active medicines, most severe first"""
+    index = get_interaction_index()
+    medicines = _active_medicines(db, family_id, user_id)
+    found = []
+    for (medicine_id, name), other in combinations(medicines, 2):
+        found.extend(
+            _conflict(medicine_id, name, other_id, other_name, interaction)
+            for other_id, other_name, interaction in index.conflicts(name, [other])
+        )
+    found.sort(key=lambda conflict: SEVERITIES.index(conflict["severity"]))
+    return found
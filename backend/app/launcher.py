@@ -0,0 +1,65 @@
+"""
+Precomputed launcher bundle: the family's users and active bookmarks
+
+The launcher home screen needs everyone's avatar and every call shortcut.
+Rather than one request per list, it fetches GET /api/launcher, whose body
+is built once per family and kept in the tenant cache, serialized. Every
+write to users or bookmarks bumps families.launcher_version in its own
+transaction, and the cached bundle is only served while that version is
+unchanged, so it is rebuilt after something on the screen changed, in
+whichever worker handled the write.
+
+The bundle's version is a hash of its content, so it is the same in every
+worker and across rebuilds that change nothing; it is sent as the ETag and
+a launcher that already has it gets 304 Not Modified.
+"""
+import hashlib
+from typing import Tuple
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.models import Bookmark, Family, User
+from app.schemas import BookmarkResponse, LauncherBundle, LauncherUser
+from app.tenancy import cached_versioned
+
+# Tenant cache key of the family's serialized bundle
+LAUNCHER_KEY = "launcher"
+
+
+def build_launcher_bundle(db: Session, family_id: int) -> Tuple[str, bytes]:
+    """(version, JSON body) of the family's launcher bundle"""
+    users = [
+        LauncherUser.model_validate(user)
+        for user in db.query(User).filter(User.family_id == family_id).order_by(User.id)
+    ]
+    bookmarks = [
+        BookmarkResponse.model_validate(bookmark)
+        for bookmark in db.query(Bookmark)
+        .filter(Bookmark.family_id == family_id, Bookmark.is_active.is_(True))
+        .order_by(Bookmark.id)
+    ]
+    content = LauncherBundle(version="", users=users, bookmarks=bookmarks)
+    version = hashlib.sha256(content.model_dump_json(exclude={"version"}).encode()).hexdigest()[:20]
+    content.version = version
+    return version, content.model_dump_json().encode()
+
+
+def bump_launcher_version(db: Session, family_id: int):
+    """Mark the family's launcher bundle changed, as part of the caller's transaction"""
+    db.execute(
+        update(Family.__table__)
+        .where(Family.id == family_id)
+        .values(launcher_version=Family.launcher_version + 1)
+    )
+
+
+def launcher_bundle(db: Session, family_id: int) -> Tuple[str, bytes]:
+    """The family's launcher bundle, from the cache when it has not changed"""
+    changes = db.scalar(select(Family.launcher_version).where(Family.id == family_id))
+    return cached_versioned(db, family_id, LAUNCHER_KEY, changes, lambda: build_launcher_bundle(db, family_id))
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header names `etag` (weak comparison, as for GET)"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
@@ -3,16 +3,23 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from app.database import engine
+from app.database import engine, SessionLocal
 from app.models import Base
-from app.routers import users, medicines, reminders, insulin_logs, auth
-from app.security import limiter, verify_api_key
+from app.routers import users, medicines, reminders, insulin_logs, auth, exports, families, audit, bookmarks, launcher
+from app.audit import audit_writer
+from app.admission import AdmissionMiddleware, admission
+from app.coalescing import CoalescingMiddleware, single_flight
+from app.compression import CompressionMiddleware
+from app.deletion import deletion_worker
+from app.interactions import get_interaction_index
+from app.replica import record_write
+from app.reports import shutdown_report_pool
+from app.write_behind import write_behind
+from app.security import limiter, verify_api_key, get_current_family
+from app.tenancy import ensure_default_family
 from app.config import settings
 import os
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="Medicine Tracker API",
     description="Backend API for Family Medication Reminder and Launcher Application (Secured)",
@@ -35,6 +42,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (brotli or gzip, per Accept-Encoding)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+)
+
 # Security middleware to check if API key is configured
 @app.middleware("http")
 async def check_api_key_configured(request: Request, call_next):
@@ -47,6 +62,25 @@ async def check_api_key_configured(request: Request, call_next):
     response = await call_next(request)
     return response
 
+# Keep a client's reads on the primary for a while after it writes
+@app.middleware("http")
+async def track_recent_writes(request: Request, call_next):
+    """Read-your-writes stickiness when a read replica is configured"""
+    response = await call_next(request)
+    record_write(request, response)
+    return response
+
+# Admission control: runs before the middleware above and the routes, so it
+# rejects before any other work. Only coalescing (added next) runs before it.
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+
+# Identical concurrent reads wait for the one already running. Added last,
+# so it is the outermost middleware: waiting copies never reach admission
+# control and take no request slot.
+if settings.COALESCING_ENABLED:
+    app.add_middleware(CoalescingMiddleware, flights=single_flight)
+
 # Include routers - Protected routes
 app.include_router(
     auth.router, 
@@ -54,34 +88,104 @@ app.include_router(
     tags=["Authentication"]
 )
 
+app.include_router(
+    families.router, 
+    prefix="/api/families", 
+    tags=["Families"],
+    dependencies=[Depends(verify_api_key)]  # Requires the server-wide API Key
+)
+
 app.include_router(
     users.router, 
     prefix="/api/users", 
     tags=["Users"],
-    dependencies=[Depends(verify_api_key)]  # Requires API Key
+    dependencies=[Depends(get_current_family)]  # Requires API Key or Bearer token
 )
 
 app.include_router(
     medicines.router, 
     prefix="/api/medicines", 
     tags=["Medicines"],
-    dependencies=[Depends(verify_api_key)]  # Requires API Key
+    dependencies=[Depends(get_current_family)]  # Requires API Key or Bearer token
 )
 
 app.include_router(
     reminders.router, 
     prefix="/api/reminders", 
     tags=["Reminders"],
-    dependencies=[Depends(verify_api_key)]  # Requires API Key
+    dependencies=[Depends(get_current_family)]  # Requires API Key or Bearer token
 )
 
 app.include_router(
     insulin_logs.router, 
     prefix="/api/insulin", 
     tags=["Insulin Logs"],
-    dependencies=[Depends(verify_api_key)]  # Requires API Key
+    dependencies=[Depends(get_current_family)]  # Requires API Key or Bearer token
+)
+
+app.include_router(
+    bookmarks.router, 
+    prefix="/api/bookmarks", 
+    tags=["Bookmarks"],
+    dependencies=[Depends(get_current_family)]  # Requires API Key or Bearer token
 )
 
+app.include_router(
+    launcher.router, 
+    prefix="/api/launcher", 
+    tags=["Launcher"],
+    dependencies=[Depends(get_current_family)]  # Requires API Key or Bearer token
+)
+
+app.include_router(
+    exports.router, 
+    prefix="/api/exports", 
+    tags=["Exports"],
+    dependencies=[Depends(get_current_family)]  # Requires API Key or Bearer token
+)
+
+app.include_router(
+    audit.router, 
+    prefix="/api/audit", 
+    tags=["Audit"],
+    dependencies=[Depends(get_current_family)]  # Requires API Key or Bearer token
+)
+
+@app.on_event("startup")
+def init_database():
+    """Create database tables and the default family"""
+    # Runs at startup rather than import so importing the app (tests,
+    # tooling, the import-time profile) does not need a database
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        ensure_default_family(db)
+
+@app.on_event("startup")
+def load_interaction_data():
+    """Load the drug-interaction index so the first medicine write does not pay for it"""
+    get_interaction_index()
+
+@app.on_event("startup")
+def start_write_behind():
+    """Start the audit log writer, and the log write-behind worker when enabled"""
+    audit_writer.start()
+    if settings.WRITE_BEHIND_ENABLED:
+        write_behind.start()
+
+@app.on_event("startup")
+def start_deletion_worker():
+    """Start the background user-deletion worker and resume unfinished jobs"""
+    deletion_worker.start()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    """Flush queued log writes and audit events, and stop PDF rendering workers"""
+    # Deletions and write-behind first: both queue audit events
+    deletion_worker.stop()
+    write_behind.stop()
+    audit_writer.stop()
+    shutdown_report_pool()
+
 @app.get("/")
 @limiter.limit("10/minute")
 async def root(request: Request):
@@ -94,6 +198,11 @@ async def root(request: Request):
         "docs": "/docs" if settings.ENVIRONMENT == "development" else "disabled in production"
     }
 
+@app.get("/api/metrics/coalescing", tags=["Metrics"], dependencies=[Depends(get_current_family)])
+async def coalescing_metrics():
+    """Reads executed and reads answered with a concurrent identical read's response, per route"""
+    return single_flight.metrics()
+
 @app.get("/health")
 @limiter.limit("20/minute")
 async def health_check(request: Request):
@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Enum as SQLEnum, Text
+from sqlalchemy import Column, Integer, String, DateTime, Date, Time, Boolean, Float, ForeignKey, ForeignKeyConstraint, Enum as SQLEnum, Text, Uuid, Index, UniqueConstraint, JSON, DDL, event, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from typing import Optional
 import enum
 from app.database import Base
+from app.ids import uuid7
 
 class MedicineType(str, enum.Enum):
     TABLET = "tablet"
@@ -15,31 +17,92 @@ class ReminderStatus(str, enum.Enum):
     MISSED = "missed"
     SNOOZED = "snoozed"
 
+# References between tenant tables are composite (parent id, family_id)
+# foreign keys, so the database rejects a row pointing at another family's
+# parent. Each parent carries a unique (family_id, id) for them to target.
+# Owning references (user -> medicines -> reminders and logs) cascade on
+# delete; optional ones (a log's reminder) do not, since nulling reminder_id
+# would also null family_id.
+def family_foreign_key(column: str, parent: str, name: str, ondelete: Optional[str] = None) -> ForeignKeyConstraint:
+    return ForeignKeyConstraint(
+        [column, "family_id"], [f"{parent}.id", f"{parent}.family_id"], name=name, ondelete=ondelete
+    )
+
+# pg_trgm ships with PostgreSQL's contrib packages; without it medicine
+# search works without fuzzy matching and its trigram indexes are skipped
+def pg_trgm_available(ddl, target, bind, **kw) -> bool:
+    if bind is None:
+        return False
+    return bind.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first() is not None
+
+def trigram_index(name: str, column: str) -> Index:
+    return Index(
+        name, column, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}
+    ).ddl_if(dialect="postgresql", callable_=pg_trgm_available)
+
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql", callable_=pg_trgm_available),
+)
+
+# Full-text document of a medicine ('simple' configuration: no stemming, so
+# English and Telugu are tokenized alike). Search queries use this exact
+# expression so PostgreSQL can use the index on it.
+MEDICINE_SEARCH_VECTOR = "to_tsvector('simple'::regconfig, coalesce(name, '') || ' ' || coalesce(instructions, ''))"
+
+# Family Model (tenant: one household; every other row belongs to one)
+class Family(Base):
+    __tablename__ = "families"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    # SHA-256 of the family's API key (the key itself is never stored)
+    api_key_hash = Column(String, nullable=True, unique=True)
+    # Bumped with every change to users or bookmarks, so each worker can tell its cached launcher bundle is stale
+    launcher_version = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # User Model
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        UniqueConstraint("family_id", "id", name="uq_users_family_id_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
     name = Column(String, nullable=False)
     photo_url = Column(String, nullable=True)
     # Optional emoji avatar (e.g., "👨", "👩", "👴")
     avatar_emoji = Column(String, nullable=True)
+    # IANA time zone that reminder times are expressed in (e.g., "Asia/Kolkata")
+    timezone = Column(String, nullable=False, default="UTC", server_default="UTC")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    # Relationships
-    medicines = relationship("Medicine", back_populates="user")
-    medicine_logs = relationship("MedicineLog", back_populates="user")
-    insulin_logs = relationship("InsulinLog", back_populates="user")
+    # Relationships (children are removed by ON DELETE CASCADE, never loaded for it)
+    medicines = relationship("Medicine", back_populates="user", foreign_keys="Medicine.user_id", passive_deletes=True)
+    medicine_logs = relationship("MedicineLog", back_populates="user", foreign_keys="MedicineLog.user_id", passive_deletes=True)
+    insulin_logs = relationship("InsulinLog", back_populates="user", foreign_keys="InsulinLog.user_id", passive_deletes=True)
 
 # Medicine Model
 class Medicine(Base):
     __tablename__ = "medicines"
+    __table_args__ = (
+        Index("ix_medicines_family_id_user_id", "family_id", "user_id", "is_active"),
+        UniqueConstraint("family_id", "id", name="uq_medicines_family_id_id"),
+        family_foreign_key("user_id", "users", "fk_medicines_user", ondelete="CASCADE"),
+        trigram_index("ix_medicines_name_trgm", "name"),
+        trigram_index("ix_medicines_instructions_trgm", "instructions"),
+        Index("ix_medicines_search", text(MEDICINE_SEARCH_VECTOR), postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    user_id = Column(Integer, nullable=False)
     name = Column(String, nullable=False)
-    type = Column(SQLEnum(MedicineType), nullable=False)
+    type = Column(SQLEnum(MedicineType, create_constraint=True), nullable=False)
     dosage = Column(String, nullable=True)
     instructions = Column(Text, nullable=True)
     image_url = Column(String, nullable=True)
@@ -48,34 +111,55 @@ class Medicine(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    user = relationship("User", back_populates="medicines")
-    reminders = relationship("Reminder", back_populates="medicine")
-    medicine_logs = relationship("MedicineLog", back_populates="medicine")
+    user = relationship("User", back_populates="medicines", foreign_keys=[user_id])
+    reminders = relationship("Reminder", back_populates="medicine", foreign_keys="Reminder.medicine_id", passive_deletes=True)
+    medicine_logs = relationship("MedicineLog", back_populates="medicine", foreign_keys="MedicineLog.medicine_id", passive_deletes=True)
 
 # Reminder Model (Scheduled reminders)
 class Reminder(Base):
     __tablename__ = "reminders"
+    __table_args__ = (
+        Index("ix_reminders_family_id_medicine_id", "family_id", "medicine_id"),
+        UniqueConstraint("family_id", "id", name="uq_reminders_family_id_id"),
+        family_foreign_key("medicine_id", "medicines", "fk_reminders_medicine", ondelete="CASCADE"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
-    scheduled_time = Column(String, nullable=False)  # Format: "HH:MM"
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    medicine_id = Column(Integer, nullable=False)
+    scheduled_time = Column(Time, nullable=False, index=True)  # Wall-clock time in the user's time zone
+    # Recurrence: NULL means every day
+    days_of_week = Column(Integer, nullable=True)  # Bitmask, Monday = 1, Tuesday = 2, ... Sunday = 64
+    interval_days = Column(Integer, nullable=True)  # Every N days, counted from start_date
+    start_date = Column(Date, nullable=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    medicine = relationship("Medicine", back_populates="reminders")
-    medicine_logs = relationship("MedicineLog", back_populates="reminder")
+    medicine = relationship("Medicine", back_populates="reminders", foreign_keys=[medicine_id])
+    medicine_logs = relationship("MedicineLog", back_populates="reminder", foreign_keys="MedicineLog.reminder_id")
 
 # Medicine Log (Actual intake records)
 class MedicineLog(Base):
     __tablename__ = "medicine_logs"
+    __table_args__ = (
+        Index("ix_medicine_logs_family_id_user_id", "family_id", "user_id", "scheduled_at"),
+        Index("ix_medicine_logs_family_id_status", "family_id", "status", "scheduled_at"),
+        UniqueConstraint("family_id", "id", name="uq_medicine_logs_family_id_id"),
+        family_foreign_key("user_id", "users", "fk_medicine_logs_user", ondelete="CASCADE"),
+        family_foreign_key("medicine_id", "medicines", "fk_medicine_logs_medicine", ondelete="CASCADE"),
+        family_foreign_key("reminder_id", "reminders", "fk_medicine_logs_reminder"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    medicine_id = Column(Integer, ForeignKey("medicines.id"), nullable=False)
-    reminder_id = Column(Integer, ForeignKey("reminders.id"), nullable=True)
-    status = Column(SQLEnum(ReminderStatus), nullable=False)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    # Server-generated id returned before the row is written (write-behind mode)
+    uuid = Column(Uuid, nullable=False, unique=True, default=uuid7)
+    user_id = Column(Integer, nullable=False)
+    medicine_id = Column(Integer, nullable=False)
+    reminder_id = Column(Integer, nullable=True)
+    status = Column(SQLEnum(ReminderStatus, create_constraint=True), nullable=False)
     scheduled_at = Column(DateTime, nullable=False)
     taken_at = Column(DateTime, nullable=True)
     snooze_count = Column(Integer, default=0)
@@ -83,17 +167,24 @@ class MedicineLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
-    user = relationship("User", back_populates="medicine_logs")
-    medicine = relationship("Medicine", back_populates="medicine_logs")
-    reminder = relationship("Reminder", back_populates="medicine_logs")
+    user = relationship("User", back_populates="medicine_logs", foreign_keys=[user_id])
+    medicine = relationship("Medicine", back_populates="medicine_logs", foreign_keys=[medicine_id])
+    reminder = relationship("Reminder", back_populates="medicine_logs", foreign_keys=[reminder_id])
 
 # Insulin Log (Glucose readings and insulin tracking)
 class InsulinLog(Base):
     __tablename__ = "insulin_logs"
+    __table_args__ = (
+        Index("ix_insulin_logs_family_id_user_id", "family_id", "user_id", "recorded_at"),
+        family_foreign_key("user_id", "users", "fk_insulin_logs_user", ondelete="CASCADE"),
+        family_foreign_key("medicine_log_id", "medicine_logs", "fk_insulin_logs_medicine_log"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    medicine_log_id = Column(Integer, ForeignKey("medicine_logs.id"), nullable=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    uuid = Column(Uuid, nullable=False, unique=True, default=uuid7)
+    user_id = Column(Integer, nullable=False)
+    medicine_log_id = Column(Integer, nullable=True)
     glucose_reading = Column(Float, nullable=False)  # mg/dL
     insulin_dosage = Column(Float, nullable=False)  # Units
     suggested_dosage = Column(Float, nullable=True)  # Units
@@ -102,13 +193,17 @@ class InsulinLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
-    user = relationship("User", back_populates="insulin_logs")
+    user = relationship("User", back_populates="insulin_logs", foreign_keys=[user_id])
 
 # Communication Bookmark Model
 class Bookmark(Base):
     __tablename__ = "bookmarks"
+    __table_args__ = (
+        Index("ix_bookmarks_family_id", "family_id", "is_active"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
     name = Column(String, nullable=False)
     phone_number = Column(String, nullable=False)
     contact_type = Column(String, nullable=False)  # "phone" or "whatsapp"
@@ -119,3 +214,94 @@ class Bookmark(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+# Change Event (append-only audit log of every mutation of family data)
+class ChangeEvent(Base):
+    __tablename__ = "change_events"
+    __table_args__ = (
+        Index("ix_change_events_entity", "entity_type", "entity_id", "id"),
+        Index("ix_change_events_family_id", "family_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    uuid = Column(Uuid, nullable=False, unique=True, default=uuid7)
+    entity_type = Column(String, nullable=False)  # "user", "medicine", "reminder", "medicine_log", "insulin_log", "bookmark"
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # "create", "update" or "delete"
+    changes = Column(JSON, nullable=False)  # {field: [old, new]}
+    actor = Column(String, nullable=True)  # Credential (and X-Actor name) that made the change
+    created_at = Column(DateTime, default=datetime.utcnow)  # When the change was made
+
+# Entity Snapshot (full state of an entity after a given change event)
+class EntitySnapshot(Base):
+    __tablename__ = "entity_snapshots"
+    __table_args__ = (
+        Index("ix_entity_snapshots_entity", "entity_type", "entity_id", "as_of"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    entity_type = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    event_id = Column(Integer, nullable=True)  # Last event included; NULL for baselines of pre-audit rows
+    state = Column(JSON, nullable=False)
+    as_of = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Deletion Job (background removal of a user and everything they own)
+class DeletionJob(Base):
+    __tablename__ = "deletion_jobs"
+    __table_args__ = (
+        Index("ix_deletion_jobs_family_id", "family_id", "entity_type", "entity_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    entity_type = Column(String, nullable=False)  # "user"
+    entity_id = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # "pending", "running", "done" or "failed"
+    total = Column(JSON, nullable=True)  # {entity_type: rows to delete}, counted when the job starts
+    deleted = Column(JSON, nullable=False, default=dict)  # {entity_type: rows deleted so far}
+    error = Column(Text, nullable=True)
+    actor = Column(String, nullable=True)  # Who asked for the deletion (recorded with its audit events)
+    owner = Column(String, nullable=True)  # Worker running the job ("host:pid:random")
+    heartbeat_at = Column(DateTime, nullable=True)  # Last time the owner checked in; the lease runs from here
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+# Failed Write (a write-behind row the database rejected after the client got 202)
+class FailedWrite(Base):
+    __tablename__ = "failed_writes"
+    __table_args__ = (
+        Index("ix_failed_writes_family_id", "family_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
+    uuid = Column(Uuid, nullable=False, unique=True)  # uuid returned with the 202
+    table_name = Column(String, nullable=False)  # "medicine_logs", "insulin_logs" or "change_events"
+    payload = Column(JSON, nullable=False)  # The row as queued
+    error = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# The audit log is append-only: the database rejects updates and deletes
+event.listen(
+    ChangeEvent.__table__,
+    "after_create",
+    DDL(
+        "CREATE OR REPLACE FUNCTION change_events_append_only() RETURNS trigger LANGUAGE plpgsql AS $$ "
+        "BEGIN RAISE EXCEPTION 'change_events is append-only'; END $$; "
+        "CREATE TRIGGER change_events_append_only BEFORE UPDATE OR DELETE ON change_events "
+        "FOR EACH ROW EXECUTE FUNCTION change_events_append_only()"
+    ).execute_if(dialect="postgresql"),
+)
+for operation in ("UPDATE", "DELETE"):
+    event.listen(
+        ChangeEvent.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TRIGGER change_events_no_{operation.lower()} BEFORE {operation} ON change_events "
+            "BEGIN SELECT RAISE(ABORT, 'change_events is append-only'); END"
+        ).execute_if(dialect="sqlite"),
+    )
@@ -0,0 +1,107 @@
+"""
+Read-replica routing
+
+Read-only endpoints take `get_read_db` instead of `get_db`. When
+DATABASE_REPLICA_URL is set their sessions go to the replica, except for
+clients that made a write in the last READ_YOUR_WRITES_SECONDS: those keep
+reading from the primary so they see their own changes despite replication
+lag. Writes always use the primary.
+
+The time of a client's last write travels with the client, not in a
+worker's memory: a successful write answers with a signed token (the
+X-Last-Write header and a cookie of the same value) that the client sends
+back, so any worker can tell it wrote recently. The token is bound to the
+credential that made the write.
+"""
+import hashlib
+import hmac
+import time
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy.orm import Session, sessionmaker
+from app.config import settings
+from app.database import ReadSessionLocal, ReplicaSessionLocal
+from app.security import API_KEY_NAME, SECRET_KEY, hash_api_key
+
+# HTTP methods that never count as writes
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+LAST_WRITE_HEADER = "X-Last-Write"
+LAST_WRITE_COOKIE = "last_write"
+
+
+def _signature(key: str, written_ms: int) -> str:
+    message = f"{key}:{written_ms}".encode()
+    return hmac.new(SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def last_write_token(key: str, written_ms: Optional[int] = None) -> str:
+    """Signed "<epoch ms>.<signature>" token saying the client `key` wrote at that time"""
+    if written_ms is None:
+        written_ms = int(time.time() * 1000)
+    return f"{written_ms}.{_signature(key, written_ms)}"
+
+
+def wrote_recently(token: Optional[str], key: str) -> bool:
+    """Whether a client's token proves a write within READ_YOUR_WRITES_SECONDS"""
+    if not token:
+        return False
+    written, _, signature = token.partition(".")
+    if not written.isdigit() or not hmac.compare_digest(signature, _signature(key, int(written))):
+        return False
+    age = time.time() - int(written) / 1000
+    # Small negative ages are clock skew between workers
+    return -settings.READ_YOUR_WRITES_SECONDS < age < settings.READ_YOUR_WRITES_SECONDS
+
+
+def replica_enabled() -> bool:
+    return ReplicaSessionLocal is not None
+
+
+def client_key(request: Request) -> Optional[str]:
+    """Stable key for the caller's credential (never the credential itself)"""
+    credential = request.headers.get(API_KEY_NAME) or request.headers.get("authorization")
+    return hash_api_key(credential) if credential else None
+
+
+def read_sessionmaker(request: Request) -> sessionmaker:
+    """Session factory for a read-only request: replica unless the client just wrote"""
+    if not replica_enabled():
+        return ReadSessionLocal
+    key = client_key(request)
+    if key is not None:
+        token = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+        if wrote_recently(token, key):
+            return ReadSessionLocal
+    return ReplicaSessionLocal
+
+
+def record_write(request: Request, response: Response):
+    """Pin the client's reads to the primary after a successful write"""
+    if not replica_enabled() or request.method in SAFE_METHODS or response.status_code >= 400:
+        return
+    key = client_key(request)
+    if key is None:
+        return
+    token = last_write_token(key)
+    response.headers[LAST_WRITE_HEADER] = token
+    response.set_cookie(
+        LAST_WRITE_COOKIE,
+        token,
+        max_age=max(int(settings.READ_YOUR_WRITES_SECONDS), 1),
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def is_replica(db: Session) -> bool:
+    return bool(db.info.get("replica"))
+
+
+# Dependency to get a read-only database session
+def get_read_db(request: Request):
+    db = read_sessionmaker(request)()
+    try:
+        yield db
+    finally:
+        db.close()
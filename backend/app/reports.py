@@ -0,0 +1,174 @@
+"""
+PDF report rendering for history exports
+
+Only the standard library is imported here so that worker processes in the
+report pool start quickly.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+# A4 portrait, in PDF points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 40
+FONT_SIZE = 8
+LEADING = 11
+# Courier glyphs are 0.6em wide, so columns line up without font metrics
+CHARS_PER_LINE = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.6))
+HEADER_LINES = 4
+ROWS_PER_PAGE = int((PAGE_HEIGHT - 2 * MARGIN) / LEADING) - HEADER_LINES
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_report_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Get the shared process pool used for rendering report pages"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_report_pool():
+    """Stop the report pool workers (called on application shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _escape(text: str) -> bytes:
+    """Encode text for a PDF string literal (non WinAnsi characters become '?')"""
+    data = text.encode("cp1252", errors="replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _format_row(values: Sequence[str], widths: Sequence[int]) -> str:
+    cells = []
+    for value, width in zip(values, widths):
+        value = value.replace("\n", " ")
+        cells.append(value[:width].ljust(width))
+    return " ".join(cells)[:CHARS_PER_LINE]
+
+
+def render_page(
+    title: str,
+    header: Sequence[str],
+    widths: Sequence[int],
+    rows: List[Sequence[str]],
+    page_number: int,
+) -> bytes:
+    """
+    Render one page of a tabular section into a PDF content stream
+    Runs inside the report process pool, so arguments must be picklable
+    """
+    lines = [
+        f"{title}  -  page {page_number}",
+        "",
+        _format_row(header, widths),
+        "-" * min(sum(widths) + len(widths) - 1, CHARS_PER_LINE),
+    ]
+    lines.extend(_format_row(row, widths) for row in rows)
+
+    parts = [
+        b"BT",
+        b"/F1 %d Tf" % FONT_SIZE,
+        b"%d TL" % LEADING,
+        b"%d %d Td" % (MARGIN, PAGE_HEIGHT - MARGIN),
+    ]
+    for line in lines:
+        parts.append(b"(" + _escape(line) + b") '")
+    parts.append(b"ET")
+    return b"\n".join(parts)
+
+
+def render_cover(lines: Sequence[str]) -> bytes:
+    """Render the report cover page"""
+    parts = [
+        b"BT",
+        b"/F1 14 Tf",
+        b"22 TL",
+        b"%d %d Td" % (MARGIN, PAGE_HEIGHT - MARGIN - 60),
+    ]
+    for line in lines:
+        parts.append(b"(" + _escape(line) + b") '")
+    parts.append(b"ET")
+    return b"\n".join(parts)
+
+
+class PdfWriter:
+    """
+    Incremental PDF writer
+    Each method returns the bytes to send next, so a report can be streamed
+    page by page. Only object offsets are kept in memory.
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+    FONT_ID = 3
+
+    def __init__(self):
+        self._offsets = {}
+        self._position = 0
+        self._page_ids = []
+        self._next_id = 4
+
+    def _object(self, obj_id: int, body: bytes) -> bytes:
+        data = b"%d 0 obj\n" % obj_id + body + b"\nendobj\n"
+        self._offsets[obj_id] = self._position
+        self._position += len(data)
+        return data
+
+    def begin(self) -> bytes:
+        """Header, catalog and font objects"""
+        header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self._position = len(header)
+        return (
+            header
+            + self._object(self.CATALOG_ID, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES_ID)
+            + self._object(
+                self.FONT_ID,
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+            )
+        )
+
+    def add_page(self, content: bytes) -> bytes:
+        """Content stream and page objects for one rendered page"""
+        content_id = self._next_id
+        page_id = content_id + 1
+        self._next_id += 2
+        self._page_ids.append(page_id)
+
+        stream = b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"
+        page = (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (self.PAGES_ID, PAGE_WIDTH, PAGE_HEIGHT, self.FONT_ID, content_id)
+        )
+        return self._object(content_id, stream) + self._object(page_id, page)
+
+    def end(self) -> bytes:
+        """Page tree, cross-reference table and trailer"""
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self._page_ids)
+        data = self._object(
+            self.PAGES_ID,
+            b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._page_ids)),
+        )
+
+        xref_offset = self._position
+        size = self._next_id
+        xref = [b"xref", b"0 %d" % size, b"0000000000 65535 f "]
+        for obj_id in range(1, size):
+            xref.append(b"%010d 00000 n " % self._offsets[obj_id])
+        trailer = b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            size, self.CATALOG_ID, xref_offset
+        )
+        return data + b"\n".join(xref) + b"\n" + trailer
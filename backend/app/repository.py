@@ -0,0 +1,40 @@
+"""
+Primary-key lookups and existence checks for the hot request paths
+
+Building a `db.query(...)` per call costs a statement cache-key walk and
+ORM result setup on every request. Here:
+
+- `get_in_family` uses `Session.get`, which answers from the identity map
+  when the row is already loaded and otherwise runs SQLAlchemy's cached
+  load-by-primary-key statement.
+- `exists_in_family` and `family_id_for_key` are `lambda_stmt`s: the
+  statement is built and compiled once per model and later calls only
+  bind new parameters.
+"""
+from typing import Optional, Type, TypeVar
+from sqlalchemy import lambda_stmt, literal, select
+from sqlalchemy.orm import Session
+from app.models import Family
+
+T = TypeVar("T")
+
+
+def get_in_family(db: Session, model: Type[T], family_id: int, entity_id: int) -> Optional[T]:
+    """Entity by primary key if it belongs to the family, else None"""
+    entity = db.get(model, entity_id)
+    if entity is None or entity.family_id != family_id:
+        return None
+    return entity
+
+
+def exists_in_family(db: Session, model, family_id: int, entity_id: int) -> bool:
+    """Whether the family owns the entity, without loading it"""
+    stmt = lambda_stmt(lambda: select(literal(1)), track_on=[model])
+    stmt += lambda s: s.where(model.id == entity_id, model.family_id == family_id).limit(1)
+    return db.execute(stmt).first() is not None
+
+
+def family_id_for_key(db: Session, key_hash: str) -> Optional[int]:
+    """Family owning an API key hash"""
+    stmt = lambda_stmt(lambda: select(Family.id).where(Family.api_key_hash == key_hash))
+    return db.execute(stmt).scalar()
@@ -0,0 +1,73 @@
+"""
+Audit log: change history of an entity and its state at a point in time
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime, timezone
+from app.replica import get_read_db
+from app.models import ChangeEvent
+from app.schemas import ChangeEventResponse, EntityStateResponse
+from app.security import get_current_family
+from app.audit import ENTITY_MODELS, state_at
+
+router = APIRouter()
+
+
+def _check_entity_type(entity_type: str):
+    if entity_type not in ENTITY_MODELS:
+        raise HTTPException(status_code=404, detail=f"Unknown entity type: {entity_type}")
+
+
+@router.get("/{entity_type}/{entity_id}/events", response_model=List[ChangeEventResponse])
+def get_entity_events(
+    entity_type: str,
+    entity_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """Changes made to an entity, newest first"""
+    _check_entity_type(entity_type)
+    stmt = (
+        select(ChangeEvent)
+        .where(
+            ChangeEvent.family_id == family_id,
+            ChangeEvent.entity_type == entity_type,
+            ChangeEvent.entity_id == entity_id,
+        )
+        .order_by(ChangeEvent.id.desc())
+        .limit(limit)
+    )
+    return db.scalars(stmt).all()
+
+
+@router.get("/{entity_type}/{entity_id}", response_model=EntityStateResponse)
+def get_entity_state(
+    entity_type: str,
+    entity_id: int,
+    at: Optional[datetime] = None,
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """
+    State of an entity at a point in time (UTC, default now), rebuilt from
+    the nearest snapshot and the changes recorded after it
+    """
+    _check_entity_type(entity_type)
+    at = at or datetime.utcnow()
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    result = state_at(db, family_id, entity_type, entity_id, at)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No history recorded for this entity at that time")
+    return EntityStateResponse(
+        entity_type=entity_type,
+        entity_id=entity_id,
+        at=at,
+        exists=result["exists"],
+        state=result["state"],
+        as_of=result["as_of"],
+    )
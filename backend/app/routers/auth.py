@@ -4,6 +4,7 @@ Authentication endpoints
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from datetime import timedelta
+from functools import lru_cache
 from app.security import (
     create_access_token,
     verify_password,
@@ -11,6 +12,7 @@ from app.security import (
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from app.config import settings
+from app.tenancy import DEFAULT_FAMILY_ID
 
 router = APIRouter()
 
@@ -34,7 +36,12 @@ class APIKeyResponse(BaseModel):
 # In production, store users in database
 # For now, using environment variable
 ADMIN_USERNAME = settings.API_KEY or "admin"  # Use API_KEY as admin identifier
-ADMIN_PASSWORD_HASH = get_password_hash(settings.API_KEY or "change-me-in-production")
+
+
+@lru_cache(maxsize=None)
+def get_admin_password_hash() -> str:
+    """bcrypt hash of the admin password, computed on the first login"""
+    return get_password_hash(settings.API_KEY or "change-me-in-production")
 
 
 @router.post("/login", response_model=TokenResponse)
@@ -50,7 +57,7 @@ async def login(request: LoginRequest):
             detail="Incorrect username or password"
         )
     
-    if not verify_password(request.password, ADMIN_PASSWORD_HASH):
+    if not verify_password(request.password, get_admin_password_hash()):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -59,7 +66,7 @@ async def login(request: LoginRequest):
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": request.username},
+        data={"sub": request.username, "family_id": DEFAULT_FAMILY_ID},
         expires_delta=access_token_expires
     )
     
@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from app.database import get_db, read_after_commit
+from app.replica import get_read_db
+from app.models import Bookmark
+from app.schemas import BookmarkCreate, BookmarkUpdate, BookmarkResponse
+from app.security import get_current_family
+from app.repository import get_in_family
+from app.writes import insert_returning
+from app.audit import audit_actor, entity_state, record_change
+from app.tenancy import tenant_cache
+from app.launcher import LAUNCHER_KEY, bump_launcher_version
+
+router = APIRouter()
+
+@router.post("/", response_model=BookmarkResponse, status_code=201)
+def create_bookmark(
+    bookmark: BookmarkCreate,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
+    """Create a phone or WhatsApp call shortcut for the launcher"""
+    bump_launcher_version(db, family_id)  # Committed with the insert
+    db_bookmark = insert_returning(db, Bookmark, {**bookmark.model_dump(), "family_id": family_id})
+    tenant_cache.invalidate(family_id, LAUNCHER_KEY)
+    record_change(Bookmark, family_id, actor, None, entity_state(db_bookmark))
+    return db_bookmark
+
+@router.get("/", response_model=List[BookmarkResponse])
+def get_bookmarks(
+    is_active: bool = True,
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """Get the family's bookmarks (deleted ones with is_active=false)"""
+    query = db.query(Bookmark).filter(Bookmark.family_id == family_id, Bookmark.is_active == is_active)
+    return query.order_by(Bookmark.id).all()
+
+@router.get("/{bookmark_id}", response_model=BookmarkResponse)
+def get_bookmark(bookmark_id: int, db: Session = Depends(get_read_db), family_id: int = Depends(get_current_family)):
+    """Get bookmark by ID"""
+    bookmark = get_in_family(db, Bookmark, family_id, bookmark_id)
+    if not bookmark:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+    return bookmark
+
+@router.put("/{bookmark_id}", response_model=BookmarkResponse)
+def update_bookmark(
+    bookmark_id: int,
+    bookmark_update: BookmarkUpdate,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
+    """Update bookmark details"""
+    bookmark = get_in_family(db, Bookmark, family_id, bookmark_id)
+    if not bookmark:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+
+    before = entity_state(bookmark)
+    for key, value in bookmark_update.model_dump(exclude_unset=True).items():
+        setattr(bookmark, key, value)
+    bump_launcher_version(db, family_id)
+
+    db.commit()
+    read_after_commit(db)
+    db.refresh(bookmark)
+    tenant_cache.invalidate(family_id, LAUNCHER_KEY)
+    record_change(Bookmark, family_id, actor, before, entity_state(bookmark))
+    return bookmark
+
+@router.delete("/{bookmark_id}", status_code=204)
+def delete_bookmark(
+    bookmark_id: int,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
+    """Delete (deactivate) a bookmark"""
+    bookmark = get_in_family(db, Bookmark, family_id, bookmark_id)
+    if not bookmark:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+
+    before = entity_state(bookmark)
+    bookmark.is_active = False
+    after = entity_state(bookmark)
+    bump_launcher_version(db, family_id)
+    db.commit()
+    tenant_cache.invalidate(family_id, LAUNCHER_KEY)
+    record_change(Bookmark, family_id, actor, before, after)
+    return None
@@ -0,0 +1,221 @@
+"""
+History export endpoints (CSV and PDF) for sharing with doctors
+"""
+import csv
+import enum
+import io
+from collections import deque
+from datetime import datetime
+from typing import Iterator, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.replica import get_read_db, read_sessionmaker
+from app.models import InsulinLog, MedicineLog, Medicine
+from app.security import get_current_family
+from app.tenancy import get_family_user
+from app import reports
+
+router = APIRouter()
+
+INSULIN_HEADER = ["recorded_at", "glucose_reading", "insulin_dosage", "suggested_dosage", "notes"]
+MEDICINE_LOG_HEADER = ["scheduled_at", "medicine", "dosage", "status", "taken_at", "snooze_count", "notes"]
+
+# Column widths (characters) used in the PDF tables
+INSULIN_WIDTHS = [19, 9, 9, 9, 50]
+MEDICINE_LOG_WIDTHS = [19, 24, 10, 8, 19, 3, 20]
+
+# Pages submitted to the report pool ahead of the one being written
+PDF_PIPELINE_DEPTH = 4
+
+
+def _parse_range(start: Optional[str], end: Optional[str]):
+    try:
+        start_at = datetime.fromisoformat(start) if start else None
+        end_at = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="start and end must be ISO dates")
+    if start_at and end_at and start_at > end_at:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    return start_at, end_at
+
+
+def _insulin_stmt(family_id: int, user_id: int, start_at: Optional[datetime], end_at: Optional[datetime]):
+    stmt = select(
+        InsulinLog.recorded_at,
+        InsulinLog.glucose_reading,
+        InsulinLog.insulin_dosage,
+        InsulinLog.suggested_dosage,
+        InsulinLog.notes,
+    ).where(InsulinLog.family_id == family_id, InsulinLog.user_id == user_id)
+    if start_at:
+        stmt = stmt.where(InsulinLog.recorded_at >= start_at)
+    if end_at:
+        stmt = stmt.where(InsulinLog.recorded_at <= end_at)
+    # yield_per makes the driver use a server-side cursor
+    return stmt.order_by(InsulinLog.recorded_at).execution_options(
+        yield_per=settings.EXPORT_BATCH_SIZE
+    )
+
+
+def _medicine_log_stmt(family_id: int, user_id: int, start_at: Optional[datetime], end_at: Optional[datetime]):
+    stmt = select(
+        MedicineLog.scheduled_at,
+        Medicine.name,
+        Medicine.dosage,
+        MedicineLog.status,
+        MedicineLog.taken_at,
+        MedicineLog.snooze_count,
+        MedicineLog.notes,
+    ).join(Medicine, Medicine.id == MedicineLog.medicine_id).where(
+        MedicineLog.family_id == family_id, MedicineLog.user_id == user_id
+    )
+    if start_at:
+        stmt = stmt.where(MedicineLog.scheduled_at >= start_at)
+    if end_at:
+        stmt = stmt.where(MedicineLog.scheduled_at <= end_at)
+    return stmt.order_by(MedicineLog.scheduled_at).execution_options(
+        yield_per=settings.EXPORT_BATCH_SIZE
+    )
+
+
+def _text(value) -> str:
+    """Render a column value for CSV/PDF output"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, enum.Enum):
+        return value.value
+    return str(value)
+
+
+def _stream_csv(header, stmt, session_factory) -> Iterator[str]:
+    """Write CSV rows one cursor batch at a time"""
+    # The request's session is closed before the body is streamed,
+    # so the generator owns its own session
+    db = session_factory()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for partition in db.execute(stmt).partitions():
+            writer.writerows([_text(value) for value in row] for row in partition)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def _stream_pdf(user_name: str, family_id: int, user_id: int, start_at, end_at, session_factory) -> Iterator[bytes]:
+    """Render report pages in the process pool and stream them in order"""
+    pool = reports.get_report_pool(settings.REPORT_WORKERS)
+    writer = reports.PdfWriter()
+    period = f"{_text(start_at) or 'beginning'} to {_text(end_at) or 'now'}"
+    cover = [
+        "Medicine Tracker - History Report",
+        f"Patient: {user_name}",
+        f"Period: {period}",
+        f"Generated: {_text(datetime.utcnow())} UTC",
+        "",
+        "Glucose readings are in mg/dL, insulin in units.",
+    ]
+    sections = [
+        ("Glucose & insulin", INSULIN_HEADER, INSULIN_WIDTHS, _insulin_stmt(family_id, user_id, start_at, end_at)),
+        ("Medicine intake", MEDICINE_LOG_HEADER, MEDICINE_LOG_WIDTHS, _medicine_log_stmt(family_id, user_id, start_at, end_at)),
+    ]
+
+    db = session_factory()
+    try:
+        yield writer.begin()
+        yield writer.add_page(reports.render_cover(cover))
+
+        pending = deque()
+        for title, header, widths, stmt in sections:
+            page_number = 0
+            for partition in db.execute(stmt).partitions(reports.ROWS_PER_PAGE):
+                page_number += 1
+                rows = [[_text(value) for value in row] for row in partition]
+                pending.append(pool.submit(reports.render_page, title, header, widths, rows, page_number))
+                if len(pending) >= PDF_PIPELINE_DEPTH:
+                    yield writer.add_page(pending.popleft().result())
+
+        while pending:
+            yield writer.add_page(pending.popleft().result())
+        yield writer.end()
+    finally:
+        db.close()
+
+
+def _attachment(filename: str) -> dict:
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+@router.get("/insulin.csv")
+def export_insulin_csv(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """Stream a user's glucose and insulin history as CSV"""
+    get_family_user(db, family_id, user_id)
+    start_at, end_at = _parse_range(start, end)
+    return StreamingResponse(
+        _stream_csv(
+            INSULIN_HEADER,
+            _insulin_stmt(family_id, user_id, start_at, end_at),
+            read_sessionmaker(request),
+        ),
+        media_type="text/csv",
+        headers=_attachment(f"insulin-{user_id}.csv"),
+    )
+
+
+@router.get("/medicine-logs.csv")
+def export_medicine_logs_csv(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """Stream a user's medicine intake history as CSV"""
+    get_family_user(db, family_id, user_id)
+    start_at, end_at = _parse_range(start, end)
+    return StreamingResponse(
+        _stream_csv(
+            MEDICINE_LOG_HEADER,
+            _medicine_log_stmt(family_id, user_id, start_at, end_at),
+            read_sessionmaker(request),
+        ),
+        media_type="text/csv",
+        headers=_attachment(f"medicine-logs-{user_id}.csv"),
+    )
+
+
+@router.get("/report.pdf")
+def export_report_pdf(
+    request: Request,
+    user_id: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """Stream a printable PDF report of glucose and medicine history"""
+    user = get_family_user(db, family_id, user_id)
+    start_at, end_at = _parse_range(start, end)
+    return StreamingResponse(
+        _stream_pdf(user.name, family_id, user_id, start_at, end_at, read_sessionmaker(request)),
+        media_type="application/pdf",
+        headers=_attachment(f"report-{user_id}.pdf"),
+    )
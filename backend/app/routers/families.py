@@ -0,0 +1,54 @@
+"""
+Family (tenant) administration - requires the server-wide API key
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from app.database import get_db, read_after_commit
+from app.models import Family
+from app.schemas import FamilyCreate, FamilyResponse, FamilyKeyResponse
+from app.security import generate_api_key, hash_api_key, forget_family_key
+
+router = APIRouter()
+
+@router.post("/", response_model=FamilyKeyResponse, status_code=201)
+def create_family(family: FamilyCreate, db: Session = Depends(get_db)):
+    """Create a family and its API key (the key is only shown once)"""
+    api_key = generate_api_key()
+    db_family = Family(name=family.name, api_key_hash=hash_api_key(api_key))
+    db.add(db_family)
+    db.commit()
+    read_after_commit(db)
+    db.refresh(db_family)
+    return FamilyKeyResponse(
+        id=db_family.id,
+        name=db_family.name,
+        created_at=db_family.created_at,
+        api_key=api_key
+    )
+
+@router.get("/", response_model=List[FamilyResponse])
+def get_families(db: Session = Depends(get_db)):
+    """Get all families"""
+    return db.query(Family).order_by(Family.id).all()
+
+@router.post("/{family_id}/rotate-key", response_model=FamilyKeyResponse)
+def rotate_family_key(family_id: int, db: Session = Depends(get_db)):
+    """Replace a family's API key"""
+    family = db.query(Family).filter(Family.id == family_id).first()
+    if not family:
+        raise HTTPException(status_code=404, detail="Family not found")
+    
+    if family.api_key_hash:
+        forget_family_key(family.api_key_hash)
+    api_key = generate_api_key()
+    family.api_key_hash = hash_api_key(api_key)
+    db.commit()
+    read_after_commit(db)
+    db.refresh(family)
+    return FamilyKeyResponse(
+        id=family.id,
+        name=family.name,
+        created_at=family.created_at,
+        api_key=api_key
+    )
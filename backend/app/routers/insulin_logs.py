@@ -1,14 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+import sys
 from typing import List
 from datetime import datetime, timedelta
+from uuid import UUID
 from app.database import get_db
-from app.models import InsulinLog, User, MedicineType
-from app.schemas import InsulinLogCreate, InsulinLogResponse
+from app.replica import get_read_db
+from app.models import InsulinLog, MedicineLog
+from app.schemas import InsulinLogCreate, InsulinLogResponse, QueuedWriteResponse
+from app.security import get_current_family
+from app.repository import exists_in_family
+from app.writes import get_queued_write, insert_returning
+from app.audit import audit_actor, audit_inserted, entity_state, record_change
+from app.encoding import COMPACT_RESPONSES, encode_list, response_encoding
+from app.tenancy import get_family_user
+from app.write_behind import write_behind
 
 router = APIRouter()
 
+
+def _record_glucose(db_log: InsulinLog):
+    """Add a new log to the analytics cache"""
+    # app.analytics (and numpy) is imported by the first analytics request;
+    # until then no series is cached and there is nothing to update
+    analytics = sys.modules.get("app.analytics")
+    if analytics is not None:
+        analytics.glucose_cache.record(db_log)
+
 def calculate_insulin_dosage(glucose_reading: float) -> float:
     """
     Simple insulin dosage calculation based on glucose reading
@@ -28,42 +48,73 @@ def calculate_insulin_dosage(glucose_reading: float) -> float:
     else:
         return 8.0  # Very high - maximum suggested dose
 
-@router.post("/", response_model=InsulinLogResponse, status_code=201)
-def create_insulin_log(log: InsulinLogCreate, db: Session = Depends(get_db)):
+@router.post(
+    "/",
+    response_model=InsulinLogResponse,
+    status_code=201,
+    responses={202: {"model": QueuedWriteResponse, "description": "Queued by the write-behind buffer"}}
+)
+def create_insulin_log(
+    log: InsulinLogCreate,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
     """Record insulin intake with glucose reading"""
-    # Verify user exists
-    user = db.query(User).filter(User.id == log.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     # If suggested dosage not provided, calculate it
     if log.suggested_dosage is None:
         log.suggested_dosage = calculate_insulin_dosage(log.glucose_reading)
-    
-    db_log = InsulinLog(**log.model_dump())
-    db.add(db_log)
-    db.commit()
-    db.refresh(db_log)
+    values = {**log.model_dump(), "family_id": family_id}
+    
+    if write_behind.running:
+        # A queued row cannot report a missing user or medicine log later,
+        # so check them up front (the user usually from the tenant cache)
+        get_family_user(db, family_id, log.user_id)
+        if log.medicine_log_id is not None and not exists_in_family(db, MedicineLog, family_id, log.medicine_log_id):
+            raise HTTPException(status_code=404, detail="Medicine log not found")
+        
+        # Queued rows reach the analytics cache on its next sync
+        queued = write_behind.submit(InsulinLog, values, on_insert=audit_inserted(InsulinLog, family_id, actor))
+        if queued:
+            return JSONResponse(
+                status_code=202,
+                content=jsonable_encoder(QueuedWriteResponse(uuid=queued["uuid"]))
+            )
+    
+    # The foreign keys check that the user and medicine log belong to the family
+    db_log = insert_returning(db, InsulinLog, values)
+    _record_glucose(db_log)
+    record_change(InsulinLog, family_id, actor, None, entity_state(db_log))
     return db_log
 
-@router.get("/", response_model=List[InsulinLogResponse])
+@router.get("/", response_model=List[InsulinLogResponse], responses=COMPACT_RESPONSES)
 def get_insulin_logs(
     user_id: int = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    encoding: str = Depends(response_encoding),
+    family_id: int = Depends(get_current_family)
 ):
     """Get all insulin logs with optional user filter"""
-    query = db.query(InsulinLog)
+    query = db.query(InsulinLog).filter(InsulinLog.family_id == family_id)
     
     if user_id:
         query = query.filter(InsulinLog.user_id == user_id)
     
-    return query.order_by(InsulinLog.recorded_at.desc()).all()
+    return encode_list(query.order_by(InsulinLog.recorded_at.desc()).all(), InsulinLogResponse, encoding)
+
+@router.get("/by-uuid/{log_uuid}", response_model=InsulinLogResponse)
+def get_insulin_log_by_uuid(log_uuid: UUID, db: Session = Depends(get_db), family_id: int = Depends(get_current_family)):
+    """Insulin log by the uuid returned with 202 (confirms a queued write was stored)"""
+    # Queued rows are inserted on the primary, so look there
+    return get_queued_write(db, InsulinLog, family_id, log_uuid, "Insulin log not found")
 
-@router.get("/daily", response_model=List[InsulinLogResponse])
+@router.get("/daily", response_model=List[InsulinLogResponse], responses=COMPACT_RESPONSES)
 def get_daily_insulin_logs(
     user_id: int,
     date: str = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    encoding: str = Depends(response_encoding),
+    family_id: int = Depends(get_current_family)
 ):
     """Get insulin logs for a specific day"""
     if date:
@@ -74,21 +125,25 @@ def get_daily_insulin_logs(
     start_of_day = datetime.combine(target_date, datetime.min.time())
     end_of_day = datetime.combine(target_date, datetime.max.time())
     
-    return db.query(InsulinLog).filter(
+    logs = db.query(InsulinLog).filter(
+        InsulinLog.family_id == family_id,
         InsulinLog.user_id == user_id,
         InsulinLog.recorded_at >= start_of_day,
         InsulinLog.recorded_at <= end_of_day
     ).order_by(InsulinLog.recorded_at).all()
+    return encode_list(logs, InsulinLogResponse, encoding)
 
 @router.get("/weekly")
 def get_weekly_insulin_stats(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
 ):
     """Get weekly insulin statistics"""
     week_ago = datetime.now() - timedelta(days=7)
     
     logs = db.query(InsulinLog).filter(
+        InsulinLog.family_id == family_id,
         InsulinLog.user_id == user_id,
         InsulinLog.recorded_at >= week_ago
     ).all()
@@ -121,12 +176,14 @@ def get_weekly_insulin_stats(
 @router.get("/monthly")
 def get_monthly_insulin_stats(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
 ):
     """Get monthly insulin statistics"""
     month_ago = datetime.now() - timedelta(days=30)
     
     logs = db.query(InsulinLog).filter(
+        InsulinLog.family_id == family_id,
         InsulinLog.user_id == user_id,
         InsulinLog.recorded_at >= month_ago
     ).all()
@@ -156,6 +213,22 @@ def get_monthly_insulin_stats(
         "logs": logs
     }
 
+@router.get("/analytics")
+def get_insulin_analytics(
+    user_id: int,
+    days: int = Query(90, ge=1, le=3650),
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """
+    Glucose trend analytics: time in range, rolling 7-day mean, SD/CV,
+    GMI (estimated HbA1c) and hypo/hyper events
+    """
+    from app.analytics import get_glucose_analytics
+
+    get_family_user(db, family_id, user_id)
+    return get_glucose_analytics(db, user_id, days)
+
 @router.get("/suggest-dosage")
 def suggest_insulin_dosage(glucose_reading: float):
     """Get insulin dosage suggestion based on glucose reading"""
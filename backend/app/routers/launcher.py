@@ -0,0 +1,31 @@
+"""
+Launcher home screen: users and active bookmarks in one conditional request
+"""
+from fastapi import APIRouter, Depends, Header, Response
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.replica import get_read_db
+from app.schemas import LauncherBundle
+from app.security import get_current_family
+from app.launcher import etag_matches, launcher_bundle
+
+router = APIRouter()
+
+
+@router.get("", response_model=LauncherBundle, responses={304: {"description": "The bundle has not changed"}})
+def get_launcher(
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """
+    The family's users (with avatars) and active bookmarks
+    Send the last ETag in If-None-Match to get 304 when nothing changed.
+    """
+    version, body = launcher_bundle(db, family_id)
+    etag = f'"{version}"'
+    # no-cache: clients keep the bundle but revalidate it on every launch
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
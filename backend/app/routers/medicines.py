@@ -1,85 +1,155 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_db, read_after_commit
+from app.replica import get_read_db
 from app.models import Medicine, User
-from app.schemas import MedicineCreate, MedicineUpdate, MedicineResponse
+from app.schemas import (
+    MedicineCreate, MedicineUpdate, MedicineResponse, MedicineSearchResult,
+    MedicineCheckedResponse, InteractionConflict
+)
+from app.security import get_current_family
+from app.repository import exists_in_family, get_in_family
+from app.writes import insert_returning
+from app.audit import audit_actor, entity_state, record_change
+from app.encoding import COMPACT_RESPONSES, encode_list, response_encoding
+from app.tenancy import tenant_cache, get_family_medicine
+from app.search import SEARCH_INDEX_KEY, search_medicines
+from app.interactions import check_medicine, check_user
 import os
 import uuid
 
 router = APIRouter()
 
-@router.post("/", response_model=MedicineResponse, status_code=201)
-def create_medicine(medicine: MedicineCreate, db: Session = Depends(get_db)):
-    """Create a new medicine"""
-    # Verify user exists
-    user = db.query(User).filter(User.id == medicine.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    db_medicine = Medicine(**medicine.model_dump())
-    db.add(db_medicine)
-    db.commit()
-    db.refresh(db_medicine)
-    return db_medicine
+def _with_interactions(db: Session, medicine: Medicine) -> MedicineCheckedResponse:
+    """Medicine response carrying its conflicts with the user's other active medicines"""
+    # Warnings only: the write has already happened and is never blocked
+    return MedicineCheckedResponse(
+        **MedicineResponse.model_validate(medicine).model_dump(),
+        interactions=check_medicine(db, medicine)
+    )
+
+@router.post("/", response_model=MedicineCheckedResponse, status_code=201)
+def create_medicine(
+    medicine: MedicineCreate,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
+    """Create a new medicine, with warnings about interactions with the user's other medicines"""
+    # The user must belong to this family (enforced by the foreign key)
+    db_medicine = insert_returning(db, Medicine, {**medicine.model_dump(), "family_id": family_id})
+    tenant_cache.invalidate(family_id, SEARCH_INDEX_KEY)
+    record_change(Medicine, family_id, actor, None, entity_state(db_medicine))
+    return _with_interactions(db, db_medicine)
 
-@router.get("/", response_model=List[MedicineResponse])
+@router.get("/", response_model=List[MedicineResponse], responses=COMPACT_RESPONSES)
 def get_medicines(
     user_id: Optional[int] = None,
     is_active: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    encoding: str = Depends(response_encoding),
+    family_id: int = Depends(get_current_family)
 ):
     """Get all medicines with optional filters"""
-    query = db.query(Medicine)
+    query = db.query(Medicine).filter(Medicine.family_id == family_id)
     
     if user_id:
         query = query.filter(Medicine.user_id == user_id)
     if is_active is not None:
         query = query.filter(Medicine.is_active == is_active)
     
-    return query.all()
+    return encode_list(query.all(), MedicineResponse, encoding)
+
+@router.get("/search", response_model=List[MedicineSearchResult])
+def search_family_medicines(
+    q: str = Query(..., min_length=1, max_length=100),
+    user_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """
+    Search medicines by name and instructions, best matches first
+    Matches word prefixes in any language (including Telugu), substrings
+    and, on PostgreSQL with pg_trgm, misspelled names
+    """
+    return [
+        MedicineSearchResult(**MedicineResponse.model_validate(medicine).model_dump(), score=round(score, 4))
+        for medicine, score in search_medicines(db, family_id, q, user_id=user_id, is_active=is_active, limit=limit)
+    ]
+
+@router.get("/interactions", response_model=List[InteractionConflict])
+def get_interactions(
+    user_id: int,
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """Interactions and duplicate therapies among a user's active medicines, most severe first"""
+    if not exists_in_family(db, User, family_id, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    return check_user(db, family_id, user_id)
 
 @router.get("/{medicine_id}", response_model=MedicineResponse)
-def get_medicine(medicine_id: int, db: Session = Depends(get_db)):
+def get_medicine(medicine_id: int, db: Session = Depends(get_read_db), family_id: int = Depends(get_current_family)):
     """Get medicine by ID"""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
-    if not medicine:
-        raise HTTPException(status_code=404, detail="Medicine not found")
-    return medicine
+    return get_family_medicine(db, family_id, medicine_id)
 
-@router.put("/{medicine_id}", response_model=MedicineResponse)
+@router.put("/{medicine_id}", response_model=MedicineCheckedResponse)
 def update_medicine(
     medicine_id: int,
     medicine_update: MedicineUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
 ):
-    """Update medicine details"""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
+    """Update medicine details, with warnings about interactions with the user's other medicines"""
+    medicine = get_in_family(db, Medicine, family_id, medicine_id)
     if not medicine:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
+    before = entity_state(medicine)
     for key, value in medicine_update.model_dump(exclude_unset=True).items():
         setattr(medicine, key, value)
     
     db.commit()
+    read_after_commit(db)
     db.refresh(medicine)
-    return medicine
+    tenant_cache.invalidate(family_id, ("medicine", medicine_id), SEARCH_INDEX_KEY)
+    record_change(Medicine, family_id, actor, before, entity_state(medicine))
+    return _with_interactions(db, medicine)
 
 @router.delete("/{medicine_id}", status_code=204)
-def delete_medicine(medicine_id: int, db: Session = Depends(get_db)):
+def delete_medicine(
+    medicine_id: int,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
     """Delete (deactivate) a medicine"""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
+    medicine = get_in_family(db, Medicine, family_id, medicine_id)
     if not medicine:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
+    before = entity_state(medicine)
     medicine.is_active = False
+    after = entity_state(medicine)
     db.commit()
+    tenant_cache.invalidate(family_id, ("medicine", medicine_id), SEARCH_INDEX_KEY)
+    record_change(Medicine, family_id, actor, before, after)
     return None
 
 @router.post("/{medicine_id}/upload-image")
-async def upload_medicine_image(medicine_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_medicine_image(
+    medicine_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
     """Upload medicine image"""
-    medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
+    medicine = get_in_family(db, Medicine, family_id, medicine_id)
     if not medicine:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
@@ -98,8 +168,12 @@ async def upload_medicine_image(medicine_id: int, file: UploadFile = File(...),
         buffer.write(content)
     
     # Update medicine with image URL
+    before = entity_state(medicine)
     medicine.image_url = f"/uploads/medicines/{unique_filename}"
     db.commit()
+    read_after_commit(db)
+    tenant_cache.invalidate(family_id, ("medicine", medicine_id))
+    record_change(Medicine, family_id, actor, before, entity_state(medicine))
     
     return {"filename": unique_filename, "url": medicine.image_url}
 
@@ -1,103 +1,216 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
-from app.models import Reminder, Medicine, MedicineLog
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+from uuid import UUID
+from app.database import get_db, read_after_commit
+from app.replica import get_read_db
+from app.models import Reminder, MedicineLog
 from app.schemas import (
-    ReminderCreate, ReminderResponse,
-    MedicineLogCreate, MedicineLogUpdate, MedicineLogResponse
+    ReminderCreate, ReminderResponse, ScheduledDose,
+    MedicineLogCreate, MedicineLogUpdate, MedicineLogResponse, QueuedWriteResponse
 )
+from app.security import get_current_family
+from app.repository import get_in_family, exists_in_family
+from app.writes import get_queued_write, insert_returning
+from app.audit import audit_actor, audit_inserted, entity_state, record_change
+from app.encoding import COMPACT_RESPONSES, encode_list, response_encoding
+from app.tenancy import get_family_user, get_family_medicine
+from app.write_behind import write_behind
+from app.schedule import schedule_query, MAX_RANGE_DAYS
+from app.adherence import get_adherence
 
 router = APIRouter()
 
 # Reminder endpoints
 @router.post("/", response_model=ReminderResponse, status_code=201)
-def create_reminder(reminder: ReminderCreate, db: Session = Depends(get_db)):
+def create_reminder(
+    reminder: ReminderCreate,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
     """Create a new reminder for a medicine"""
-    medicine = db.query(Medicine).filter(Medicine.id == reminder.medicine_id).first()
-    if not medicine:
-        raise HTTPException(status_code=404, detail="Medicine not found")
-    
-    db_reminder = Reminder(**reminder.model_dump())
-    db.add(db_reminder)
-    db.commit()
-    db.refresh(db_reminder)
+    # The medicine must belong to this family (enforced by the foreign key)
+    db_reminder = insert_returning(db, Reminder, {**reminder.model_dump(), "family_id": family_id})
+    record_change(Reminder, family_id, actor, None, entity_state(db_reminder))
     return db_reminder
 
-@router.get("/", response_model=List[ReminderResponse])
-def get_reminders(medicine_id: int = None, db: Session = Depends(get_db)):
+@router.get("/", response_model=List[ReminderResponse], responses=COMPACT_RESPONSES)
+def get_reminders(
+    medicine_id: int = None,
+    db: Session = Depends(get_read_db),
+    encoding: str = Depends(response_encoding),
+    family_id: int = Depends(get_current_family)
+):
     """Get all reminders, optionally filtered by medicine"""
-    query = db.query(Reminder)
+    query = db.query(Reminder).filter(Reminder.family_id == family_id)
     if medicine_id:
         query = query.filter(Reminder.medicine_id == medicine_id)
-    return query.filter(Reminder.is_active == True).all()
+    return encode_list(query.filter(Reminder.is_active == True).all(), ReminderResponse, encoding)
+
+@router.get("/schedule", response_model=List[ScheduledDose], responses=COMPACT_RESPONSES)
+def get_schedule(
+    start: date,
+    end: date,
+    user_id: Optional[int] = None,
+    medicine_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    encoding: str = Depends(response_encoding),
+    family_id: int = Depends(get_current_family)
+):
+    """Expand active reminders into concrete dose times for a date range (user's local dates)"""
+    if start > end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=422, detail=f"Range cannot exceed {MAX_RANGE_DAYS} days")
+    
+    stmt = schedule_query(start, end, family_id, user_id=user_id, medicine_id=medicine_id)
+    doses = db.execute(stmt.order_by("scheduled_at", "reminder_id")).all()
+    return encode_list(doses, ScheduledDose, encoding)
+
+@router.get("/adherence")
+def get_adherence_report(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+    family_id: int = Depends(get_current_family)
+):
+    """
+    Percentage of scheduled doses taken, per user/medicine/day
+    Defaults to the last 7 days
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=6)
+    if start > end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=422, detail=f"Range cannot exceed {MAX_RANGE_DAYS} days")
+    
+    return get_adherence(db, family_id, start, end, user_id=user_id)
 
 @router.delete("/{reminder_id}", status_code=204)
-def delete_reminder(reminder_id: int, db: Session = Depends(get_db)):
+def delete_reminder(
+    reminder_id: int,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
     """Delete (deactivate) a reminder"""
-    reminder = db.query(Reminder).filter(Reminder.id == reminder_id).first()
+    reminder = get_in_family(db, Reminder, family_id, reminder_id)
     if not reminder:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
+    before = entity_state(reminder)
     reminder.is_active = False
+    after = entity_state(reminder)
     db.commit()
+    record_change(Reminder, family_id, actor, before, after)
     return None
 
 # Medicine Log endpoints
-@router.post("/logs", response_model=MedicineLogResponse, status_code=201)
-def create_medicine_log(log: MedicineLogCreate, db: Session = Depends(get_db)):
+@router.post(
+    "/logs",
+    response_model=MedicineLogResponse,
+    status_code=201,
+    responses={202: {"model": QueuedWriteResponse, "description": "Queued by the write-behind buffer"}}
+)
+def create_medicine_log(
+    log: MedicineLogCreate,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
     """Record medicine intake (taken, missed, pending, etc.)"""
-    db_log = MedicineLog(**log.model_dump())
-    db.add(db_log)
-    db.commit()
-    db.refresh(db_log)
+    values = {**log.model_dump(), "family_id": family_id}
+    
+    if write_behind.running:
+        # A queued row cannot report a missing user, medicine or reminder
+        # later, so check them up front (usually from the tenant cache)
+        get_family_user(db, family_id, log.user_id)
+        get_family_medicine(db, family_id, log.medicine_id)
+        if log.reminder_id is not None and not exists_in_family(db, Reminder, family_id, log.reminder_id):
+            raise HTTPException(status_code=404, detail="Reminder not found")
+        
+        queued = write_behind.submit(MedicineLog, values, on_insert=audit_inserted(MedicineLog, family_id, actor))
+        if queued:
+            return JSONResponse(
+                status_code=202,
+                content=jsonable_encoder(QueuedWriteResponse(uuid=queued["uuid"]))
+            )
+    
+    # The foreign keys check that user, medicine and reminder belong to the family
+    db_log = insert_returning(db, MedicineLog, values)
+    record_change(MedicineLog, family_id, actor, None, entity_state(db_log))
     return db_log
 
-@router.get("/logs", response_model=List[MedicineLogResponse])
+@router.get("/logs", response_model=List[MedicineLogResponse], responses=COMPACT_RESPONSES)
 def get_medicine_logs(
     user_id: int = None,
     medicine_id: int = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    encoding: str = Depends(response_encoding),
+    family_id: int = Depends(get_current_family)
 ):
     """Get medicine logs with optional filters"""
-    query = db.query(MedicineLog)
+    query = db.query(MedicineLog).filter(MedicineLog.family_id == family_id)
     
     if user_id:
         query = query.filter(MedicineLog.user_id == user_id)
     if medicine_id:
         query = query.filter(MedicineLog.medicine_id == medicine_id)
     
-    return query.order_by(MedicineLog.scheduled_at.desc()).all()
+    return encode_list(query.order_by(MedicineLog.scheduled_at.desc()).all(), MedicineLogResponse, encoding)
+
+@router.get("/logs/by-uuid/{log_uuid}", response_model=MedicineLogResponse)
+def get_medicine_log_by_uuid(log_uuid: UUID, db: Session = Depends(get_db), family_id: int = Depends(get_current_family)):
+    """Medicine log by the uuid returned with 202 (confirms a queued write was stored)"""
+    # Queued rows are inserted on the primary, so look there
+    return get_queued_write(db, MedicineLog, family_id, log_uuid, "Medicine log not found")
 
 @router.put("/logs/{log_id}", response_model=MedicineLogResponse)
 def update_medicine_log(
     log_id: int,
     log_update: MedicineLogUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
 ):
     """Update medicine log (e.g., mark as taken, snooze)"""
-    log = db.query(MedicineLog).filter(MedicineLog.id == log_id).first()
+    log = get_in_family(db, MedicineLog, family_id, log_id)
     if not log:
         raise HTTPException(status_code=404, detail="Medicine log not found")
     
+    before = entity_state(log)
     for key, value in log_update.model_dump(exclude_unset=True).items():
         setattr(log, key, value)
     
     db.commit()
+    read_after_commit(db)
     db.refresh(log)
+    record_change(MedicineLog, family_id, actor, before, entity_state(log))
     return log
 
-@router.get("/logs/missed", response_model=List[MedicineLogResponse])
-def get_missed_medicines(user_id: int = None, db: Session = Depends(get_db)):
+@router.get("/logs/missed", response_model=List[MedicineLogResponse], responses=COMPACT_RESPONSES)
+def get_missed_medicines(
+    user_id: int = None,
+    db: Session = Depends(get_read_db),
+    encoding: str = Depends(response_encoding),
+    family_id: int = Depends(get_current_family)
+):
     """Get all missed medicines"""
     from app.models import ReminderStatus
     
     query = db.query(MedicineLog).filter(
+        MedicineLog.family_id == family_id,
         MedicineLog.status.in_([ReminderStatus.MISSED, ReminderStatus.PENDING])
     )
     
     if user_id:
         query = query.filter(MedicineLog.user_id == user_id)
     
-    return query.order_by(MedicineLog.scheduled_at.desc()).all()
+    return encode_list(query.order_by(MedicineLog.scheduled_at.desc()).all(), MedicineLogResponse, encoding)
 
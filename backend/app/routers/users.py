@@ -1,58 +1,104 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List
-from app.database import get_db
-from app.models import User
-from app.schemas import UserCreate, UserUpdate, UserResponse
+from app.database import get_db, read_after_commit
+from app.replica import get_read_db
+from app.models import DeletionJob, User
+from app.schemas import UserCreate, UserUpdate, UserResponse, DeletionJobResponse
+from app.security import get_current_family
+from app.repository import exists_in_family, get_in_family
+from app.writes import insert_returning
+from app.audit import audit_actor, entity_state, record_change
+from app.encoding import COMPACT_RESPONSES, encode_list, response_encoding
+from app.tenancy import tenant_cache, get_family_user, cached_list
+from app.deletion import start_user_deletion
+from app.launcher import LAUNCHER_KEY, bump_launcher_version
 import os
 import uuid
 
 router = APIRouter()
 
 @router.post("/", response_model=UserResponse, status_code=201)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+def create_user(
+    user: UserCreate,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
     """Create a new user with name and optional photo"""
-    db_user = User(**user.model_dump())
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    bump_launcher_version(db, family_id)  # Committed with the insert
+    db_user = insert_returning(db, User, {**user.model_dump(), "family_id": family_id})
+    tenant_cache.invalidate(family_id, "users", LAUNCHER_KEY)
+    record_change(User, family_id, actor, None, entity_state(db_user))
     return db_user
 
-@router.get("/", response_model=List[UserResponse])
-def get_users(db: Session = Depends(get_db)):
-    """Get all users"""
-    return db.query(User).all()
+@router.get("/", response_model=List[UserResponse], responses=COMPACT_RESPONSES)
+def get_users(
+    db: Session = Depends(get_read_db),
+    encoding: str = Depends(response_encoding),
+    family_id: int = Depends(get_current_family)
+):
+    """Get all users of the family"""
+    users = cached_list(
+        db,
+        family_id,
+        "users",
+        lambda: [
+            UserResponse.model_validate(user)
+            for user in db.query(User).filter(User.family_id == family_id).order_by(User.id)
+        ]
+    )
+    return encode_list(users, UserResponse, encoding)
+
+@router.get("/deletions/{job_id}", response_model=DeletionJobResponse)
+def get_deletion_job(job_id: int, db: Session = Depends(get_db), family_id: int = Depends(get_current_family)):
+    """Status and progress of a user deletion"""
+    # Progress is committed on the primary as the job runs, so read it there
+    job = get_in_family(db, DeletionJob, family_id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job
 
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_read_db), family_id: int = Depends(get_current_family)):
     """Get user by ID"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return get_family_user(db, family_id, user_id)
 
 @router.put("/{user_id}", response_model=UserResponse)
 def update_user(
     user_id: int,
     user_update: UserUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
 ):
     """Update user details"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = get_in_family(db, User, family_id, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    before = entity_state(user)
     for key, value in user_update.model_dump(exclude_unset=True).items():
         setattr(user, key, value)
+    bump_launcher_version(db, family_id)
     
     db.commit()
+    read_after_commit(db)
     db.refresh(user)
+    tenant_cache.invalidate(family_id, "users", ("user", user_id), LAUNCHER_KEY)
+    record_change(User, family_id, actor, before, entity_state(user))
     return user
 
 @router.post("/{user_id}/upload-photo")
-async def upload_user_photo(user_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_user_photo(
+    user_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
     """Upload user photo"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = get_in_family(db, User, family_id, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -71,18 +117,27 @@ async def upload_user_photo(user_id: int, file: UploadFile = File(...), db: Sess
         buffer.write(content)
     
     # Update user with photo URL
+    before = entity_state(user)
     user.photo_url = f"/uploads/users/{unique_filename}"
+    bump_launcher_version(db, family_id)
     db.commit()
+    read_after_commit(db)
+    tenant_cache.invalidate(family_id, "users", ("user", user_id), LAUNCHER_KEY)
+    record_change(User, family_id, actor, before, entity_state(user))
     
     return {"filename": unique_filename, "url": user.photo_url}
 
-@router.delete("/{user_id}", status_code=204)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    """Delete a user"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+@router.delete("/{user_id}", response_model=DeletionJobResponse, status_code=202)
+def delete_user(
+    user_id: int,
+    db: Session = Depends(get_db),
+    family_id: int = Depends(get_current_family),
+    actor: str = Depends(audit_actor)
+):
+    """
+    Delete a user with their medicines, reminders and logs
+    Runs in the background; poll GET /api/users/deletions/{job_id} for progress.
+    """
+    if not exists_in_family(db, User, family_id, user_id):
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
-    return None
-
+    return start_user_deletion(db, family_id, user_id, actor)
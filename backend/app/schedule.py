@@ -0,0 +1,222 @@
+"""
+Reminder schedule expansion
+
+Turns active reminders into the concrete dose instants for a date range with
+a single set-based query: a generated series of calendar days is joined with
+the reminders, recurrence rules are applied in the WHERE clause and each
+wall-clock time is converted to UTC in the user's time zone.
+
+The date/time helpers below compile to PostgreSQL expressions, and to
+SQLite ones for the embedded mode. SQLite has no time zone database, so
+there local_to_utc and shift_seconds are Python functions registered on
+each connection; they return timestamps in the text format SQLAlchemy
+stores, so they compare correctly with stored columns.
+"""
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+from sqlalchemy import Date, DateTime, Integer, and_, event, literal, or_, select, true
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import Pool
+from sqlalchemy.sql.expression import FunctionElement
+from app.models import Medicine, Reminder, User
+
+# Longest range a single expansion may cover
+MAX_RANGE_DAYS = 366
+
+
+class local_to_utc(FunctionElement):
+    """local_to_utc(zone, timestamp): wall-clock time in `zone` -> naive UTC"""
+    type = DateTime()
+    name = "local_to_utc"
+    inherit_cache = True
+
+
+class iso_weekday(FunctionElement):
+    """iso_weekday(date): Monday = 1 ... Sunday = 7"""
+    type = Integer()
+    name = "iso_weekday"
+    inherit_cache = True
+
+
+class days_between(FunctionElement):
+    """days_between(a, b): whole days from date a to date b"""
+    type = Integer()
+    name = "days_between"
+    inherit_cache = True
+
+
+class shift_seconds(FunctionElement):
+    """shift_seconds(timestamp, n): timestamp moved by n seconds"""
+    type = DateTime()
+    name = "shift_seconds"
+    inherit_cache = True
+
+
+class at_time(FunctionElement):
+    """at_time(date, time): combine into a timestamp"""
+    type = DateTime()
+    name = "at_time"
+    inherit_cache = True
+
+
+class next_day(FunctionElement):
+    """next_day(date): the following calendar day"""
+    type = Date()
+    name = "next_day"
+    inherit_cache = True
+
+
+def _args(element, compiler, **kw):
+    return [compiler.process(clause, **kw) for clause in element.clauses]
+
+
+@compiles(local_to_utc)
+def _local_to_utc(element, compiler, **kw):
+    zone, timestamp = _args(element, compiler, **kw)
+    return f"timezone('UTC', timezone({zone}, {timestamp}))"
+
+
+@compiles(iso_weekday)
+def _iso_weekday(element, compiler, **kw):
+    (day,) = _args(element, compiler, **kw)
+    return f"CAST(EXTRACT(ISODOW FROM {day}) AS INTEGER)"
+
+
+@compiles(days_between)
+def _days_between(element, compiler, **kw):
+    start, end = _args(element, compiler, **kw)
+    return f"({end} - {start})"
+
+
+@compiles(shift_seconds)
+def _shift_seconds(element, compiler, **kw):
+    timestamp, seconds = _args(element, compiler, **kw)
+    return f"({timestamp} + make_interval(secs => {seconds}))"
+
+
+@compiles(at_time)
+def _at_time(element, compiler, **kw):
+    day, time_of_day = _args(element, compiler, **kw)
+    return f"({day} + {time_of_day})"
+
+
+@compiles(next_day)
+def _next_day(element, compiler, **kw):
+    (day,) = _args(element, compiler, **kw)
+    return f"({day} + 1)"
+
+
+# SQLite: dates are 'YYYY-MM-DD' text and times 'HH:MM:SS.ffffff'
+@compiles(local_to_utc, "sqlite")
+@compiles(shift_seconds, "sqlite")
+def _sqlite_python_function(element, compiler, **kw):
+    return f"{element.name}({', '.join(_args(element, compiler, **kw))})"
+
+
+@compiles(iso_weekday, "sqlite")
+def _sqlite_iso_weekday(element, compiler, **kw):
+    (day,) = _args(element, compiler, **kw)
+    return f"((CAST(strftime('%w', {day}) AS INTEGER) + 6) % 7 + 1)"
+
+
+@compiles(days_between, "sqlite")
+def _sqlite_days_between(element, compiler, **kw):
+    start, end = _args(element, compiler, **kw)
+    return f"CAST(julianday({end}) - julianday({start}) AS INTEGER)"
+
+
+@compiles(at_time, "sqlite")
+def _sqlite_at_time(element, compiler, **kw):
+    day, time_of_day = _args(element, compiler, **kw)
+    return f"({day} || ' ' || {time_of_day})"
+
+
+@compiles(next_day, "sqlite")
+def _sqlite_next_day(element, compiler, **kw):
+    (day,) = _args(element, compiler, **kw)
+    return f"date({day}, '+1 day')"
+
+
+SQLITE_TIMESTAMP = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _sqlite_local_to_utc(zone: Optional[str], timestamp: Optional[str]) -> Optional[str]:
+    if zone is None or timestamp is None:
+        return None
+    local = datetime.fromisoformat(timestamp).replace(tzinfo=ZoneInfo(zone))
+    return local.astimezone(timezone.utc).strftime(SQLITE_TIMESTAMP)
+
+
+def _sqlite_shift_seconds(timestamp: Optional[str], seconds) -> Optional[str]:
+    if timestamp is None or seconds is None:
+        return None
+    return (datetime.fromisoformat(timestamp) + timedelta(seconds=seconds)).strftime(SQLITE_TIMESTAMP)
+
+
+@event.listens_for(Pool, "connect")
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("local_to_utc", 2, _sqlite_local_to_utc, deterministic=True)
+        dbapi_connection.create_function("shift_seconds", 2, _sqlite_shift_seconds, deterministic=True)
+
+
+def day_series(start: date, end: date):
+    """One row per calendar day from start to end inclusive, as column `day`"""
+    # A recursive CTE rather than generate_series, which SQLite lacks
+    days = select(literal(start, Date).label("day")).cte("days", recursive=True)
+    return days.union_all(select(next_day(days.c.day)).where(days.c.day < literal(end, Date)))
+
+
+def schedule_query(
+    start: date,
+    end: date,
+    family_id: int,
+    user_id: Optional[int] = None,
+    medicine_id: Optional[int] = None,
+):
+    """
+    Dose instants of a family's active reminders between start and end (local dates)
+    Columns: reminder_id, medicine_id, user_id, local_date, scheduled_time,
+    scheduled_at (UTC). Doses before the reminder was created are skipped.
+    """
+    days = day_series(start, end)
+    scheduled_at = local_to_utc(User.timezone, at_time(days.c.day, Reminder.scheduled_time))
+
+    stmt = (
+        select(
+            Reminder.id.label("reminder_id"),
+            Medicine.id.label("medicine_id"),
+            Medicine.user_id.label("user_id"),
+            days.c.day.label("local_date"),
+            Reminder.scheduled_time.label("scheduled_time"),
+            scheduled_at.label("scheduled_at"),
+        )
+        .select_from(Reminder)
+        .join(Medicine, Medicine.id == Reminder.medicine_id)
+        .join(User, User.id == Medicine.user_id)
+        .join(days, true())
+        .where(
+            Reminder.family_id == family_id,
+            Reminder.is_active == True,
+            Medicine.is_active == True,
+            scheduled_at >= Reminder.created_at,
+            or_(
+                Reminder.days_of_week.is_(None),
+                Reminder.days_of_week.op("&")(literal(1).op("<<")(iso_weekday(days.c.day) - 1)) != 0,
+            ),
+            or_(
+                Reminder.interval_days.is_(None),
+                and_(
+                    days.c.day >= Reminder.start_date,
+                    days_between(Reminder.start_date, days.c.day) % Reminder.interval_days == 0,
+                ),
+            ),
+        )
+    )
+    if user_id:
+        stmt = stmt.where(Medicine.user_id == user_id)
+    if medicine_id:
+        stmt = stmt.where(Reminder.medicine_id == medicine_id)
+    return stmt
@@ -1,12 +1,41 @@
-from pydantic import BaseModel, ConfigDict
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_serializer, field_validator, model_validator
+from datetime import datetime, date, time
 from typing import Optional, List
+from uuid import UUID
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from app.models import MedicineType, ReminderStatus
 
+def validate_timezone(value: Optional[str]) -> Optional[str]:
+    """Reject names that are not IANA time zones"""
+    if value is None:
+        return value
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {value}")
+    return value
+
+# Family Schemas
+class FamilyCreate(BaseModel):
+    name: str
+
+class FamilyResponse(FamilyCreate):
+    id: int
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class FamilyKeyResponse(FamilyResponse):
+    api_key: str
+
 # User Schemas
 class UserBase(BaseModel):
     name: str
     photo_url: Optional[str] = None
+    avatar_emoji: Optional[str] = None  # Shown instead of a photo when set
+    timezone: str = "UTC"
+
+    _check_timezone = field_validator("timezone")(validate_timezone)
 
 class UserCreate(UserBase):
     pass
@@ -14,6 +43,10 @@ class UserCreate(UserBase):
 class UserUpdate(BaseModel):
     name: Optional[str] = None
     photo_url: Optional[str] = None
+    avatar_emoji: Optional[str] = None
+    timezone: Optional[str] = None
+
+    _check_timezone = field_validator("timezone")(validate_timezone)
 
 class UserResponse(UserBase):
     id: int
@@ -49,13 +82,41 @@ class MedicineResponse(MedicineBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class MedicineSearchResult(MedicineResponse):
+    score: float  # Higher is a better match
+
+class InteractionConflict(BaseModel):
+    medicine_id: int
+    medicine_name: str
+    other_medicine_id: int
+    other_medicine_name: str
+    kind: str  # interaction, duplicate_therapy or duplicate_ingredient
+    severity: str  # major, moderate or minor
+    description: str
+
+class MedicineCheckedResponse(MedicineResponse):
+    interactions: List[InteractionConflict] = []  # Conflicts with the user's other active medicines
+
 # Reminder Schemas
 class ReminderBase(BaseModel):
-    scheduled_time: str  # Format: "HH:MM"
+    scheduled_time: time  # Accepts and returns "HH:MM", in the user's time zone
+    days_of_week: Optional[int] = Field(None, ge=1, le=127)  # Bitmask, Monday = 1 ... Sunday = 64
+    interval_days: Optional[int] = Field(None, ge=1)  # Every N days from start_date
+    start_date: Optional[date] = None
+
+    @field_serializer("scheduled_time", when_used="json")
+    def serialize_scheduled_time(self, value: time) -> str:
+        return value.strftime("%H:%M")
 
 class ReminderCreate(ReminderBase):
     medicine_id: int
 
+    @model_validator(mode="after")
+    def default_start_date(self):
+        if self.interval_days and self.start_date is None:
+            self.start_date = datetime.utcnow().date()
+        return self
+
 class ReminderResponse(ReminderBase):
     id: int
     medicine_id: int
@@ -64,6 +125,20 @@ class ReminderResponse(ReminderBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class ScheduledDose(BaseModel):
+    reminder_id: int
+    medicine_id: int
+    user_id: int
+    local_date: date
+    scheduled_time: time
+    scheduled_at: datetime  # UTC instant
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_serializer("scheduled_time", when_used="json")
+    def serialize_scheduled_time(self, value: time) -> str:
+        return value.strftime("%H:%M")
+
 # Medicine Log Schemas
 class MedicineLogBase(BaseModel):
     status: ReminderStatus
@@ -83,6 +158,7 @@ class MedicineLogUpdate(BaseModel):
 
 class MedicineLogResponse(MedicineLogBase):
     id: int
+    uuid: UUID
     user_id: int
     medicine_id: int
     reminder_id: Optional[int]
@@ -105,6 +181,7 @@ class InsulinLogCreate(InsulinLogBase):
 
 class InsulinLogResponse(InsulinLogBase):
     id: int
+    uuid: UUID
     user_id: int
     medicine_log_id: Optional[int]
     suggested_dosage: Optional[float]
@@ -113,15 +190,73 @@ class InsulinLogResponse(InsulinLogBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+# Returned with 202 when a log is queued by the write-behind buffer
+class QueuedWriteResponse(BaseModel):
+    uuid: UUID
+    status: str = "queued"
+
+# Audit Schemas
+class ChangeEventResponse(BaseModel):
+    uuid: UUID
+    entity_type: str
+    entity_id: int
+    action: str
+    changes: dict
+    actor: Optional[str]
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class EntityStateResponse(BaseModel):
+    entity_type: str
+    entity_id: int
+    at: datetime
+    exists: bool  # False before the entity was created or after it was deleted
+    state: Optional[dict]
+    as_of: Optional[datetime]  # Time of the last change included
+
+class DeletionJobResponse(BaseModel):
+    id: int
+    entity_type: str
+    entity_id: int
+    status: str  # pending, running, done or failed
+    total: Optional[dict]  # {entity_type: rows to delete}, once the job has started
+    deleted: dict  # {entity_type: rows deleted so far}
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @computed_field
+    @property
+    def progress(self) -> float:
+        """Share of the rows deleted so far, 0 to 1"""
+        if self.status == "done":
+            return 1.0
+        total = sum((self.total or {}).values())
+        return round(min(sum(self.deleted.values()) / total, 1.0), 4) if total else 0.0
+
 # Bookmark Schemas
 class BookmarkBase(BaseModel):
     name: str
     phone_number: str
-    contact_type: str
+    contact_type: str  # "phone" or "whatsapp"
+    photo_url: Optional[str] = None
+    avatar_emoji: Optional[str] = None
 
 class BookmarkCreate(BookmarkBase):
     pass
 
+class BookmarkUpdate(BaseModel):
+    name: Optional[str] = None
+    phone_number: Optional[str] = None
+    contact_type: Optional[str] = None
+    photo_url: Optional[str] = None
+    avatar_emoji: Optional[str] = None
+    is_active: Optional[bool] = None
+
 class BookmarkResponse(BookmarkBase):
     id: int
     is_active: bool
@@ -129,3 +264,17 @@ class BookmarkResponse(BookmarkBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+# Launcher Schemas
+class LauncherUser(BaseModel):
+    id: int
+    name: str
+    photo_url: Optional[str]
+    avatar_emoji: Optional[str]
+
+    model_config = ConfigDict(from_attributes=True)
+
+class LauncherBundle(BaseModel):
+    version: str  # Also the response's ETag, changes whenever the content does
+    users: List[LauncherUser]
+    bookmarks: List[BookmarkResponse]  # Active bookmarks only
+
@@ -0,0 +1,196 @@
+"""
+Ranked medicine search over name and instructions
+
+On PostgreSQL a medicine matches when every word of the query prefixes a
+word of its full-text document (GIN index on MEDICINE_SEARCH_VECTOR), when
+the query is a substring of the name or instructions (trigram indexes), or,
+with pg_trgm installed, when the query is word-similar to the name, which
+catches typos such as "metformn". Names starting with the query rank first,
+then text rank plus trigram similarity.
+
+Other databases (SQLite in tests and local runs) search an in-memory prefix
+index of the family's medicines, kept in the tenant cache and dropped
+whenever a medicine changes.
+"""
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import case, func, literal, literal_column, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.models import Medicine, MEDICINE_SEARCH_VECTOR
+from app.tenancy import cached_list
+
+# Tenant cache key of the family's prefix index (non-PostgreSQL databases)
+SEARCH_INDEX_KEY = "medicine_search"
+
+# Prefix index weights
+NAME_WEIGHT = 2.0
+INSTRUCTIONS_WEIGHT = 1.0
+NAME_PREFIX_BONUS = 1.0
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """Case-folded words of letters, marks and digits"""
+    # Combining marks count as word characters so Telugu vowel signs stay
+    # inside their word (regex \w would split on them), and zero-width
+    # joiners are dropped
+    if not value:
+        return []
+    words, word = [], []
+    for char in unicodedata.normalize("NFKC", value).casefold():
+        category = unicodedata.category(char)
+        if category == "Cf":
+            continue
+        if category[0] in "LMN":
+            word.append(char)
+        elif word:
+            words.append("".join(word))
+            word = []
+    if word:
+        words.append("".join(word))
+    return words
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class PrefixIndex:
+    """Sorted (word, weight, medicine id) entries of a family's medicines, searched by prefix"""
+
+    def __init__(self, medicines):
+        entries = set()
+        self.medicines = {}
+        for medicine in medicines:
+            self.medicines[medicine.id] = (
+                medicine.user_id,
+                medicine.is_active,
+                " ".join(tokenize(medicine.name)),
+            )
+            for word in tokenize(medicine.name):
+                entries.add((word, NAME_WEIGHT, medicine.id))
+            for word in tokenize(medicine.instructions):
+                entries.add((word, INSTRUCTIONS_WEIGHT, medicine.id))
+        self.entries = sorted(entries)
+        self.words = [word for word, _, _ in self.entries]
+
+    def _match(self, prefix: str) -> Dict[int, float]:
+        """Best weight per medicine having a word that starts with `prefix` (doubled for a whole word)"""
+        scores = {}
+        for word, weight, medicine_id in self.entries[bisect_left(self.words, prefix):]:
+            if not word.startswith(prefix):
+                break
+            if word == prefix:
+                weight *= 2
+            scores[medicine_id] = max(scores.get(medicine_id, 0.0), weight)
+        return scores
+
+    def search(self, query: str, user_id: Optional[int] = None, is_active: Optional[bool] = None) -> List[Tuple[int, float]]:
+        """(medicine id, score) of the medicines matching every query word, best first"""
+        words = tokenize(query)
+        if not words:
+            return []
+        scores = self._match(words[0])
+        for word in words[1:]:
+            matches = self._match(word)
+            scores = {medicine_id: score + matches[medicine_id] for medicine_id, score in scores.items() if medicine_id in matches}
+
+        phrase = " ".join(words)
+        results = []
+        for medicine_id, score in scores.items():
+            owner, active, name = self.medicines[medicine_id]
+            if user_id is not None and owner != user_id:
+                continue
+            if is_active is not None and active != is_active:
+                continue
+            if name.startswith(phrase):
+                score += NAME_PREFIX_BONUS
+            results.append((medicine_id, score))
+        results.sort(key=lambda result: (-result[1], result[0]))
+        return results
+
+
+@lru_cache(maxsize=None)
+def trigrams_installed(engine: Engine) -> bool:
+    """Whether pg_trgm is installed in the database (checked once per engine)"""
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
+def _search_postgresql(db: Session, family_id: int, query: str, filters: list, limit: int):
+    words = tokenize(query)
+    if not words:
+        return []
+    vector = literal_column(MEDICINE_SEARCH_VECTOR)
+    # Words only hold letters, marks and digits, so they need no quoting
+    ts_query = func.to_tsquery(literal_column("'simple'::regconfig"), " & ".join(f"'{word}':*" for word in words))
+    pattern = _escape_like(query.strip())
+
+    conditions = [
+        vector.op("@@")(ts_query),
+        Medicine.name.ilike(f"%{pattern}%", escape="\\"),
+        Medicine.instructions.ilike(f"%{pattern}%", escape="\\"),
+    ]
+    score = (
+        case((Medicine.name.ilike(f"{pattern}%", escape="\\"), NAME_PREFIX_BONUS), else_=0.0)
+        + func.ts_rank(vector, ts_query)
+    )
+    if trigrams_installed(db.get_bind()):
+        conditions.append(literal(query).op("<%")(Medicine.name))
+        score = (
+            score
+            + func.word_similarity(query, Medicine.name)
+            + func.word_similarity(query, func.coalesce(Medicine.instructions, "")) / 2
+        )
+
+    stmt = (
+        select(Medicine, score.label("score"))
+        .where(Medicine.family_id == family_id, or_(*conditions), *filters)
+        .order_by(literal_column("score").desc(), Medicine.id)
+        .limit(limit)
+    )
+    return db.execute(stmt).all()
+
+
+def _search_prefix_index(db: Session, family_id: int, query: str, user_id, is_active, limit: int):
+    index = cached_list(
+        db,
+        family_id,
+        SEARCH_INDEX_KEY,
+        lambda: PrefixIndex(db.execute(
+            select(Medicine.id, Medicine.name, Medicine.instructions, Medicine.user_id, Medicine.is_active)
+            .where(Medicine.family_id == family_id)
+        ).all())
+    )
+    ranked = index.search(query, user_id=user_id, is_active=is_active)[:limit]
+    if not ranked:
+        return []
+    medicines = {
+        medicine.id: medicine
+        for medicine in db.scalars(select(Medicine).where(
+            Medicine.family_id == family_id,
+            Medicine.id.in_([medicine_id for medicine_id, _ in ranked])
+        ))
+    }
+    return [(medicines[medicine_id], score) for medicine_id, score in ranked if medicine_id in medicines]
+
+
+def search_medicines(
+    db: Session,
+    family_id: int,
+    query: str,
+    user_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    limit: int = 20,
+) -> List[Tuple[Medicine, float]]:
+    """(medicine, score) pairs matching `query`, best first"""
+    if db.get_bind().dialect.name == "postgresql":
+        filters = []
+        if user_id is not None:
+            filters.append(Medicine.user_id == user_id)
+        if is_active is not None:
+            filters.append(Medicine.is_active == is_active)
+        return _search_postgresql(db, family_id, query, filters, limit)
+    return _search_prefix_index(db, family_id, query, user_id, is_active, limit)
@@ -5,11 +5,18 @@ from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import HTTPException, Security, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, APIKeyHeader
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from functools import lru_cache
+import hashlib
 import os
+import secrets
+import threading
+import time
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from app.config import settings
+from app.database import ReadSessionLocal
+from app.repository import family_id_for_key
+from app.tenancy import DEFAULT_FAMILY_ID
 
 # Security settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
@@ -20,29 +27,82 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 API_KEY = os.getenv("API_KEY", "")  # Must be set in production!
 API_KEY_NAME = "X-API-Key"
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Security schemes
 security = HTTPBearer()
+optional_bearer = HTTPBearer(auto_error=False)
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
+# Family API key hash -> (family id, expiry); avoids a query per request.
+# Rotation only clears the cache of the worker that handled it, so the
+# expiry bounds how long an old key keeps working in the others.
+_family_keys = {}
+_family_keys_lock = threading.Lock()
+
 # Rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
 
+# jose and passlib/bcrypt are imported on first use so they stay off the
+# cold-start path; most requests authenticate with an API key
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Password hashing context"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+
+def generate_api_key() -> str:
+    """Generate a new random API key"""
+    return secrets.token_urlsafe(32)
+
+
+def hash_api_key(api_key: str) -> str:
+    """Hash an API key for storage and lookup"""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def forget_family_key(key_hash: str):
+    """Drop a cached key (after it was rotated)"""
+    with _family_keys_lock:
+        _family_keys.pop(key_hash, None)
+
+
+def lookup_family_key(api_key: str) -> Optional[int]:
+    """Family id for a family API key, or None"""
+    key_hash = hash_api_key(api_key)
+    with _family_keys_lock:
+        cached = _family_keys.get(key_hash)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    
+    db = ReadSessionLocal()
+    try:
+        family_id = family_id_for_key(db, key_hash)
+    finally:
+        db.close()
+    if family_id is not None:
+        with _family_keys_lock:
+            _family_keys[key_hash] = (family_id, time.monotonic() + settings.FAMILY_KEY_CACHE_SECONDS)
+    return family_id
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -56,6 +116,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 def verify_token(token: str) -> dict:
     """Verify and decode a JWT token"""
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
@@ -93,6 +155,38 @@ async def verify_api_key(api_key: str = Security(api_key_header)) -> str:
     return api_key
 
 
+def get_current_family(
+    api_key: Optional[str] = Security(api_key_header),
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(optional_bearer)
+) -> int:
+    """
+    Resolve the caller's family (tenant) id
+    Accepts the server-wide API_KEY (default family), a family API key,
+    or a Bearer token carrying a family_id claim
+    """
+    if api_key:
+        if API_KEY and secrets.compare_digest(api_key, API_KEY):
+            return DEFAULT_FAMILY_ID
+        family_id = lookup_family_key(api_key)
+        if family_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid API Key"
+            )
+        return family_id
+    
+    if credentials:
+        payload = verify_token(credentials.credentials)
+        # Tokens issued before families existed belong to the default family
+        return int(payload.get("family_id", DEFAULT_FAMILY_ID))
+    
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Authentication required. Provide either X-API-Key header or Authorization: Bearer token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 async def verify_bearer_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> dict:
     """
     Verify JWT Bearer token
@@ -0,0 +1,153 @@
+"""
+Family (tenant) scoping helpers and the per-family cache of hot entities
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Family, Medicine, User
+from app.repository import get_in_family
+from app.schemas import MedicineResponse, UserResponse
+
+# Family that the server-wide API_KEY and admin tokens act on
+DEFAULT_FAMILY_ID = 1
+
+_MISSING = object()
+
+
+def _cacheable(db: Session) -> bool:
+    # A lagging replica could put stale rows back right after a write
+    # invalidated them, so only primary reads fill the cache
+    return not db.info.get("replica")
+
+
+class TenantCache:
+    """
+    In-memory LRU of serialized entities, partitioned by family
+    Each family gets its own bounded partition, so lookups cost the same
+    however many families share the deployment. Entries expire after
+    `ttl` seconds so writes made by other workers are picked up.
+    """
+
+    def __init__(self, max_families: int, max_entries: int, ttl: float):
+        self.max_families = max_families
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._families = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, family_id: int, key: Hashable) -> Any:
+        with self._lock:
+            partition = self._families.get(family_id)
+            if partition is None:
+                return _MISSING
+            self._families.move_to_end(family_id)
+            entry = partition.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del partition[key]
+                return _MISSING
+            partition.move_to_end(key)
+            return value
+
+    def set(self, family_id: int, key: Hashable, value: Any):
+        with self._lock:
+            partition = self._families.get(family_id)
+            if partition is None:
+                partition = self._families[family_id] = OrderedDict()
+                while len(self._families) > self.max_families:
+                    self._families.popitem(last=False)
+            else:
+                self._families.move_to_end(family_id)
+            partition[key] = (time.monotonic() + self.ttl, value)
+            partition.move_to_end(key)
+            while len(partition) > self.max_entries:
+                partition.popitem(last=False)
+
+    def invalidate(self, family_id: int, *keys: Hashable):
+        """Drop the given keys, or the whole family partition if none are given"""
+        with self._lock:
+            if not keys:
+                self._families.pop(family_id, None)
+                return
+            partition = self._families.get(family_id)
+            if partition is not None:
+                for key in keys:
+                    partition.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._families.clear()
+
+
+tenant_cache = TenantCache(
+    max_families=settings.TENANT_CACHE_FAMILIES,
+    max_entries=settings.TENANT_CACHE_ENTRIES,
+    ttl=settings.TENANT_CACHE_TTL_SECONDS,
+)
+
+
+def get_family_user(db: Session, family_id: int, user_id: int) -> UserResponse:
+    """A user of this family (cached), or 404"""
+    key = ("user", user_id)
+    user = tenant_cache.get(family_id, key)
+    if user is _MISSING:
+        row = get_in_family(db, User, family_id, user_id)
+        user = UserResponse.model_validate(row) if row else None
+        if user is not None and _cacheable(db):
+            tenant_cache.set(family_id, key, user)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+def get_family_medicine(db: Session, family_id: int, medicine_id: int) -> MedicineResponse:
+    """A medicine of this family (cached), or 404"""
+    key = ("medicine", medicine_id)
+    medicine = tenant_cache.get(family_id, key)
+    if medicine is _MISSING:
+        row = get_in_family(db, Medicine, family_id, medicine_id)
+        medicine = MedicineResponse.model_validate(row) if row else None
+        if medicine is not None and _cacheable(db):
+            tenant_cache.set(family_id, key, medicine)
+    if medicine is None:
+        raise HTTPException(status_code=404, detail="Medicine not found")
+    return medicine
+
+
+def cached_list(db: Session, family_id: int, key: Hashable, load):
+    """Cache the result of `load()` (a list of response models, or a serialized bundle) for this family"""
+    value = tenant_cache.get(family_id, key)
+    if value is _MISSING:
+        value = load()
+        if _cacheable(db):
+            tenant_cache.set(family_id, key, value)
+    return value
+
+
+def cached_versioned(db: Session, family_id: int, key: Hashable, version: Hashable, load):
+    """
+    Cache the result of `load()` for this family along with `version`, read
+    from the database on every call: a cached value built at another version
+    is rebuilt, so writes handled by other workers are seen at once
+    """
+    cached = tenant_cache.get(family_id, key)
+    if cached is not _MISSING and cached[0] == version:
+        return cached[1]
+    value = load()
+    if _cacheable(db):
+        tenant_cache.set(family_id, key, (version, value))
+    return value
+
+
+def ensure_default_family(db: Session):
+    """Create the default family that pre-tenancy data and API_KEY belong to"""
+    # The first row of a fresh table gets id 1 from the sequence
+    if db.query(Family.id).first() is None:
+        db.add(Family(name="Default"))
+        db.commit()
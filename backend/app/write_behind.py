@@ -0,0 +1,186 @@
+"""
+Write-behind buffer for high-frequency log inserts
+
+Handlers validate a row, give it a server-generated uuid and hand it to the
+buffer; a background thread inserts queued rows with one multi-row INSERT
+per batch and commit. Rows still queued when the process dies are lost, so
+the mode is opt-in (WRITE_BEHIND_ENABLED).
+
+A row the database rejects (say its user was deleted while it was queued)
+is stored in failed_writes with the error, so the client that got its uuid
+can find out what happened to it.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from itertools import groupby
+from typing import Callable, Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import SQLAlchemyError
+from app.config import settings
+from app.database import SessionLocal
+from app.ids import uuid7
+from app.models import FailedWrite
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Queue of (model, values) rows flushed in batches by a worker thread"""
+
+    def __init__(self, session_factory, batch_size: int, flush_ms: int, queue_size: int):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything still queued and stop the worker"""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, model, values: dict, on_insert: Optional[Callable[[Row], None]] = None) -> Optional[dict]:
+        """
+        Queue a row for insertion
+        Returns the values (with uuid and timestamps filled in), or None if
+        the buffer is not running or full and the caller should write directly.
+        `on_insert` is called from the worker with the stored row once it is
+        committed (e.g. to audit it now that its id is known).
+        """
+        if not self.running:
+            return None
+        now = datetime.utcnow()
+        row = dict(values)
+        row.setdefault("uuid", uuid7())
+        row.setdefault("created_at", now)
+        if hasattr(model, "recorded_at"):
+            row.setdefault("recorded_at", now)
+        try:
+            self._queue.put_nowait((model, row, on_insert))
+        except queue.Full:
+            return None
+        return row
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        db = self.session_factory()
+        inserted = []
+        try:
+            # One executemany per table; the driver sends it as multi-row INSERTs
+            batch.sort(key=lambda item: item[0].__tablename__)
+            for model, items in groupby(batch, key=lambda item: item[0]):
+                items = list(items)
+                rows = [row for _, row, _ in items]
+                callbacks = [on_insert for _, _, on_insert in items]
+                if any(callbacks):
+                    # RETURNING only when someone needs the stored rows
+                    table = model.__table__
+                    stmt = insert(table).returning(*table.c, sort_by_parameter_order=True)
+                    inserted.extend(zip(callbacks, db.execute(stmt, rows).all()))
+                else:
+                    db.execute(insert(model.__table__), rows)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            logger.warning("Write-behind batch of %d failed, retrying rows one by one", len(batch))
+            inserted = self._flush_rows(db, batch)
+        finally:
+            db.close()
+        self._notify(inserted)
+
+    def _flush_rows(self, db, batch):
+        """Insert rows individually so one bad row does not drop the batch"""
+        inserted = []
+        for model, row, on_insert in batch:
+            table = model.__table__
+            try:
+                if on_insert is None:
+                    db.execute(insert(table), [row])
+                    db.commit()
+                else:
+                    stored = db.execute(insert(table).returning(*table.c), [row]).one()
+                    db.commit()
+                    inserted.append((on_insert, stored))
+            except SQLAlchemyError as exc:
+                db.rollback()
+                logger.exception("Write-behind %s row %s failed", model.__tablename__, row.get("uuid"))
+                self._record_failure(db, model, row, exc)
+        return inserted
+
+    @staticmethod
+    def _record_failure(db, model, row: dict, exc: SQLAlchemyError):
+        """Keep a rejected row and its error in failed_writes"""
+        if row.get("family_id") is None or row.get("uuid") is None:
+            return
+        error = exc.orig if getattr(exc, "orig", None) is not None else exc
+        try:
+            db.execute(insert(FailedWrite.__table__), [{
+                "family_id": row["family_id"],
+                "uuid": row["uuid"],
+                "table_name": model.__tablename__,
+                "payload": jsonable_encoder(row),
+                "error": str(error)[:1000],
+                "created_at": datetime.utcnow(),
+            }])
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            logger.exception("Dropped write-behind %s row %s", model.__tablename__, row.get("uuid"))
+
+    def _notify(self, inserted):
+        for on_insert, row in inserted:
+            if on_insert is None:
+                continue
+            try:
+                on_insert(row)
+            except Exception:
+                logger.exception("Write-behind insert callback failed")
+
+write_behind = WriteBehindBuffer(
+    SessionLocal,
+    batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+    flush_ms=settings.WRITE_BEHIND_FLUSH_MS,
+    queue_size=settings.WRITE_BEHIND_QUEUE_SIZE,
+)
@@ -0,0 +1,123 @@
+"""
+Single-statement inserts for the create endpoints
+
+Instead of SELECTing each parent row before inserting (and re-SELECTing
+the new row after commit), a create is one `INSERT ... RETURNING`. The
+composite (parent id, family_id) foreign keys reject a parent that does
+not exist or belongs to another family, and the resulting IntegrityError
+is turned into the 404 the old existence checks returned. SQLite does not
+say which constraint failed, so there the parents are looked up after the
+failed insert to give the same 404.
+
+Writes queued by the write-behind buffer answer 202 with a uuid;
+`get_queued_write` tells the client whether that row was stored.
+"""
+from uuid import UUID
+from fastapi import HTTPException
+from typing import Optional
+from sqlalchemy import Table, and_, insert, literal, select
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import FailedWrite
+
+# Foreign key constraint name -> detail of the 404 it maps to
+FOREIGN_KEY_ERRORS = {
+    "fk_medicines_user": "User not found",
+    "fk_reminders_medicine": "Medicine not found",
+    "fk_medicine_logs_user": "User not found",
+    "fk_medicine_logs_medicine": "Medicine not found",
+    "fk_medicine_logs_reminder": "Reminder not found",
+    "fk_insulin_logs_user": "User not found",
+    "fk_insulin_logs_medicine_log": "Medicine log not found",
+}
+
+# PostgreSQL SQLSTATE codes
+FOREIGN_KEY_VIOLATION = "23503"
+UNIQUE_VIOLATION = "23505"
+
+
+def missing_parent(db: Session, table: Table, values: dict) -> Optional[str]:
+    """404 detail of the first named foreign key of `table` whose parent row is missing"""
+    constraints = {constraint.name: constraint for constraint in table.foreign_key_constraints}
+    for name, detail in FOREIGN_KEY_ERRORS.items():
+        constraint = constraints.get(name)
+        if constraint is None:
+            continue
+        key = {element.column: values.get(element.parent.name) for element in constraint.elements}
+        if any(value is None for value in key.values()):
+            continue
+        stmt = (
+            select(literal(1))
+            .select_from(constraint.referred_table)
+            .where(and_(*(column == value for column, value in key.items())))
+            .limit(1)
+        )
+        if db.execute(stmt).first() is None:
+            return detail
+    return None
+
+
+def integrity_error_response(
+    exc: IntegrityError, db: Optional[Session] = None, table: Optional[Table] = None, values: Optional[dict] = None
+) -> HTTPException:
+    """
+    HTTP error for a constraint violation raised by an insert or update
+    Pass the session, table and inserted values so a foreign key error from
+    a driver that does not name the constraint (SQLite) still maps to its 404.
+    """
+    orig = exc.orig
+    diag = getattr(orig, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    if constraint in FOREIGN_KEY_ERRORS:
+        return HTTPException(status_code=404, detail=FOREIGN_KEY_ERRORS[constraint])
+
+    # Other drivers (SQLite) only give a message
+    code = getattr(orig, "pgcode", None)
+    message = str(orig)
+    if code == FOREIGN_KEY_VIOLATION or "FOREIGN KEY" in message:
+        detail = missing_parent(db, table, values) if db is not None and table is not None else None
+        if detail is not None:
+            return HTTPException(status_code=404, detail=detail)
+        return HTTPException(status_code=422, detail="Referenced record not found")
+    if code == UNIQUE_VIOLATION or "UNIQUE" in message:
+        return HTTPException(status_code=409, detail="Record already exists")
+    return HTTPException(status_code=422, detail="Invalid data")
+
+
+def insert_returning(db: Session, model, values: dict) -> Row:
+    """
+    Insert one row and commit, returning every column of the new row
+    Column defaults (timestamps, uuid) are applied as with the ORM, and the
+    returned Row can be passed straight to a from_attributes response model.
+    """
+    table = model.__table__
+    stmt = insert(table).values(**values).returning(*table.c)
+    try:
+        row = db.execute(stmt).one()
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        raise integrity_error_response(exc, db, table, values)
+    return row
+
+
+def get_queued_write(db: Session, model, family_id: int, uuid: UUID, not_found: str):
+    """
+    Row stored for a write-behind uuid
+    422 with the database's error if the row was rejected, 404 if it is
+    unknown or still queued (ask again shortly).
+    """
+    row = db.scalars(select(model).where(model.family_id == family_id, model.uuid == uuid)).first()
+    if row is not None:
+        return row
+    failed = db.scalars(
+        select(FailedWrite).where(
+            FailedWrite.family_id == family_id,
+            FailedWrite.uuid == uuid,
+            FailedWrite.table_name == model.__tablename__,
+        )
+    ).first()
+    if failed is not None:
+        raise HTTPException(status_code=422, detail=f"Write failed: {failed.error}")
+    raise HTTPException(status_code=404, detail=not_found)
@@ -0,0 +1,241 @@
+"""
+Embedded (SQLite) mode vs. PostgreSQL mode on the same workload
+
+For each database, starts uvicorn with the API in a fresh process, seeds one
+household (4 users, 3 medicines and reminders each) and replays the same
+mixed workload from --concurrency client threads: medicine and reminder
+lists, the dose schedule, missed doses, daily insulin logs, logging and
+confirming doses and recording insulin. Reports per-operation latency
+(median / p95) and the resident memory of the API process and, for
+PostgreSQL, of the local postgres server processes (peak RSS as VmHWM for
+the API, current RSS for postgres).
+
+Usage (from backend/):
+    python -m benchmarks.embedded [--postgres-url postgresql://...] [--requests 2000] [--concurrency 8]
+
+Without --postgres-url only SQLite mode runs. Memory is read from /proc, so
+it is reported on Linux only; postgres memory only when the server runs on
+this machine.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "embedded-benchmark"
+
+
+def _rss_kb(pid: int, field: str = "VmRSS") -> int:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _postgres_rss_kb() -> int:
+    """Resident memory of all local postgres processes"""
+    total = 0
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/comm") as comm:
+                if comm.read().strip() not in ("postgres", "postmaster"):
+                    continue
+        except OSError:
+            continue
+        total += _rss_kb(int(pid))
+    return total
+
+
+class Client:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def request(self, method: str, path: str, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header("X-API-Key", API_KEY)
+        if data is not None:
+            request.add_header("Content-Type", "application/json")
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+
+def _wait_for_health(client: Client, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with code {process.returncode}")
+        try:
+            if client.request("GET", "/health")[0] == 200:
+                return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    raise SystemExit("server did not start")
+
+
+def _seed(client: Client) -> list:
+    """(user_id, medicine_id, reminder_id) of the seeded household"""
+    doses = []
+    for name in ("Amma", "Nanna", "Ammamma", "Thatha"):
+        status, user = client.request("POST", "/api/users/", {"name": name, "timezone": "Asia/Kolkata"})
+        assert status == 201, status
+        for index, (medicine_name, time_of_day) in enumerate([("Metformin 500", "08:00"), ("Telma 40", "13:30"), ("Atorva 10", "21:00")]):
+            _, medicine = client.request(
+                "POST", "/api/medicines/", {"name": medicine_name, "type": "tablet", "user_id": user["id"]}
+            )
+            _, reminder = client.request(
+                "POST", "/api/reminders/", {"medicine_id": medicine["id"], "scheduled_time": time_of_day}
+            )
+            doses.append((user["id"], medicine["id"], reminder["id"]))
+    return doses
+
+
+def _operations(doses: list):
+    today = date.today()
+    user_ids = sorted({user_id for user_id, _, _ in doses})
+    logs = []
+    logs_lock = threading.Lock()
+
+    def log_dose(client):
+        user_id, medicine_id, reminder_id = random.choice(doses)
+        status, log = client.request("POST", "/api/reminders/logs", {
+            "user_id": user_id, "medicine_id": medicine_id, "reminder_id": reminder_id,
+            "scheduled_at": datetime.utcnow().isoformat(), "status": "pending",
+        })
+        if status == 201:
+            with logs_lock:
+                logs.append(log["id"])
+        return status
+
+    def confirm_dose(client):
+        with logs_lock:
+            log_id = random.choice(logs) if logs else None
+        if log_id is None:
+            return log_dose(client)
+        return client.request("PUT", f"/api/reminders/logs/{log_id}", {"status": "taken"})[0]
+
+    # (name, weight, call)
+    return [
+        ("list medicines", 20, lambda client: client.request("GET", f"/api/medicines/?user_id={random.choice(user_ids)}")[0]),
+        ("list reminders", 10, lambda client: client.request("GET", "/api/reminders/")[0]),
+        ("dose schedule", 10, lambda client: client.request(
+            "GET", f"/api/reminders/schedule?start={today}&end={today + timedelta(days=6)}")[0]),
+        ("missed doses", 10, lambda client: client.request("GET", "/api/reminders/logs/missed")[0]),
+        ("daily insulin", 10, lambda client: client.request(
+            "GET", f"/api/insulin/daily?user_id={random.choice(user_ids)}")[0]),
+        ("log dose", 15, log_dose),
+        ("confirm dose", 15, confirm_dose),
+        ("record insulin", 10, lambda client: client.request("POST", "/api/insulin/", {
+            "user_id": random.choice(user_ids), "glucose_reading": random.uniform(70, 250), "insulin_dosage": 4,
+        })[0]),
+    ]
+
+
+def run(database_url: str, requests: int, concurrency: int, port: int) -> dict:
+    env = dict(os.environ, DATABASE_URL=database_url, API_KEY=API_KEY, ENVIRONMENT="development")
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    client = Client(f"http://127.0.0.1:{port}")
+    try:
+        _wait_for_health(client, process, timeout=60)
+        operations = _operations(_seed(client))
+        weights = [weight for _, weight, _ in operations]
+        rng = random.Random(42)
+        plan = rng.choices(range(len(operations)), weights=weights, k=requests)
+
+        latencies = defaultdict(list)
+        failures = defaultdict(int)
+        cursor = iter(plan)
+        cursor_lock = threading.Lock()
+
+        def worker():
+            while True:
+                with cursor_lock:
+                    index = next(cursor, None)
+                if index is None:
+                    return
+                name, _, call = operations[index]
+                started = time.perf_counter()
+                status = call(client)
+                latencies[name].append(time.perf_counter() - started)
+                if status >= 400:
+                    failures[name] += 1
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "elapsed": elapsed,
+            "latencies": latencies,
+            "failures": failures,
+            "api_rss_kb": _rss_kb(process.pid, "VmHWM"),
+            "db_rss_kb": _postgres_rss_kb() if database_url.startswith("postgresql") else 0,
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _report(label: str, result: dict, requests: int):
+    print(f"\n{label}: {requests} requests in {result['elapsed']:.2f} s ({requests / result['elapsed']:.0f} req/s)")
+    print(f"  {'operation':<16}{'count':>7}{'median ms':>12}{'p95 ms':>10}{'failed':>8}")
+    for name in sorted(result["latencies"]):
+        timings = sorted(result["latencies"][name])
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(
+            f"  {name:<16}{len(timings):>7}{statistics.median(timings) * 1000:>12.1f}"
+            f"{p95 * 1000:>10.1f}{result['failures'][name]:>8}"
+        )
+    print(f"  API process peak RSS: {result['api_rss_kb'] / 1024:.0f} MiB")
+    if result["db_rss_kb"]:
+        print(f"  postgres processes RSS: {result['db_rss_kb'] / 1024:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite vs. PostgreSQL mode benchmark")
+    parser.add_argument("--postgres-url", help="empty PostgreSQL database to compare against")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads (default: 8)")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_url = f"sqlite:///{os.path.join(tmp, 'embedded.db')}"
+        _report("SQLite (WAL)", run(sqlite_url, args.requests, args.concurrency, args.port), args.requests)
+    if args.postgres_url:
+        _report("PostgreSQL", run(args.postgres_url, args.requests, args.concurrency, args.port), args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Import-time profile of the API
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter and
+summarizes the output: the slowest modules by cumulative and self time, and
+self time grouped by top-level package.
+
+Usage (from backend/):
+    python -m benchmarks.importtime [--module app.main] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import List, NamedTuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile(module: str) -> List[ImportRecord]:
+    """Import `module` under -X importtime and parse the report"""
+    env = dict(os.environ)
+    # Importing the app must not need a real database or secrets
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env.setdefault("API_KEY", "importtime")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"import {module} failed")
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # column header
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        records.append(ImportRecord(
+            module=stripped,
+            self_us=int(fields[0]),
+            cumulative_us=int(fields[1]),
+            depth=(len(name) - len(stripped)) // 2,
+        ))
+    return records
+
+
+def _ms(microseconds: int) -> str:
+    return f"{microseconds / 1000:9.1f} ms"
+
+
+def summarize(records: List[ImportRecord], module: str, top: int) -> str:
+    total = sum(record.self_us for record in records)
+    lines = [f"import {module}: {_ms(total).strip()} total, {len(records)} modules", ""]
+
+    lines.append(f"Top {top} by cumulative time")
+    for record in sorted(records, key=lambda r: r.cumulative_us, reverse=True)[:top]:
+        lines.append(f"  {_ms(record.cumulative_us)}  {record.module}")
+    lines.append("")
+
+    lines.append(f"Top {top} by self time")
+    for record in sorted(records, key=lambda r: r.self_us, reverse=True)[:top]:
+        lines.append(f"  {_ms(record.self_us)}  {record.module}")
+    lines.append("")
+
+    packages = defaultdict(int)
+    for record in records:
+        packages[record.module.split(".")[0]] += record.self_us
+    lines.append(f"Top {top} packages by self time")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        lines.append(f"  {_ms(self_us)}  {package}")
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app.main", help="module to import (default: app.main)")
+    parser.add_argument("--top", type=int, default=15, help="rows per table (default: 15)")
+    args = parser.parse_args()
+    print(summarize(profile(args.module), args.module, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Payload size of the list encodings, with and without compression
+
+Builds synthetic medicine and insulin logs, encodes them the way the list
+endpoints do for each Accept type and prints the size of each body raw,
+gzipped and brotli-compressed, relative to plain JSON.
+
+Usage (from backend/):
+    python -m benchmarks.payload_size [--rows 500]
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.compression import compress
+from app.encoding import COLUMNAR_JSON, COLUMNAR_MSGPACK, MSGPACK, encode_body
+from app.ids import uuid7
+from app.models import ReminderStatus
+from app.schemas import InsulinLogResponse, MedicineLogResponse
+
+
+def medicine_logs(count: int, rng: random.Random):
+    start = datetime(2024, 1, 1, 8, 0)
+    rows = []
+    for i in range(count):
+        scheduled_at = start + timedelta(hours=12 * i)
+        status = rng.choices(list(ReminderStatus), weights=[1, 14, 3, 2])[0]
+        rows.append(MedicineLogResponse(
+            id=i + 1,
+            uuid=uuid7(),
+            user_id=1,
+            medicine_id=1 + i % 3,
+            reminder_id=1 + i % 6,
+            status=status,
+            scheduled_at=scheduled_at,
+            taken_at=scheduled_at + timedelta(minutes=rng.randint(0, 90)) if status == ReminderStatus.TAKEN else None,
+            snooze_count=rng.randint(0, 2),
+            notes=None if rng.random() < 0.9 else "Taken after breakfast",
+            created_at=scheduled_at,
+        ))
+    return rows
+
+
+def insulin_logs(count: int, rng: random.Random):
+    start = datetime(2024, 1, 1, 7, 30)
+    rows = []
+    for i in range(count):
+        recorded_at = start + timedelta(hours=8 * i, minutes=rng.randint(-30, 30), seconds=rng.randint(0, 59))
+        glucose = round(rng.gauss(150, 40), 1)
+        rows.append(InsulinLogResponse(
+            id=i + 1,
+            uuid=uuid7(),
+            user_id=1,
+            medicine_log_id=None,
+            glucose_reading=glucose,
+            insulin_dosage=float(rng.randint(2, 8)),
+            suggested_dosage=4.0,
+            notes=None,
+            recorded_at=recorded_at,
+            created_at=recorded_at,
+        ))
+    return rows
+
+
+def encodings(items, model):
+    yield "json", JSONResponse(jsonable_encoder(items)).body
+    for name, media_type in (("msgpack", MSGPACK), ("columnar+json", COLUMNAR_JSON), ("columnar+msgpack", COLUMNAR_MSGPACK)):
+        yield name, encode_body(items, model, media_type)
+
+
+def report(title: str, items, model):
+    print(f"{title} ({len(items)} rows)")
+    print(f"  {'encoding':<18}{'raw':>10}{'gzip':>10}{'br':>10}   (% of raw JSON)")
+    baseline = None
+    for name, body in encodings(items, model):
+        sizes = [len(body), len(compress(body, "gzip")), len(compress(body, "br"))]
+        baseline = baseline or sizes[0]
+        cells = "".join(f"{size:>10,}" for size in sizes)
+        percents = " ".join(f"{size * 100 / baseline:5.1f}%" for size in sizes)
+        print(f"  {name:<18}{cells}   {percents}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list payload sizes per encoding")
+    parser.add_argument("--rows", type=int, default=500, help="rows per list (default: 500)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    report("GET /api/reminders/logs", medicine_logs(args.rows, rng), MedicineLogResponse)
+    report("GET /api/insulin/", insulin_logs(args.rows, rng), InsulinLogResponse)
+
+
+if __name__ == "__main__":
+    main()
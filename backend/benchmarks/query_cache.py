@@ -0,0 +1,94 @@
+"""
+Per-call cost of the hot primary-key lookups
+
+Compares the legacy `db.query(...).filter(...).first()` pattern with the
+repository helpers, each in a fresh session per call (like a request),
+plus a Session.get identity-map hit. Also runs the legacy pattern with the
+compiled-statement cache disabled to show what compilation costs.
+
+Usage (from backend/):
+    python -m benchmarks.query_cache [--calls 5000] [--url postgresql://...]
+
+Without --url an in-memory SQLite database is used, which isolates the
+Python-side overhead from network round trips.
+"""
+import argparse
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from app.models import Base, Family, User
+from app.repository import exists_in_family, get_in_family
+
+
+def _engine(url: str, **kwargs):
+    if url.startswith("sqlite"):
+        kwargs.update(connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    return create_engine(url, **kwargs)
+
+
+def _seed(engine) -> tuple:
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        family = Family(name="Benchmark")
+        db.add(family)
+        db.flush()
+        user = User(name="Benchmark", family_id=family.id)
+        db.add(user)
+        db.commit()
+        return family.id, user.id
+
+
+def _time_per_call(engine, calls: int, lookup, fresh_session: bool = True) -> float:
+    """Microseconds per call"""
+    db = Session(engine)
+    # Warm caches and the connection; holding the result keeps it in the
+    # session's (weak-referencing) identity map, as a handler would
+    warm = lookup(db)
+    started = time.perf_counter()
+    for _ in range(calls):
+        if fresh_session:
+            db.close()
+            db = Session(engine)
+        lookup(db)
+    elapsed = time.perf_counter() - started
+    del warm
+    db.close()
+    return elapsed / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hot primary-key lookups")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--url", default="sqlite://", help="database to run against (default: in-memory SQLite)")
+    args = parser.parse_args()
+
+    engine = _engine(args.url)
+    family_id, user_id = _seed(engine)
+    uncached = _engine(args.url, query_cache_size=0) if not args.url.startswith("sqlite") else None
+    if uncached is None:
+        # An in-memory SQLite database is private to its engine, so reuse the
+        # connection pool and only switch the compiled cache off
+        uncached = engine.execution_options(compiled_cache=None)
+
+    def legacy_get(db):
+        return db.query(User).filter(User.family_id == family_id, User.id == user_id).first()
+
+    def legacy_exists(db):
+        return db.query(User.id).filter(User.family_id == family_id, User.id == user_id).first() is not None
+
+    cases = [
+        ("query().filter().first(), no compiled cache", uncached, legacy_get, True),
+        ("query().filter().first()", engine, legacy_get, True),
+        ("get_in_family (Session.get)", engine, lambda db: get_in_family(db, User, family_id, user_id), True),
+        ("get_in_family, identity-map hit", engine, lambda db: get_in_family(db, User, family_id, user_id), False),
+        ("query(Model.id) existence check", engine, legacy_exists, True),
+        ("exists_in_family (lambda_stmt)", engine, lambda db: exists_in_family(db, User, family_id, user_id), True),
+    ]
+    print(f"{args.calls} calls each against {engine.url.render_as_string(hide_password=True)}")
+    for name, bind, lookup, fresh in cases:
+        print(f"  {name:<46}{_time_per_call(bind, args.calls, lookup, fresh):8.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
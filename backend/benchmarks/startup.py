@@ -0,0 +1,90 @@
+"""
+Cold-start benchmark: time from process launch to the first served request
+
+Starts uvicorn with the API in a fresh process, polls /health until it
+answers and reports the elapsed time, then stops the server. Repeats for
+--runs launches and prints min / median / max.
+
+Usage (from backend/):
+    python -m benchmarks.startup [--runs 5] [--port 8765]
+
+DATABASE_URL is passed through; without it a throwaway SQLite file is used
+so the numbers exclude network latency to PostgreSQL.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _wait_for_health(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.005)
+    raise SystemExit(f"no response from {url} after {timeout:.0f}s")
+
+
+def time_to_first_request(port: int, env: dict, timeout: float) -> float:
+    """Seconds from spawning the server to the first 200 from /health"""
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    try:
+        _wait_for_health(f"http://127.0.0.1:{port}/health", process, timeout)
+        return time.perf_counter() - started
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-first-request benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="server launches (default: 5)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait per launch")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("API_KEY", "startup-benchmark")
+    with tempfile.TemporaryDirectory() as tmp:
+        if "DATABASE_URL" not in env:
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+
+        timings = []
+        for run in range(1, args.runs + 1):
+            elapsed = time_to_first_request(args.port, env, args.timeout)
+            timings.append(elapsed)
+            print(f"run {run}: {elapsed * 1000:.0f} ms")
+
+    print(
+        f"time to first request over {len(timings)} runs: "
+        f"min {min(timings) * 1000:.0f} ms, "
+        f"median {statistics.median(timings) * 1000:.0f} ms, "
+        f"max {max(timings) * 1000:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+-- Reminder.scheduled_time becomes a TIME column, users get a time zone and
+-- reminders get days-of-week / interval recurrence.
+-- Fresh databases get this schema from create_all; run this on existing ones:
+--   psql -U medicine_user -d medicine_tracker_db -f migrations/001_reminder_time_and_timezone.sql
+BEGIN;
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone VARCHAR NOT NULL DEFAULT 'UTC';
+
+ALTER TABLE reminders ALTER COLUMN scheduled_time TYPE TIME USING scheduled_time::time;
+ALTER TABLE reminders ADD COLUMN IF NOT EXISTS days_of_week INTEGER;
+ALTER TABLE reminders ADD COLUMN IF NOT EXISTS interval_days INTEGER;
+ALTER TABLE reminders ADD COLUMN IF NOT EXISTS start_date DATE;
+CREATE INDEX IF NOT EXISTS ix_reminders_scheduled_time ON reminders (scheduled_time);
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Server-generated UUIDv7 ids on medicine and insulin logs (write-behind mode).
+-- Existing rows get random UUIDs.
+BEGIN;
+
+ALTER TABLE medicine_logs ADD COLUMN IF NOT EXISTS uuid UUID;
+UPDATE medicine_logs SET uuid = gen_random_uuid() WHERE uuid IS NULL;
+ALTER TABLE medicine_logs ALTER COLUMN uuid SET NOT NULL;
+ALTER TABLE medicine_logs ADD CONSTRAINT medicine_logs_uuid_key UNIQUE (uuid);
+
+ALTER TABLE insulin_logs ADD COLUMN IF NOT EXISTS uuid UUID;
+UPDATE insulin_logs SET uuid = gen_random_uuid() WHERE uuid IS NULL;
+ALTER TABLE insulin_logs ALTER COLUMN uuid SET NOT NULL;
+ALTER TABLE insulin_logs ADD CONSTRAINT insulin_logs_uuid_key UNIQUE (uuid);
+
+COMMIT;
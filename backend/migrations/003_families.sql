@@ -0,0 +1,39 @@
+-- Multi-tenant families. Existing rows move to the default family (id 1),
+-- which the server-wide API_KEY maps to.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS families (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    api_key_hash VARCHAR UNIQUE,
+    created_at TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_families_id ON families (id);
+INSERT INTO families (id, name, created_at) VALUES (1, 'Default', now() AT TIME ZONE 'UTC')
+    ON CONFLICT (id) DO NOTHING;
+SELECT setval(pg_get_serial_sequence('families', 'id'), (SELECT max(id) FROM families));
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS family_id INTEGER NOT NULL DEFAULT 1 REFERENCES families (id);
+ALTER TABLE medicines ADD COLUMN IF NOT EXISTS family_id INTEGER NOT NULL DEFAULT 1 REFERENCES families (id);
+ALTER TABLE reminders ADD COLUMN IF NOT EXISTS family_id INTEGER NOT NULL DEFAULT 1 REFERENCES families (id);
+ALTER TABLE medicine_logs ADD COLUMN IF NOT EXISTS family_id INTEGER NOT NULL DEFAULT 1 REFERENCES families (id);
+ALTER TABLE insulin_logs ADD COLUMN IF NOT EXISTS family_id INTEGER NOT NULL DEFAULT 1 REFERENCES families (id);
+ALTER TABLE bookmarks ADD COLUMN IF NOT EXISTS family_id INTEGER NOT NULL DEFAULT 1 REFERENCES families (id);
+
+ALTER TABLE users ALTER COLUMN family_id DROP DEFAULT;
+ALTER TABLE medicines ALTER COLUMN family_id DROP DEFAULT;
+ALTER TABLE reminders ALTER COLUMN family_id DROP DEFAULT;
+ALTER TABLE medicine_logs ALTER COLUMN family_id DROP DEFAULT;
+ALTER TABLE insulin_logs ALTER COLUMN family_id DROP DEFAULT;
+ALTER TABLE bookmarks ALTER COLUMN family_id DROP DEFAULT;
+
+-- Tenant-leading composite indexes
+CREATE INDEX IF NOT EXISTS ix_users_family_id_id ON users (family_id, id);
+CREATE INDEX IF NOT EXISTS ix_medicines_family_id_user_id ON medicines (family_id, user_id, is_active);
+CREATE INDEX IF NOT EXISTS ix_reminders_family_id_medicine_id ON reminders (family_id, medicine_id);
+CREATE INDEX IF NOT EXISTS ix_medicine_logs_family_id_user_id ON medicine_logs (family_id, user_id, scheduled_at);
+CREATE INDEX IF NOT EXISTS ix_medicine_logs_family_id_status ON medicine_logs (family_id, status, scheduled_at);
+CREATE INDEX IF NOT EXISTS ix_insulin_logs_family_id_user_id ON insulin_logs (family_id, user_id, recorded_at);
+CREATE INDEX IF NOT EXISTS ix_bookmarks_family_id ON bookmarks (family_id, is_active);
+
+COMMIT;
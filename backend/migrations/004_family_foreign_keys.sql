@@ -0,0 +1,50 @@
+-- Tenant-scoped foreign keys: child rows reference (parent id, family_id),
+-- so a row can only point at a parent in its own family. Lets create
+-- endpoints rely on the constraint instead of a SELECT before each INSERT.
+BEGIN;
+
+-- Unique (family_id, id) on each parent for the composite keys to target
+DROP INDEX IF EXISTS ix_users_family_id_id;
+ALTER TABLE users DROP CONSTRAINT IF EXISTS uq_users_family_id_id;
+ALTER TABLE users ADD CONSTRAINT uq_users_family_id_id UNIQUE (family_id, id);
+ALTER TABLE medicines DROP CONSTRAINT IF EXISTS uq_medicines_family_id_id;
+ALTER TABLE medicines ADD CONSTRAINT uq_medicines_family_id_id UNIQUE (family_id, id);
+ALTER TABLE reminders DROP CONSTRAINT IF EXISTS uq_reminders_family_id_id;
+ALTER TABLE reminders ADD CONSTRAINT uq_reminders_family_id_id UNIQUE (family_id, id);
+ALTER TABLE medicine_logs DROP CONSTRAINT IF EXISTS uq_medicine_logs_family_id_id;
+ALTER TABLE medicine_logs ADD CONSTRAINT uq_medicine_logs_family_id_id UNIQUE (family_id, id);
+
+-- Replace the single-column foreign keys
+ALTER TABLE medicines DROP CONSTRAINT IF EXISTS medicines_user_id_fkey;
+ALTER TABLE medicines DROP CONSTRAINT IF EXISTS fk_medicines_user;
+ALTER TABLE medicines ADD CONSTRAINT fk_medicines_user
+    FOREIGN KEY (user_id, family_id) REFERENCES users (id, family_id);
+
+ALTER TABLE reminders DROP CONSTRAINT IF EXISTS reminders_medicine_id_fkey;
+ALTER TABLE reminders DROP CONSTRAINT IF EXISTS fk_reminders_medicine;
+ALTER TABLE reminders ADD CONSTRAINT fk_reminders_medicine
+    FOREIGN KEY (medicine_id, family_id) REFERENCES medicines (id, family_id);
+
+ALTER TABLE medicine_logs DROP CONSTRAINT IF EXISTS medicine_logs_user_id_fkey;
+ALTER TABLE medicine_logs DROP CONSTRAINT IF EXISTS fk_medicine_logs_user;
+ALTER TABLE medicine_logs ADD CONSTRAINT fk_medicine_logs_user
+    FOREIGN KEY (user_id, family_id) REFERENCES users (id, family_id);
+ALTER TABLE medicine_logs DROP CONSTRAINT IF EXISTS medicine_logs_medicine_id_fkey;
+ALTER TABLE medicine_logs DROP CONSTRAINT IF EXISTS fk_medicine_logs_medicine;
+ALTER TABLE medicine_logs ADD CONSTRAINT fk_medicine_logs_medicine
+    FOREIGN KEY (medicine_id, family_id) REFERENCES medicines (id, family_id);
+ALTER TABLE medicine_logs DROP CONSTRAINT IF EXISTS medicine_logs_reminder_id_fkey;
+ALTER TABLE medicine_logs DROP CONSTRAINT IF EXISTS fk_medicine_logs_reminder;
+ALTER TABLE medicine_logs ADD CONSTRAINT fk_medicine_logs_reminder
+    FOREIGN KEY (reminder_id, family_id) REFERENCES reminders (id, family_id);
+
+ALTER TABLE insulin_logs DROP CONSTRAINT IF EXISTS insulin_logs_user_id_fkey;
+ALTER TABLE insulin_logs DROP CONSTRAINT IF EXISTS fk_insulin_logs_user;
+ALTER TABLE insulin_logs ADD CONSTRAINT fk_insulin_logs_user
+    FOREIGN KEY (user_id, family_id) REFERENCES users (id, family_id);
+ALTER TABLE insulin_logs DROP CONSTRAINT IF EXISTS insulin_logs_medicine_log_id_fkey;
+ALTER TABLE insulin_logs DROP CONSTRAINT IF EXISTS fk_insulin_logs_medicine_log;
+ALTER TABLE insulin_logs ADD CONSTRAINT fk_insulin_logs_medicine_log
+    FOREIGN KEY (medicine_log_id, family_id) REFERENCES medicine_logs (id, family_id);
+
+COMMIT;
@@ -0,0 +1,60 @@
+-- Append-only audit log (change_events) and entity state snapshots.
+-- Rows that exist before auditing starts get a baseline snapshot, so their
+-- state can be rebuilt from the time the migration ran.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS change_events (
+    id SERIAL PRIMARY KEY,
+    family_id INTEGER NOT NULL REFERENCES families (id),
+    uuid UUID NOT NULL UNIQUE,
+    entity_type VARCHAR NOT NULL,
+    entity_id INTEGER NOT NULL,
+    action VARCHAR NOT NULL,
+    changes JSON NOT NULL,
+    actor VARCHAR,
+    created_at TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_change_events_entity ON change_events (entity_type, entity_id, id);
+CREATE INDEX IF NOT EXISTS ix_change_events_family_id ON change_events (family_id, created_at);
+
+CREATE OR REPLACE FUNCTION change_events_append_only() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN RAISE EXCEPTION 'change_events is append-only'; END $$;
+DROP TRIGGER IF EXISTS change_events_append_only ON change_events;
+CREATE TRIGGER change_events_append_only BEFORE UPDATE OR DELETE ON change_events
+    FOR EACH ROW EXECUTE FUNCTION change_events_append_only();
+
+CREATE TABLE IF NOT EXISTS entity_snapshots (
+    id SERIAL PRIMARY KEY,
+    family_id INTEGER NOT NULL REFERENCES families (id),
+    entity_type VARCHAR NOT NULL,
+    entity_id INTEGER NOT NULL,
+    event_id INTEGER,
+    state JSON NOT NULL,
+    as_of TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_entity_snapshots_entity ON entity_snapshots (entity_type, entity_id, as_of);
+
+-- Baselines (event_id NULL). Enum columns store the member name (TABLET);
+-- the API and the audit log use the value (tablet).
+INSERT INTO entity_snapshots (family_id, entity_type, entity_id, state, as_of, created_at)
+SELECT family_id, 'user', id, to_json(u), now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC' FROM users u
+WHERE NOT EXISTS (SELECT 1 FROM entity_snapshots s WHERE s.entity_type = 'user' AND s.entity_id = u.id);
+INSERT INTO entity_snapshots (family_id, entity_type, entity_id, state, as_of, created_at)
+SELECT family_id, 'medicine', id, (to_jsonb(m) || jsonb_build_object('type', lower(m.type::text)))::json,
+       now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+FROM medicines m
+WHERE NOT EXISTS (SELECT 1 FROM entity_snapshots s WHERE s.entity_type = 'medicine' AND s.entity_id = m.id);
+INSERT INTO entity_snapshots (family_id, entity_type, entity_id, state, as_of, created_at)
+SELECT family_id, 'reminder', id, to_json(r), now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC' FROM reminders r
+WHERE NOT EXISTS (SELECT 1 FROM entity_snapshots s WHERE s.entity_type = 'reminder' AND s.entity_id = r.id);
+INSERT INTO entity_snapshots (family_id, entity_type, entity_id, state, as_of, created_at)
+SELECT family_id, 'medicine_log', id, (to_jsonb(l) || jsonb_build_object('status', lower(l.status::text)))::json,
+       now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC'
+FROM medicine_logs l
+WHERE NOT EXISTS (SELECT 1 FROM entity_snapshots s WHERE s.entity_type = 'medicine_log' AND s.entity_id = l.id);
+INSERT INTO entity_snapshots (family_id, entity_type, entity_id, state, as_of, created_at)
+SELECT family_id, 'insulin_log', id, to_json(i), now() AT TIME ZONE 'UTC', now() AT TIME ZONE 'UTC' FROM insulin_logs i
+WHERE NOT EXISTS (SELECT 1 FROM entity_snapshots s WHERE s.entity_type = 'insulin_log' AND s.entity_id = i.id);
+
+COMMIT;
@@ -0,0 +1,20 @@
+-- Indexes for GET /api/medicines/search: full-text over name and instructions
+-- and, where the pg_trgm extension is available (PostgreSQL contrib), trigram
+-- indexes for substring and fuzzy matching.
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS ix_medicines_search ON medicines
+    USING gin (to_tsvector('simple'::regconfig, coalesce(name, '') || ' ' || coalesce(instructions, '')));
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS ix_medicines_name_trgm ON medicines USING gin (name gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS ix_medicines_instructions_trgm ON medicines USING gin (instructions gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'pg_trgm is not available: medicine search will not match misspellings';
+    END IF;
+END $$;
+
+COMMIT;
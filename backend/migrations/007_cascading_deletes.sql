@@ -0,0 +1,42 @@
+-- Owning foreign keys cascade on delete, so removing a user removes their
+-- medicines, reminders and logs instead of failing on them. Optional
+-- references (a log's reminder or medicine log) keep NO ACTION. Adds the
+-- table tracking background deletions.
+BEGIN;
+
+ALTER TABLE medicines DROP CONSTRAINT IF EXISTS fk_medicines_user;
+ALTER TABLE medicines ADD CONSTRAINT fk_medicines_user
+    FOREIGN KEY (user_id, family_id) REFERENCES users (id, family_id) ON DELETE CASCADE;
+
+ALTER TABLE reminders DROP CONSTRAINT IF EXISTS fk_reminders_medicine;
+ALTER TABLE reminders ADD CONSTRAINT fk_reminders_medicine
+    FOREIGN KEY (medicine_id, family_id) REFERENCES medicines (id, family_id) ON DELETE CASCADE;
+
+ALTER TABLE medicine_logs DROP CONSTRAINT IF EXISTS fk_medicine_logs_user;
+ALTER TABLE medicine_logs ADD CONSTRAINT fk_medicine_logs_user
+    FOREIGN KEY (user_id, family_id) REFERENCES users (id, family_id) ON DELETE CASCADE;
+ALTER TABLE medicine_logs DROP CONSTRAINT IF EXISTS fk_medicine_logs_medicine;
+ALTER TABLE medicine_logs ADD CONSTRAINT fk_medicine_logs_medicine
+    FOREIGN KEY (medicine_id, family_id) REFERENCES medicines (id, family_id) ON DELETE CASCADE;
+
+ALTER TABLE insulin_logs DROP CONSTRAINT IF EXISTS fk_insulin_logs_user;
+ALTER TABLE insulin_logs ADD CONSTRAINT fk_insulin_logs_user
+    FOREIGN KEY (user_id, family_id) REFERENCES users (id, family_id) ON DELETE CASCADE;
+
+CREATE TABLE IF NOT EXISTS deletion_jobs (
+    id SERIAL PRIMARY KEY,
+    family_id INTEGER NOT NULL REFERENCES families (id),
+    entity_type VARCHAR NOT NULL,
+    entity_id INTEGER NOT NULL,
+    status VARCHAR NOT NULL,
+    total JSON,
+    deleted JSON NOT NULL,
+    error TEXT,
+    actor VARCHAR,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    started_at TIMESTAMP WITHOUT TIME ZONE,
+    finished_at TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_deletion_jobs_family_id ON deletion_jobs (family_id, entity_type, entity_id);
+
+COMMIT;
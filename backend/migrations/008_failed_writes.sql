@@ -0,0 +1,17 @@
+-- Rows queued by the write-behind buffer that the database rejected (for
+-- example because the user was deleted meanwhile). The client already got
+-- 202 with the row's uuid and can look it up.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS failed_writes (
+    id SERIAL PRIMARY KEY,
+    family_id INTEGER NOT NULL REFERENCES families (id),
+    uuid UUID NOT NULL UNIQUE,
+    table_name VARCHAR NOT NULL,
+    payload JSON NOT NULL,
+    error TEXT NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_failed_writes_family_id ON failed_writes (family_id, created_at);
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Deletion jobs are claimed by one worker at a time: `owner` holds the job
+-- while it keeps `heartbeat_at` fresh, and another worker may take it over
+-- once the heartbeat is older than DELETION_LEASE_SECONDS.
+BEGIN;
+
+ALTER TABLE deletion_jobs ADD COLUMN IF NOT EXISTS owner VARCHAR;
+ALTER TABLE deletion_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITHOUT TIME ZONE;
+
+COMMIT;
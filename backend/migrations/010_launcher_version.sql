@@ -0,0 +1,9 @@
+-- Per-family counter bumped in the same transaction as every change to
+-- users or bookmarks. Each worker compares it with the version its cached
+-- launcher bundle was built at, so a write handled by another worker is
+-- seen on the next request instead of after the cache TTL.
+BEGIN;
+
+ALTER TABLE families ADD COLUMN IF NOT EXISTS launcher_version INTEGER NOT NULL DEFAULT 0;
+
+COMMIT;
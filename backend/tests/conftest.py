@@ -0,0 +1,95 @@
+"""
+The app runs in embedded mode (SQLite) against a fresh database file, so
+the tests need no PostgreSQL server. Each test that touches data gets a
+family of its own, which keeps tests independent of each other's rows.
+"""
+import os
+import tempfile
+from typing import Optional
+
+_data_dir = tempfile.mkdtemp(prefix="medicine-tracker-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_data_dir}/test.db"
+os.environ["API_KEY"] = "test-server-key"
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+SERVER_HEADERS = {"X-API-Key": "test-server-key"}
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def server_headers() -> dict:
+    """Headers with the server-wide API key (acts on the default family)"""
+    return dict(SERVER_HEADERS)
+
+
+@pytest.fixture
+def new_family(client):
+    """Create a family and return the headers authenticating as it"""
+    def create(name: str = "Family") -> dict:
+        response = client.post("/api/families/", json={"name": name}, headers=SERVER_HEADERS)
+        assert response.status_code == 201, response.text
+        return {"X-API-Key": response.json()["api_key"]}
+    return create
+
+
+@pytest.fixture
+def family(new_family) -> dict:
+    return new_family()
+
+
+def _created(response) -> dict:
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+@pytest.fixture
+def create_user(client):
+    def create(headers: dict, name: str = "Nani") -> int:
+        return _created(client.post("/api/users/", json={"name": name}, headers=headers))["id"]
+    return create
+
+
+@pytest.fixture
+def create_medicine(client):
+    def create(headers: dict, user_id: int, name: str = "Metformin") -> int:
+        medicine = {"name": name, "type": "tablet", "user_id": user_id}
+        return _created(client.post("/api/medicines/", json=medicine, headers=headers))["id"]
+    return create
+
+
+@pytest.fixture
+def create_reminder(client):
+    def create(headers: dict, medicine_id: int) -> int:
+        reminder = {"medicine_id": medicine_id, "scheduled_time": "08:00"}
+        return _created(client.post("/api/reminders/", json=reminder, headers=headers))["id"]
+    return create
+
+
+@pytest.fixture
+def create_medicine_log(client):
+    def create(headers: dict, user_id: int, medicine_id: int, reminder_id: Optional[int] = None) -> int:
+        log = {
+            "user_id": user_id,
+            "medicine_id": medicine_id,
+            "reminder_id": reminder_id,
+            "scheduled_at": "2026-01-01T08:00:00",
+            "status": "taken",
+        }
+        return _created(client.post("/api/reminders/logs", json=log, headers=headers))["id"]
+    return create
+
+
+@pytest.fixture
+def create_insulin_log(client):
+    def create(headers: dict, user_id: int, medicine_log_id: Optional[int] = None) -> int:
+        log = {"user_id": user_id, "glucose_reading": 120, "insulin_dosage": 4, "medicine_log_id": medicine_log_id}
+        return _created(client.post("/api/insulin/", json=log, headers=headers))["id"]
+    return create
@@ -0,0 +1,129 @@
+"""Admission control: limited slots per route class, a bounded queue and 503s"""
+import asyncio
+import time
+import pytest
+from app.admission import (
+    CRITICAL, DEFAULT, HEAVY, AdmissionController, AdmissionMiddleware, Rejected, route_class
+)
+
+
+def controller(**overrides) -> AdmissionController:
+    limits = dict(max_concurrent=2, critical_reserved=1, heavy_concurrency=1, queue_size=1, queue_timeout_ms=50)
+    return AdmissionController(**{**limits, **overrides})
+
+
+def far_deadline() -> float:
+    return time.monotonic() + 10
+
+
+@pytest.mark.parametrize("method, path, expected", [
+    ("POST", "/api/reminders/logs", CRITICAL),
+    ("PUT", "/api/reminders/logs/12", CRITICAL),
+    ("POST", "/api/insulin/", CRITICAL),
+    ("GET", "/api/reminders/logs", HEAVY),
+    ("GET", "/api/insulin/weekly", HEAVY),
+    ("GET", "/api/exports/insulin.csv", HEAVY),
+    ("GET", "/api/users/", DEFAULT),
+    ("GET", "/health", None),
+])
+def test_route_classes(method, path, expected):
+    assert route_class(method, path) == expected
+
+
+def test_full_queue_rejects_at_once():
+    async def scenario():
+        admission = controller(critical_reserved=0, max_concurrent=1)
+        await admission.acquire(DEFAULT, far_deadline())
+        waiter = asyncio.ensure_future(admission.acquire(DEFAULT, far_deadline()))
+        await asyncio.sleep(0)  # The waiter takes the only queue place
+        started = time.monotonic()
+        with pytest.raises(Rejected):
+            await admission.acquire(DEFAULT, far_deadline())
+        assert time.monotonic() - started < 0.01
+        waiter.cancel()
+    asyncio.run(scenario())
+
+
+def test_queued_request_gives_up_after_the_queue_timeout():
+    async def scenario():
+        admission = controller(critical_reserved=0, max_concurrent=1)
+        await admission.acquire(DEFAULT, far_deadline())
+        with pytest.raises(Rejected):
+            await admission.acquire(DEFAULT, far_deadline())
+    asyncio.run(scenario())
+
+
+def test_released_slot_admits_the_next_request():
+    async def scenario():
+        admission = controller(critical_reserved=0, max_concurrent=1, queue_timeout_ms=1000)
+        slots = await admission.acquire(DEFAULT, far_deadline())
+        waiter = asyncio.ensure_future(admission.acquire(DEFAULT, far_deadline()))
+        await asyncio.sleep(0)
+        admission.release(slots)
+        assert await waiter == [admission.shared]
+    asyncio.run(scenario())
+
+
+def test_critical_requests_use_the_reserved_slot_when_saturated():
+    async def scenario():
+        admission = controller()  # One shared slot, one reserved
+        await admission.acquire(DEFAULT, far_deadline())
+        assert await admission.acquire(CRITICAL, far_deadline()) == [admission.reserved]
+        with pytest.raises(Rejected):
+            await admission.acquire(DEFAULT, far_deadline())
+    asyncio.run(scenario())
+
+
+def test_heavy_requests_are_limited_on_their_own():
+    async def scenario():
+        admission = controller(max_concurrent=4, critical_reserved=0)
+        await admission.acquire(HEAVY, far_deadline())
+        with pytest.raises(Rejected):
+            await admission.acquire(HEAVY, far_deadline())
+        # Other requests still get the shared slots
+        await admission.acquire(DEFAULT, far_deadline())
+    asyncio.run(scenario())
+
+
+def test_heavy_request_rejected_for_a_shared_slot_gives_back_its_heavy_slot():
+    async def scenario():
+        admission = controller(max_concurrent=1, critical_reserved=0)
+        slots = await admission.acquire(DEFAULT, far_deadline())
+        with pytest.raises(Rejected):
+            await admission.acquire(HEAVY, far_deadline())
+        assert not admission.heavy.locked()
+        admission.release(slots)
+        assert await admission.acquire(HEAVY, far_deadline()) == [admission.shared, admission.heavy]
+    asyncio.run(scenario())
+
+
+def test_middleware_answers_503_with_retry_after():
+    async def slow_app(scope, receive, send):
+        await asyncio.sleep(0.2)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def request(app) -> tuple:
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/api/users/", "query_string": b"", "headers": []}
+        await app(scope, receive, send)
+        start = messages[0]
+        return start["status"], dict(start["headers"])
+
+    admission = controller(critical_reserved=0, max_concurrent=1, queue_size=0)
+    app = AdmissionMiddleware(slow_app, admission)
+
+    async def scenario():
+        return await asyncio.gather(request(app), request(app))
+
+    (first_status, _), (second_status, headers) = asyncio.run(scenario())
+    assert (first_status, second_status) == (200, 503)
+    assert b"retry-after" in headers
+    assert admission.rejected == 1
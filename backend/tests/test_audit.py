@@ -0,0 +1,133 @@
+"""Audit log: recorded changes, snapshots and rebuilding an entity's past state"""
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete, select
+from app.audit import audit_writer, state_at
+from app.database import SessionLocal
+from app.models import ChangeEvent, EntitySnapshot
+from app.security import lookup_family_key
+
+
+def wait_for_events(client, headers, entity: str, count: int, timeout: float = 5.0) -> list:
+    """Events of an entity, newest first, once the batched writer has stored `count` of them"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events = client.get(f"/api/audit/{entity}/events", headers=headers).json()
+        if len(events) >= count:
+            return events
+        time.sleep(0.02)
+    raise AssertionError(f"Only {len(events)} of {count} events recorded for {entity}")
+
+
+def snapshots(family_id: int, entity_type: str, entity_id: int) -> list:
+    with SessionLocal() as db:
+        return db.scalars(
+            select(EntitySnapshot)
+            .where(
+                EntitySnapshot.family_id == family_id,
+                EntitySnapshot.entity_type == entity_type,
+                EntitySnapshot.entity_id == entity_id,
+            )
+            .order_by(EntitySnapshot.id)
+        ).all()
+
+
+@pytest.fixture
+def snapshot_every(monkeypatch):
+    monkeypatch.setattr(audit_writer, "snapshot_every", 3)
+    return 3
+
+
+def test_changes_are_recorded_with_their_fields(client, family, create_user):
+    user_id = create_user(family, "Nani")
+    client.put(f"/api/users/{user_id}", json={"name": "Nanima"}, headers={**family, "X-Actor": "Asha"})
+
+    update, create = wait_for_events(client, family, f"user/{user_id}", 2)
+    assert create["action"] == "create" and create["changes"]["name"] == [None, "Nani"]
+    assert update["action"] == "update" and update["changes"]["name"] == ["Nani", "Nanima"]
+    assert update["actor"].startswith("Asha (key:")
+
+
+def test_state_at_a_point_in_time(client, family, create_user):
+    user_id = create_user(family, "Nani")
+    create = wait_for_events(client, family, f"user/{user_id}", 1)[0]
+    client.put(f"/api/users/{user_id}", json={"name": "Nanima"}, headers=family)
+    update = wait_for_events(client, family, f"user/{user_id}", 2)[0]
+
+    def name_at(at: str) -> str:
+        return client.get(f"/api/audit/user/{user_id}", params={"at": at}, headers=family).json()["state"]["name"]
+
+    assert name_at(create["created_at"]) == "Nani"
+    assert name_at(update["created_at"]) == "Nanima"
+    before_create = datetime.fromisoformat(create["created_at"]) - timedelta(seconds=1)
+    response = client.get(f"/api/audit/user/{user_id}", params={"at": before_create.isoformat()}, headers=family)
+    assert response.status_code == 404
+
+
+def test_other_families_see_no_history(client, family, new_family, create_user):
+    user_id = create_user(family)
+    wait_for_events(client, family, f"user/{user_id}", 1)
+    other = new_family()
+    assert client.get(f"/api/audit/user/{user_id}/events", headers=other).json() == []
+    assert client.get(f"/api/audit/user/{user_id}", headers=other).status_code == 404
+
+
+def test_snapshot_taken_every_n_events(client, family, create_user, snapshot_every):
+    family_id = lookup_family_key(family["X-API-Key"])
+    user_id = create_user(family, "Name 0")
+    for number in range(1, 7):
+        client.put(f"/api/users/{user_id}", json={"name": f"Name {number}"}, headers=family)
+        # One event per batch, so each flush sees the entity's running count
+        wait_for_events(client, family, f"user/{user_id}", number + 1)
+
+    deadline = time.monotonic() + 5
+    while len(snapshots(family_id, "user", user_id)) < 2 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    taken = snapshots(family_id, "user", user_id)
+    assert [snapshot.state["name"] for snapshot in taken] == ["Name 2", "Name 5"]
+    with SessionLocal() as db:
+        event_ids = db.scalars(
+            select(ChangeEvent.id).where(ChangeEvent.entity_type == "user", ChangeEvent.entity_id == user_id).order_by(ChangeEvent.id)
+        ).all()
+    # Each snapshot covers the events up to and including the one that made it due
+    assert [snapshot.event_id for snapshot in taken] == [event_ids[2], event_ids[5]]
+
+
+def test_rebuild_from_a_snapshot_matches_a_full_replay(client, family, create_user, snapshot_every):
+    family_id = lookup_family_key(family["X-API-Key"])
+    user_id = create_user(family, "Name 0")
+    for number in range(1, 5):
+        client.put(f"/api/users/{user_id}", json={"name": f"Name {number}", "avatar_emoji": "🙂" * number}, headers=family)
+        wait_for_events(client, family, f"user/{user_id}", number + 1)
+    events = wait_for_events(client, family, f"user/{user_id}", 5)
+
+    with SessionLocal() as db:
+        assert db.scalar(select(EntitySnapshot.id).where(EntitySnapshot.entity_id == user_id, EntitySnapshot.entity_type == "user"))
+        times = [None] + [datetime.fromisoformat(event["created_at"]) for event in events]
+        from_snapshots = [state_at(db, family_id, "user", user_id, at)["state"] for at in times]
+        db.execute(delete(EntitySnapshot).where(EntitySnapshot.entity_type == "user", EntitySnapshot.entity_id == user_id))
+        replayed = [state_at(db, family_id, "user", user_id, at)["state"] for at in times]
+        db.rollback()
+
+    assert from_snapshots == replayed
+    assert from_snapshots[0]["name"] == "Name 4" and from_snapshots[0]["avatar_emoji"] == "🙂" * 4
+
+
+def test_deleted_entity_reads_as_gone(family):
+    family_id = lookup_family_key(family["X-API-Key"])
+    # Events are append-only, so use an id no real bookmark of this test run has
+    bookmark_id = 1_000_000 + family_id
+    created = datetime.utcnow() - timedelta(minutes=2)
+    with SessionLocal() as db:
+        db.add_all([
+            ChangeEvent(family_id=family_id, entity_type="bookmark", entity_id=bookmark_id, action="create",
+                        changes={"id": [None, bookmark_id], "name": [None, "Taxi"]}, actor="test", created_at=created),
+            ChangeEvent(family_id=family_id, entity_type="bookmark", entity_id=bookmark_id, action="delete",
+                        changes={"id": [bookmark_id, None], "name": ["Taxi", None]}, actor="test",
+                        created_at=created + timedelta(minutes=1)),
+        ])
+        db.commit()
+        assert state_at(db, family_id, "bookmark", bookmark_id, created)["state"] == {"id": bookmark_id, "name": "Taxi"}
+        gone = state_at(db, family_id, "bookmark", bookmark_id)
+    assert gone["exists"] is False and gone["state"] is None
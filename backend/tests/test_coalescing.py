@@ -0,0 +1,105 @@
+"""Single-flight: identical concurrent reads share one execution"""
+import asyncio
+from app.coalescing import CoalescingMiddleware, SingleFlight
+
+
+class SlowApp:
+    """ASGI app counting its calls, answering reads after `delay` seconds (writes at once)"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.delay if scope["method"] == "GET" else 0)
+        if self.fail:
+            raise RuntimeError("handler failed")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": f"{scope['method']} {call}".encode()})
+
+
+def scope(method: str = "GET", path: str = "/api/users/", key: str = "family-key", query: bytes = b""):
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query,
+        "headers": [(b"x-api-key", key.encode())],
+    }
+
+
+async def call(app, request_scope) -> bytes:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    try:
+        await app(request_scope, receive, send)
+    except RuntimeError:
+        return b"error"
+    return b"".join(message.get("body", b"") for message in messages if message["type"] == "http.response.body")
+
+
+def run(*requests):
+    async def gather():
+        return await asyncio.gather(*requests)
+    return asyncio.run(gather())
+
+
+def test_identical_reads_share_one_execution():
+    inner, flights = SlowApp(), SingleFlight()
+    app = CoalescingMiddleware(inner, flights)
+    bodies = run(*(call(app, scope()) for _ in range(5)))
+    assert inner.calls == 1
+    assert bodies == [b"GET 1"] * 5
+    assert flights.metrics()["coalesced"] == 4
+
+
+def test_parameter_order_does_not_matter_but_values_and_credentials_do():
+    inner = SlowApp()
+    app = CoalescingMiddleware(inner, SingleFlight())
+    run(
+        call(app, scope(query=b"user_id=1&is_active=true")),
+        call(app, scope(query=b"is_active=true&user_id=1")),
+        call(app, scope(query=b"user_id=2")),
+        call(app, scope(key="other-key")),
+    )
+    assert inner.calls == 3
+
+
+def test_routes_outside_the_list_are_not_coalesced():
+    inner = SlowApp()
+    app = CoalescingMiddleware(inner, SingleFlight())
+    run(*(call(app, scope(path="/api/insulin/")) for _ in range(3)))
+    assert inner.calls == 3
+
+
+def test_read_after_a_write_does_not_join_an_older_read():
+    inner, flights = SlowApp(delay=0.1), SingleFlight()
+    app = CoalescingMiddleware(inner, flights)
+
+    async def write_then_read():
+        await asyncio.sleep(0.02)  # The first read is still running
+        await call(app, scope(method="POST"))
+        return await call(app, scope())
+
+    first, second = run(call(app, scope()), write_then_read())
+    assert (first, second) == (b"GET 1", b"GET 3")
+    assert inner.calls == 3
+    # Nothing in flight: the credential's generation is forgotten
+    assert not flights.generations and not flights.active
+
+
+def test_followers_run_on_their_own_when_the_leader_fails():
+    inner = SlowApp()
+    inner.fail = True
+    app = CoalescingMiddleware(inner, SingleFlight())
+    assert run(call(app, scope()), call(app, scope())) == [b"error", b"error"]
+    assert inner.calls == 2
@@ -0,0 +1,146 @@
+"""Background user deletion: batches, cross-user references, leases and failures"""
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.database import SessionLocal
+from app.deletion import DeletionWorker, LeaseLost, deletion_worker
+from app.models import DeletionJob
+from app.security import lookup_family_key
+
+
+def wait_for_job(client, headers, job_id: int, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/users/deletions/{job_id}", headers=headers).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Deletion job {job_id} did not finish: {job}")
+
+
+@pytest.fixture
+def paused_worker():
+    """Stop the app's worker so a test can run jobs with workers of its own"""
+    deletion_worker.stop()
+    yield
+    deletion_worker.start()
+
+
+@pytest.fixture
+def queued_job(family, create_user, create_medicine, create_medicine_log):
+    """A pending job deleting a user with a few rows, not handed to any worker"""
+    user_id = create_user(family)
+    medicine_id = create_medicine(family, user_id)
+    for _ in range(3):
+        create_medicine_log(family, user_id, medicine_id)
+    with SessionLocal() as db:
+        job = DeletionJob(
+            family_id=lookup_family_key(family["X-API-Key"]), entity_type="user", entity_id=user_id, deleted={}
+        )
+        db.add(job)
+        db.commit()
+        return job.id
+
+
+def worker(owner: str, batch_size: int = 2) -> DeletionWorker:
+    deletion = DeletionWorker(SessionLocal, batch_size=batch_size, pause_ms=0, lease_seconds=60)
+    deletion.owner = owner
+    return deletion
+
+
+def load_job(job_id: int) -> DeletionJob:
+    with SessionLocal() as db:
+        return db.get(DeletionJob, job_id)
+
+
+def test_deletes_the_user_and_everything_they_own(
+    client, family, create_user, create_medicine, create_reminder, create_medicine_log, create_insulin_log
+):
+    user_id, kept_id = create_user(family, "Nani"), create_user(family, "Dadi")
+    for owner in (user_id, kept_id):
+        medicine_id = create_medicine(family, owner)
+        create_reminder(family, medicine_id)
+        for _ in range(3):
+            create_medicine_log(family, owner, medicine_id)
+        create_insulin_log(family, owner)
+
+    response = client.delete(f"/api/users/{user_id}", headers=family)
+    assert response.status_code == 202
+    job = wait_for_job(client, family, response.json()["id"])
+
+    assert job["status"] == "done"
+    assert job["deleted"] == job["total"] == {
+        "insulin_log": 1, "medicine_log": 3, "reminder": 1, "medicine": 1, "user": 1
+    }
+    assert client.get(f"/api/users/{user_id}", headers=family).status_code == 404
+    assert [medicine["user_id"] for medicine in client.get("/api/medicines/", headers=family).json()] == [kept_id]
+    assert len(client.get(f"/api/reminders/logs?user_id={kept_id}", headers=family).json()) == 3
+
+
+def test_other_users_references_are_cleared(
+    client, family, create_user, create_medicine, create_reminder, create_medicine_log, create_insulin_log
+):
+    user_id, other_id = create_user(family, "Nani"), create_user(family, "Dadi")
+    medicine_id = create_medicine(family, user_id)
+    reminder_id = create_reminder(family, medicine_id)
+    log_id = create_medicine_log(family, user_id, medicine_id, reminder_id)
+    other_log = create_medicine_log(family, other_id, create_medicine(family, other_id), reminder_id)
+    other_insulin = create_insulin_log(family, other_id, log_id)
+
+    job = wait_for_job(client, family, client.delete(f"/api/users/{user_id}", headers=family).json()["id"])
+
+    assert job["status"] == "done", job["error"]
+    logs = client.get(f"/api/reminders/logs?user_id={other_id}", headers=family).json()
+    assert [(log["id"], log["reminder_id"]) for log in logs] == [(other_log, None)]
+    insulin = client.get(f"/api/insulin/?user_id={other_id}", headers=family).json()
+    assert [(log["id"], log["medicine_log_id"]) for log in insulin] == [(other_insulin, None)]
+
+
+def test_only_one_worker_claims_a_job(paused_worker, queued_job):
+    first, second = worker("first"), worker("second")
+    with SessionLocal() as db:
+        assert first._claim(db, queued_job)
+        assert not second._claim(db, queued_job)
+
+    second.run_job(queued_job)  # Owned by a live worker: left alone
+    job = load_job(queued_job)
+    assert (job.status, job.owner, job.deleted) == ("running", "first", {})
+
+
+def test_expired_lease_is_taken_over(paused_worker, queued_job):
+    stalled, rescuer = worker("stalled"), worker("rescuer")
+    with SessionLocal() as db:
+        assert stalled._claim(db, queued_job)
+        job = db.get(DeletionJob, queued_job)
+        job.heartbeat_at = datetime.utcnow() - timedelta(seconds=61)
+        db.commit()
+
+    rescuer.run_job(queued_job)
+    job = load_job(queued_job)
+    assert (job.status, job.owner) == ("done", "rescuer")
+    assert job.deleted["medicine_log"] == 3
+
+    # The stalled worker finds out at its next batch and stops
+    with SessionLocal() as db:
+        with pytest.raises(LeaseLost):
+            stalled._checkpoint(db, db.get(DeletionJob, queued_job))
+
+
+def test_stopping_hands_the_job_back(paused_worker, queued_job):
+    deletion = worker("stopping")
+    deletion._stopping.set()
+    deletion.run_job(queued_job)
+    job = load_job(queued_job)
+    assert (job.status, job.owner) == ("pending", None)
+
+
+def test_any_error_fails_the_job(paused_worker, queued_job, monkeypatch):
+    deletion = worker("failing")
+
+    def broken_batch(*args):
+        raise ValueError("broken batch")
+
+    monkeypatch.setattr(deletion, "_delete_batch", broken_batch)
+    deletion.run_job(queued_job)
+    job = load_job(queued_job)
+    assert (job.status, job.error) == ("failed", "broken batch")
@@ -0,0 +1,43 @@
+"""Launcher bundle: cached per family, revalidated against families.launcher_version"""
+from app.database import SessionLocal
+from app.launcher import bump_launcher_version
+from app.models import Bookmark
+from app.security import lookup_family_key
+
+
+def test_unchanged_bundle_answers_304(client, family):
+    first = client.get("/api/launcher", headers=family)
+    assert first.status_code == 200
+    again = client.get("/api/launcher", headers={**family, "If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_write_through_the_api_changes_the_bundle(client, family):
+    etag = client.get("/api/launcher", headers=family).headers["ETag"]
+    client.post("/api/users/", json={"name": "Nani"}, headers=family)
+    response = client.get("/api/launcher", headers={**family, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert [user["name"] for user in response.json()["users"]] == ["Nani"]
+
+
+def test_write_handled_by_another_worker_is_seen(client, family):
+    """A write made elsewhere does not invalidate this process's cache; the version does"""
+    etag = client.get("/api/launcher", headers=family).headers["ETag"]
+    family_id = lookup_family_key(family["X-API-Key"])
+    with SessionLocal() as db:
+        db.add(Bookmark(family_id=family_id, name="Doctor", phone_number="100", contact_type="phone"))
+        bump_launcher_version(db, family_id)
+        db.commit()
+
+    response = client.get("/api/launcher", headers={**family, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert [bookmark["name"] for bookmark in response.json()["bookmarks"]] == ["Doctor"]
+
+
+def test_deleted_bookmark_leaves_the_bundle(client, family):
+    bookmark = client.post(
+        "/api/bookmarks/", json={"name": "Taxi", "phone_number": "200", "contact_type": "phone"}, headers=family
+    ).json()
+    assert len(client.get("/api/launcher", headers=family).json()["bookmarks"]) == 1
+    client.delete(f"/api/bookmarks/{bookmark['id']}", headers=family)
+    assert client.get("/api/launcher", headers=family).json()["bookmarks"] == []
@@ -0,0 +1,75 @@
+"""Read-your-writes: a signed last-write token keeps a client's reads on the primary"""
+import time
+import pytest
+from starlette.requests import Request
+from app import replica
+from app.config import settings
+from app.database import ReadSessionLocal
+from app.security import hash_api_key
+
+KEY = hash_api_key("family-key")
+
+
+def request_with(headers: dict) -> Request:
+    raw = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/api/users/", "headers": raw})
+
+
+@pytest.fixture
+def replica_configured(monkeypatch):
+    replica_sessions = object()
+    monkeypatch.setattr(replica, "ReplicaSessionLocal", replica_sessions)
+    return replica_sessions
+
+
+def test_fresh_token_proves_a_recent_write():
+    assert replica.wrote_recently(replica.last_write_token(KEY), KEY)
+
+
+@pytest.mark.parametrize("token", [None, "", "garbage", "123.abc", "not-a-number.abc"])
+def test_malformed_tokens_are_ignored(token):
+    assert not replica.wrote_recently(token, KEY)
+
+
+def test_token_is_bound_to_the_credential():
+    assert not replica.wrote_recently(replica.last_write_token(hash_api_key("other-key")), KEY)
+
+
+def test_forged_timestamp_fails_the_signature():
+    token = replica.last_write_token(KEY)
+    written, _, signature = token.partition(".")
+    assert not replica.wrote_recently(f"{int(written) + 1}.{signature}", KEY)
+
+
+def test_token_expires():
+    written_ms = int((time.time() - settings.READ_YOUR_WRITES_SECONDS - 1) * 1000)
+    assert not replica.wrote_recently(replica.last_write_token(KEY, written_ms), KEY)
+
+
+def test_reads_go_to_the_replica_without_a_token(replica_configured):
+    assert replica.read_sessionmaker(request_with({"X-API-Key": "family-key"})) is replica_configured
+
+
+def test_reads_stay_on_the_primary_after_a_write(replica_configured):
+    token = replica.last_write_token(KEY)
+    by_header = request_with({"X-API-Key": "family-key", replica.LAST_WRITE_HEADER: token})
+    by_cookie = request_with({"X-API-Key": "family-key", "Cookie": f"{replica.LAST_WRITE_COOKIE}={token}"})
+    assert replica.read_sessionmaker(by_header) is ReadSessionLocal
+    assert replica.read_sessionmaker(by_cookie) is ReadSessionLocal
+
+
+def test_another_client_s_token_does_not_pin_reads(replica_configured):
+    token = replica.last_write_token(hash_api_key("other-key"))
+    request = request_with({"X-API-Key": "family-key", replica.LAST_WRITE_HEADER: token})
+    assert replica.read_sessionmaker(request) is replica_configured
+
+
+def test_successful_write_hands_out_a_token(client, family, replica_configured):
+    response = client.post("/api/users/", json={"name": "Nani"}, headers=family)
+    token = response.headers[replica.LAST_WRITE_HEADER]
+    assert response.cookies[replica.LAST_WRITE_COOKIE] == token
+    assert replica.wrote_recently(token, hash_api_key(family["X-API-Key"]))
+
+    failed = client.post("/api/medicines/", json={"name": "X", "type": "tablet", "user_id": 999999}, headers=family)
+    assert failed.status_code == 404
+    assert replica.LAST_WRITE_HEADER not in failed.headers
@@ -0,0 +1,92 @@
+"""SQLite writer queue: one write transaction at a time, in arrival order"""
+import threading
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import _create_engine, read_after_commit
+
+THREADS = 4
+WRITES = 100
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    # Without a busy timeout SQLite fails at once if the queue lets a writer
+    # in before the previous one has committed
+    monkeypatch.setattr(settings, "SQLITE_BUSY_TIMEOUT_MS", 0)
+    engine = _create_engine(f"sqlite:///{tmp_path}/writer.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)"))
+        conn.execute(text("INSERT INTO counter (id, value) VALUES (1, 0)"))
+    yield engine
+    engine.dispose()
+
+
+def run_threads(target, count: int = THREADS):
+    errors = []
+
+    def guarded():
+        try:
+            target()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=guarded) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def test_concurrent_writers_never_find_the_database_locked(engine):
+    def write():
+        for _ in range(WRITES):
+            with Session(engine) as db:
+                db.execute(text("UPDATE counter SET value = value + 1 WHERE id = 1"))
+                db.commit()
+
+    assert run_threads(write) == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT value FROM counter")).scalar() == THREADS * WRITES
+
+
+def test_rolled_back_writers_hand_the_queue_on(engine):
+    def write_and_roll_back():
+        for _ in range(WRITES):
+            with Session(engine) as db:
+                db.execute(text("UPDATE counter SET value = value + 1 WHERE id = 1"))
+                db.rollback()
+
+    assert run_threads(write_and_roll_back) == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT value FROM counter")).scalar() == 0
+
+
+def test_read_only_transactions_do_not_wait_for_the_writer(engine):
+    reader_engine = engine.execution_options(read_only=True)
+    with Session(engine) as writer:
+        writer.execute(text("UPDATE counter SET value = 5 WHERE id = 1"))
+        with Session(reader_engine) as reader:
+            # WAL: the reader sees the last committed value while the write is open
+            assert reader.execute(text("SELECT value FROM counter")).scalar() == 0
+        writer.commit()
+
+
+def test_reading_after_commit_leaves_the_writer_free(engine):
+    with Session(engine) as db:
+        db.execute(text("UPDATE counter SET value = 1 WHERE id = 1"))
+        db.commit()
+        read_after_commit(db)
+        assert db.execute(text("SELECT value FROM counter")).scalar() == 1
+
+        # The first session still has a transaction open; another writer gets through
+        errors = run_threads(lambda: _increment(engine), count=1)
+        assert errors == []
+
+
+def _increment(engine):
+    with Session(engine) as db:
+        db.execute(text("UPDATE counter SET value = value + 1 WHERE id = 1"))
+        db.commit()
@@ -0,0 +1,38 @@
+"""Families (tenants) only ever see and change their own rows"""
+
+
+def test_lists_only_show_the_family_s_rows(client, new_family, server_headers, create_user, create_medicine):
+    ours, theirs = new_family("Ours"), new_family("Theirs")
+    user_id = create_user(ours)
+    create_medicine(ours, user_id)
+
+    assert [user["id"] for user in client.get("/api/users/", headers=ours).json()] == [user_id]
+    assert client.get("/api/users/", headers=theirs).json() == []
+    assert client.get("/api/medicines/", headers=theirs).json() == []
+    # The server-wide key acts on the default family, not on every family
+    assert user_id not in [user["id"] for user in client.get("/api/users/", headers=server_headers).json()]
+
+
+def test_another_family_s_rows_are_not_found(client, new_family, create_user, create_medicine):
+    ours, theirs = new_family("Ours"), new_family("Theirs")
+    user_id = create_user(ours)
+    medicine_id = create_medicine(ours, user_id)
+
+    assert client.get(f"/api/users/{user_id}", headers=theirs).status_code == 404
+    assert client.put(f"/api/users/{user_id}", json={"name": "Taken"}, headers=theirs).status_code == 404
+    assert client.get(f"/api/medicines/{medicine_id}", headers=theirs).status_code == 404
+    assert client.delete(f"/api/medicines/{medicine_id}", headers=theirs).status_code == 404
+
+    assert client.get(f"/api/users/{user_id}", headers=ours).json()["name"] == "Nani"
+    assert client.get(f"/api/medicines/{medicine_id}", headers=ours).json()["is_active"] is True
+
+
+def test_cached_user_reflects_updates(client, family, create_user):
+    user_id = create_user(family)
+    assert client.get(f"/api/users/{user_id}", headers=family).json()["name"] == "Nani"
+    client.put(f"/api/users/{user_id}", json={"name": "Dadi"}, headers=family)
+    assert client.get(f"/api/users/{user_id}", headers=family).json()["name"] == "Dadi"
+
+
+def test_unknown_key_is_rejected(client):
+    assert client.get("/api/users/", headers={"X-API-Key": "not-a-key"}).status_code == 401
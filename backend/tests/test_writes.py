@@ -0,0 +1,57 @@
+"""Creates are one INSERT ... RETURNING; the composite foreign keys reject other families' parents"""
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.database import SessionLocal
+from app.models import Medicine, MedicineType
+from app.security import lookup_family_key
+
+
+def test_parent_in_another_family_is_not_found(
+    client, new_family, create_user, create_medicine, create_reminder, create_medicine_log
+):
+    ours, theirs = new_family("Ours"), new_family("Theirs")
+    user_id = create_user(ours)
+    medicine_id = create_medicine(ours, user_id)
+    reminder_id = create_reminder(ours, medicine_id)
+    log_id = create_medicine_log(ours, user_id, medicine_id)
+    their_user = create_user(theirs)
+    their_medicine = create_medicine(theirs, their_user)
+
+    medicine = {"name": "Borrowed", "type": "tablet", "user_id": user_id}
+    response = client.post("/api/medicines/", json=medicine, headers=theirs)
+    assert (response.status_code, response.json()["detail"]) == (404, "User not found")
+
+    log = {
+        "user_id": their_user,
+        "medicine_id": their_medicine,
+        "reminder_id": reminder_id,
+        "scheduled_at": "2026-01-01T08:00:00",
+        "status": "taken",
+    }
+    response = client.post("/api/reminders/logs", json=log, headers=theirs)
+    assert (response.status_code, response.json()["detail"]) == (404, "Reminder not found")
+
+    insulin = {"user_id": their_user, "glucose_reading": 120, "insulin_dosage": 4, "medicine_log_id": log_id}
+    response = client.post("/api/insulin/", json=insulin, headers=theirs)
+    assert (response.status_code, response.json()["detail"]) == (404, "Medicine log not found")
+
+    assert client.get("/api/medicines/", headers=theirs).json()[0]["id"] == their_medicine
+
+
+def test_missing_parent_is_not_found(client, family, create_user):
+    user_id = create_user(family)
+    response = client.post("/api/reminders/", json={"medicine_id": 999999, "scheduled_time": "08:00"}, headers=family)
+    assert (response.status_code, response.json()["detail"]) == (404, "Medicine not found")
+    response = client.post("/api/medicines/", json={"name": "X", "type": "tablet", "user_id": 999999}, headers=family)
+    assert (response.status_code, response.json()["detail"]) == (404, "User not found")
+    assert client.get(f"/api/users/{user_id}", headers=family).status_code == 200
+
+
+def test_database_rejects_cross_family_references(new_family, create_user):
+    """The constraint itself, not the API, keeps families apart"""
+    ours, theirs = new_family("Ours"), new_family("Theirs")
+    user_id = create_user(ours)
+    with SessionLocal() as db:
+        db.add(Medicine(family_id=lookup_family_key(theirs["X-API-Key"]), user_id=user_id, name="X", type=MedicineType.TABLET))
+        with pytest.raises(IntegrityError, match="FOREIGN KEY"):
+            db.commit()